@@ -4,17 +4,18 @@
 """
 import uvicorn
 import argparse
+import importlib.util
 import logging
+import math
 import sys
 import os
 
 from src.config import settings
+from src.logging_pipeline import setup_logging
+from src.startup_report import import_report
 
 # 配置日志
-logging.basicConfig(
-    level=getattr(logging, settings.log_level),
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+setup_logging()
 
 logger = logging.getLogger(__name__)
 
@@ -28,24 +29,33 @@ def main():
     parser.add_argument("--debug", action="store_true", help="调试模式")
     parser.add_argument("--reload", action="store_true", help="自动重载")
     parser.add_argument("--log-level", default=settings.log_level, help="日志级别")
+    parser.add_argument("--router", action="store_true",
+                        help="路由模式：把请求分发到 ROUTER_BACKENDS 配置的多台实例（单进程，可在非 macOS 上运行）")
+    parser.add_argument("--import-report", action="store_true",
+                        help="列出导入 src.api 时耗时最长的模块后退出")
     
     args = parser.parse_args()
+
+    if args.router:
+        run_router(args)
+        return
+
+    if args.import_report:
+        print_import_report()
+        return
     
     # 检查 macOS 系统
     if sys.platform != "darwin":
         logger.error("此应用程序只能在 macOS 系统上运行")
         sys.exit(1)
     
-    # 检查必要的依赖
-    try:
-        import Vision
-        import objc
-        from PIL import Image
-        logger.info("必要的依赖检查通过")
-    except ImportError as e:
-        logger.error(f"缺少必要的依赖: {e}")
+    # 检查必要的依赖（只查找模块，不在主进程中导入 Vision 框架绑定）
+    missing = [name for name in ("Vision", "objc", "PIL") if importlib.util.find_spec(name) is None]
+    if missing:
+        logger.error(f"缺少必要的依赖: {', '.join(missing)}")
         logger.error("请运行 'pip install -r requirements.txt' 安装依赖")
         sys.exit(1)
+    logger.info("必要的依赖检查通过")
     
     # 启动服务器
     logger.info(f"启动 {settings.app_name} v{settings.app_version}")
@@ -60,6 +70,43 @@ def main():
             workers=args.workers if not args.debug else 1,
             reload=args.reload,
             log_level=args.log_level.lower(),
+            access_log=False,
+            # 排空之后关闭时，最多再等待该时长让剩余连接结束
+            timeout_graceful_shutdown=math.ceil(settings.drain_timeout)
+        )
+    except KeyboardInterrupt:
+        logger.info("服务器已停止")
+    except Exception as e:
+        logger.error(f"服务器启动失败: {e}")
+        sys.exit(1)
+
+
+def print_import_report():
+    """打印导入 src.api 时累计耗时最长的模块"""
+    modules = import_report("src.api")
+    print(f"{'累计(s)':>9} {'自身(s)':>9}  模块")
+    for name, self_time, cumulative in modules:
+        print(f"{cumulative:9.3f} {self_time:9.3f}  {name}")
+
+
+def run_router(args):
+    """以路由模式启动"""
+    if not settings.get_router_backends():
+        logger.error("路由模式需要配置 ROUTER_BACKENDS")
+        sys.exit(1)
+
+    logger.info(f"启动 {settings.app_name} 路由模式，后端: {', '.join(settings.get_router_backends())}")
+    logger.info(f"服务器地址: http://{args.host}:{args.port}")
+
+    try:
+        # 路由状态（在途请求数、摘除状态）保存在进程内，只使用单进程
+        uvicorn.run(
+            "src.node_router:app",
+            host=args.host,
+            port=args.port,
+            workers=1,
+            reload=args.reload,
+            log_level=args.log_level.lower(),
             access_log=True
         )
     except KeyboardInterrupt:
@@ -2,46 +2,87 @@
 FastAPI 路由和处理逻辑
 提供 HTTP API 接口
 """
+import asyncio
 import logging
+import math
+import multiprocessing
+import os
+import re
+import signal
 import time
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Union
 import platform
-import psutil
 
-from fastapi import FastAPI, HTTPException, Depends, Security, Request
+# 最先导入：之后各依赖的导入耗时计入启动报告
+from .startup_report import startup_report
+
+from fastapi import FastAPI, HTTPException, Depends, Security, Request, Query, WebSocket, WebSocketDisconnect
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
+from starlette.types import Scope
 
 from .models import (
     OCRRequest,
     ErrorResponse,
     HealthCheckResponse,
     OCRResult,
+    RegionOCRResult,
     OCRFormatRequest,
     OCRFormatResponse,
-    FormattedResult
+    OCRFileRequest,
+    FormattedResult,
+    OCRJobRequest,
+    OCRDocumentRequest,
+    OCRBatchRequest,
+    OCRDocumentResponse,
+    JobSubmitResponse,
+    JobStatusResponse,
+    SearchResponse
 )
 from .ocr_service import ocr_service
 from .config import settings
-from .formatter_local import format_locally
-from .formatter_llm import format_with_llm
+from .formatter_llm import get_llm_stats
+from .serialization import (
+    negotiate_format,
+    results_to_columns,
+    render_columnar,
+    dumps_json,
+    FORMAT_LEGACY,
+    FORMAT_MSGPACK
+)
+from .pipeline import (
+    run_ocr_and_format,
+    build_format_response,
+    iter_document_pages,
+    iter_batch_pages,
+    stream_formatted_pages,
+    collect_formatted_pages
+)
+from .jobs import job_manager, JOB_SUCCEEDED
+from .result_store import result_store
+from .compression import CompressionMiddleware, get_compression_stats, reset_compression_stats
+from .watcher import directory_watcher
+from .incremental import FrameSession
+from .memory_budget import OverloadedError
+from .tenants import tenant_registry, current_tenant
+from .profiling import RequestProfile, current_profile, save_profile, load_profile, sample_process
+from .logging_pipeline import setup_logging, begin_request, get_stage_timings, get_dropped_logs
+from .drain import DrainMiddleware, drain_controller
+
+startup_report.mark("导入依赖")
 
 # 配置日志
-logging.basicConfig(
-    level=getattr(logging, settings.log_level),
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler(settings.log_file) if settings.log_file else logging.NullHandler()
-    ]
-)
+setup_logging()
 
 logger = logging.getLogger(__name__)
 
+# 可沿用的客户端请求 ID
+REQUEST_ID_PATTERN = re.compile(r"[A-Za-z0-9._-]{1,64}")
+
 # 创建 FastAPI 应用
 app = FastAPI(
     title=settings.app_name,
@@ -59,23 +100,121 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 响应压缩（zstd / brotli / gzip，按 Accept-Encoding 协商）
+if settings.compression_enabled:
+    app.add_middleware(CompressionMiddleware, min_size=settings.compression_min_size)
+
 # 安全认证
 security = HTTPBearer()
 
 # 应用启动时间
 app_start_time = time.time()
 
+# 流式响应的媒体类型
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Security(security)):
-    """验证认证令牌"""
-    if credentials.credentials != settings.auth_token:
+async def verify_token(credentials: HTTPAuthorizationCredentials = Security(security)):
+    """
+    验证认证令牌，并按令牌所属租户限流
+
+    租户记录在请求上下文中，本请求的识别任务按该租户加权公平排队。
+    （使用 async 依赖，使上下文变量在端点函数中可见。）
+    """
+    tenant = tenant_registry.authenticate(credentials.credentials)
+    if tenant is None:
         raise HTTPException(
             status_code=401,
             detail="无效的认证令牌"
         )
+    tenant.requests += 1
+    retry_after = tenant.bucket.try_take()
+    if retry_after:
+        tenant.rate_limited += 1
+        raise HTTPException(
+            status_code=429,
+            detail=f"租户 {tenant.name} 请求过于频繁，请稍后重试",
+            headers={"Retry-After": str(math.ceil(retry_after))}
+        )
+    current_tenant.set(tenant)
+    return credentials.credentials
+
+
+def verify_admin_token(credentials: HTTPAuthorizationCredentials = Security(security)):
+    """验证管理接口令牌（未配置 ADMIN_TOKEN 时管理接口不可用）"""
+    if not settings.admin_token:
+        raise HTTPException(status_code=404, detail="管理接口未启用")
+    if credentials.credentials != settings.admin_token:
+        raise HTTPException(status_code=401, detail="无效的管理令牌")
     return credentials.credentials
 
 
+def result_headers(result: Dict[str, Any]) -> Dict[str, str]:
+    """
+    识别结果附带的响应头
+
+    - cascade 模式下的重识别统计（文本框数、重识别框数和面积占比）
+    - 负载过高时应用到本次请求的降级措施
+    - 复用近似重复图像的结果时，与其感知哈希的汉明距离
+    """
+    headers = {}
+    cascade = result['cascade']
+    if cascade is not None:
+        headers["X-OCR-Cascade-Escalated"] = f"{cascade['escalated']}/{cascade['boxes']}"
+        headers["X-OCR-Cascade-Area"] = str(cascade['escalated_area'])
+    if result['degradations']:
+        headers["X-OCR-Degraded"] = ",".join(result['degradations'])
+    if result['near_duplicate_distance'] is not None:
+        headers["X-OCR-Near-Duplicate"] = str(result['near_duplicate_distance'])
+    return headers
+
+
+def add_result_fields(payload: Dict[str, Any], result: Dict[str, Any]):
+    """列式响应中附带 cascade 统计、降级措施和近似重复距离（仅在存在时）"""
+    if result['cascade']:
+        payload['cascade'] = result['cascade']
+    if result['degradations']:
+        payload['degradations'] = result['degradations']
+    if result['near_duplicate_distance'] is not None:
+        payload['near_duplicate_distance'] = result['near_duplicate_distance']
+
+
+def wants_ndjson(raw_request: Request) -> bool:
+    """客户端是否请求 NDJSON 流式响应（Accept 头或 ?stream=true）"""
+    if raw_request.query_params.get("stream", "").lower() in ("1", "true"):
+        return True
+    return NDJSON_MEDIA_TYPE in raw_request.headers.get("accept", "")
+
+
+async def ndjson_response(pages) -> StreamingResponse:
+    """
+    将逐页结果以 NDJSON 流式返回，每页完成后立即写出一行
+
+    先取出第一页再开始响应，使输入错误仍然以正常的 HTTP 错误状态码返回。
+    """
+    formatted = stream_formatted_pages(pages)
+    try:
+        first = await formatted.__anext__()
+    except StopAsyncIteration:
+        first = None
+    except BaseException:
+        await pages.aclose()
+        raise
+
+    async def body():
+        try:
+            if first is not None:
+                yield first.json() + "\n"
+            async for page in formatted:
+                yield page.json() + "\n"
+        finally:
+            # 客户端断开时停止剩余页面的处理
+            await formatted.aclose()
+            await pages.aclose()
+
+    return StreamingResponse(body(), media_type=NDJSON_MEDIA_TYPE)
+
+
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
     """HTTP 异常处理器"""
@@ -87,7 +226,8 @@ async def http_exception_handler(request: Request, exc: HTTPException):
             message=exc.detail,
             code=exc.status_code,
             timestamp=datetime.now().isoformat()
-        ).dict()
+        ).dict(),
+        headers=exc.headers
     )
 
 
@@ -121,26 +261,103 @@ async def general_exception_handler(request: Request, exc: Exception):
     )
 
 
+def is_ocr_request(scope: Scope) -> bool:
+    """是否为提交识别工作的请求（排空时拒绝）"""
+    path = scope["path"]
+    return path.startswith("/predict") or (path == "/jobs" and scope["method"] == "POST")
+
+
+def drain_rejection() -> JSONResponse:
+    """排空拒绝阶段对新的识别请求返回的 503 响应"""
+    return JSONResponse(
+        status_code=503,
+        content=ErrorResponse(
+            error="DRAINING",
+            message="服务正在重启，请稍后重试或改用其他实例",
+            code=503,
+            timestamp=datetime.now().isoformat()
+        ).dict(),
+        headers={"Retry-After": str(math.ceil(settings.drain_timeout)), "Connection": "close"}
+    )
+
+
+# 排空：统计进行中的识别请求（流式响应发送完才结束），拒绝阶段对新的识别请求返回 503；
+# 查询、统计、任务结果等请求不受影响
+app.add_middleware(
+    DrainMiddleware,
+    controller=drain_controller,
+    is_tracked=is_ocr_request,
+    rejection=drain_rejection
+)
+
+
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    """请求日志中间件"""
+    """
+    请求日志中间件
+
+    为每个请求分配请求 ID（沿用合法的 X-Request-ID 请求头），请求结束时输出一条
+    包含方法、路径、状态码、总耗时和各阶段耗时的日志。成功请求按 LOG_SUCCESS_SAMPLE_RATE 采样，
+    4xx/5xx 响应始终记录。
+    """
     start_time = time.time()
-    
-    # 记录请求
-    logger.info(f"收到请求: {request.method} {request.url}")
-    
+    incoming_id = request.headers.get("X-Request-ID", "")
+    request_id = begin_request(incoming_id if REQUEST_ID_PATTERN.fullmatch(incoming_id) else None)
+
+    logger.debug("收到请求: %s %s", request.method, request.url)
+
     # 处理请求
     response = await call_next(request)
-    
+
     # 计算处理时间
     process_time = time.time() - start_time
-    
-    # 记录响应
-    logger.info(f"响应完成: {response.status_code} - 耗时: {process_time:.3f}s")
-    
-    # 添加处理时间到响应头
+
+    # 记录响应（错误响应以 WARNING 级别记录，不受采样影响）
+    stages = {name: round(seconds, 4) for name, seconds in get_stage_timings().items()}
+    logger.log(
+        logging.WARNING if response.status_code >= 400 else logging.INFO,
+        "响应完成: %s %s %d - 耗时: %.3fs",
+        request.method, request.url.path, response.status_code, process_time,
+        extra={
+            'method': request.method,
+            'path': request.url.path,
+            'status': response.status_code,
+            'duration': round(process_time, 4),
+            'stages': stages
+        }
+    )
+
+    # 添加请求 ID 和处理时间到响应头
+    response.headers["X-Request-ID"] = request_id
     response.headers["X-Process-Time"] = str(process_time)
-    
+
+    return response
+
+
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    """
+    单请求性能分析中间件
+
+    请求头 X-Debug-Profile 等于 ADMIN_TOKEN 时，在请求期间对事件循环线程和为本请求工作的线程池线程采样，
+    结果保存为折叠栈，响应头 X-Profile-Id 给出编号，可通过 /admin/profiles/{id} 获取。
+    """
+    if not settings.admin_token or request.headers.get("x-debug-profile") != settings.admin_token:
+        return await call_next(request)
+
+    profile = RequestProfile(settings.profile_interval)
+    context_token = current_profile.set(profile)
+    profile.sampler.start()
+    try:
+        response = await call_next(request)
+    finally:
+        current_profile.reset(context_token)
+        profile.sampler.stop()
+
+    save_profile(profile.profile_id, profile.sampler.collapsed())
+    logger.info("请求性能分析已保存: %s，%d 次采样", profile.profile_id, profile.sampler.samples)
+    response.headers["X-Profile-Id"] = profile.profile_id
+    response.headers["X-Profile-Samples"] = str(profile.sampler.samples)
     return response
 
 
@@ -157,6 +374,9 @@ async def root():
 @app.get("/health", response_model=HealthCheckResponse)
 async def health_check():
     """健康检查"""
+    # psutil 只在健康检查中使用，首次调用时才导入
+    import psutil
+
     uptime = time.time() - app_start_time
     
     # 获取系统信息
@@ -178,6 +398,28 @@ async def health_check():
     )
 
 
+@app.get("/ready", response_model=Dict[str, Any])
+async def readiness_check():
+    """
+    就绪检查：预热完成前和排空开始后返回 503，负载均衡器只应把流量发给就绪的实例
+
+    同时返回整机的识别排队深度，供路由模式选择后端。
+    """
+    state = ocr_service.warmup_state
+    host = ocr_service.get_host_stats()
+    ready = ocr_service.is_ready() and not drain_controller.draining
+    content = {
+        "ready": ready,
+        **state,
+        "draining": drain_controller.draining,
+        "queue_depth": host['queue_depth'],
+        "active": host['active']
+    }
+    if not ready:
+        return JSONResponse(status_code=503, content=content)
+    return content
+
+
 @app.get("/stats", response_model=Dict[str, Any])
 async def get_stats(token: str = Depends(verify_token)):
     """获取服务统计信息"""
@@ -186,6 +428,24 @@ async def get_stats(token: str = Depends(verify_token)):
     
     return {
         "service_stats": stats,
+        "llm_stats": get_llm_stats(),
+        "job_stats": await job_manager.get_stats(),
+        "result_store_stats": await result_store.get_stats() if result_store else None,
+        "compression_stats": get_compression_stats(),
+        "degradation_stats": ocr_service.load_controller.get_state(),
+        "concurrency": ocr_service.concurrency_limiter.get_state(),
+        "tenant_stats": {
+            name: {**stats, **ocr_service.scheduler.get_state().get(name, {'queued': 0, 'running': 0})}
+            for name, stats in tenant_registry.get_stats().items()
+        },
+        "host_stats": ocr_service.get_host_stats(),
+        "memory_budget": ocr_service.pixel_budget.get_stats(),
+        "warmup": ocr_service.warmup_state,
+        "dedup_stats": ocr_service.dedup_index.get_stats() if ocr_service.dedup_index else None,
+        "watcher_stats": directory_watcher.get_stats() if directory_watcher else None,
+        "dropped_logs": get_dropped_logs(),
+        "drain": drain_controller.get_state(),
+        "startup": startup_report.get_state(),
         "uptime": uptime,
         "timestamp": datetime.now().isoformat()
     }
@@ -195,21 +455,30 @@ async def get_stats(token: str = Depends(verify_token)):
 async def reset_stats(token: str = Depends(verify_token)):
     """重置统计信息"""
     ocr_service.reset_stats()
+    reset_compression_stats()
+    tenant_registry.reset_stats()
     return {"message": "统计信息已重置"}
 
 
-@app.post("/predict", response_model=List[OCRResult])
+@app.post("/predict", response_model=List[Union[RegionOCRResult, OCRResult]])
 async def predict(
     request: OCRRequest,
+    raw_request: Request,
+    response: Response,
+    response_format: Optional[str] = Query(None, alias="format", description="响应格式: legacy / columnar / msgpack"),
     token: str = Depends(verify_token)
 ):
     """
     OCR 预测接口
     
-    根据您提供的示例格式，直接返回 OCR 结果列表
+    根据您提供的示例格式，直接返回 OCR 结果列表。
+    format=columnar（或 Accept: application/vnd.ocrmac.columnar+json）时返回列式结构，
+    format=msgpack（或 Accept: application/x-msgpack）时返回 MessagePack 二进制。
+    指定 regions 时只识别这些区域，每个结果带 region_id。
     """
     try:
         logger.info("开始处理 OCR 请求")
+        fmt = negotiate_format(response_format, raw_request.headers.get("accept", ""))
         
         # 处理图像
         result = await ocr_service.process_image(
@@ -217,14 +486,27 @@ async def predict(
             recognition_level=request.recognition_level,
             language_preference=request.language_preference,
             confidence_threshold=request.confidence_threshold,
-            framework=request.framework
+            framework=request.framework,
+            regions=request.regions
         )
         
-        logger.info(f"OCR 处理完成，返回 {len(result['results'])} 个结果")
+        logger.info("OCR 处理完成，返回 %d 个结果", len(result['results']))
         
+        headers = result_headers(result)
+        if fmt != FORMAT_LEGACY:
+            payload = results_to_columns(result['results'], binary=(fmt == FORMAT_MSGPACK))
+            payload['image_size'] = result['image_size']
+            payload['processing_time'] = result['processing_time']
+            add_result_fields(payload, result)
+            return render_columnar(payload, fmt, headers)
+
         # 直接返回结果列表，符合示例格式
-        return result['results']
+        response.headers.update(headers)
+        return result['results'].to_ocr_results()
         
+    except OverloadedError as e:
+        logger.warning(f"服务过载: {str(e)}")
+        raise HTTPException(status_code=503, detail=str(e))
     except ValueError as e:
         logger.error(f"输入验证错误: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
@@ -239,47 +521,78 @@ async def predict(
 @app.post("/predict-format", response_model=OCRFormatResponse)
 async def predict_format(
     request: OCRFormatRequest,
+    raw_request: Request,
+    response: Response,
+    response_format: Optional[str] = Query(None, alias="format", description="响应格式: legacy / columnar / msgpack"),
     token: str = Depends(verify_token)
 ):
     """
     带排版功能的 OCR 预测接口
 
-    返回原始 OCR 结果 + 本地排版结果 + 可选的 LLM 排版结果
+    返回原始 OCR 结果 + 本地排版结果 + 可选的 LLM 排版结果。
+    支持与 /predict 相同的列式响应格式，此时 results 为列式结构。
     """
     try:
-        logger.info(f"开始处理带排版的 OCR 请求，enable_llm_format={request.enable_llm_format}")
+        logger.info("开始处理带排版的 OCR 请求，enable_llm_format=%s", request.enable_llm_format)
+        fmt = negotiate_format(response_format, raw_request.headers.get("accept", ""))
 
-        # 处理图像 OCR
-        result = await ocr_service.process_image(
-            image_base64=request.image_base64,
-            recognition_level=request.recognition_level,
-            language_preference=request.language_preference,
-            confidence_threshold=request.confidence_threshold,
-            framework=request.framework
-        )
+        result = await run_ocr_and_format(request)
+
+        logger.info("带排版 OCR 处理完成，返回 %d 个结果", len(result['results']))
+
+        if fmt != FORMAT_LEGACY:
+            llm_format = result['llm_format']
+            payload = {
+                'results': results_to_columns(result['results'], binary=(fmt == FORMAT_MSGPACK)),
+                'local_format': result['local_format'].dict(),
+                'llm_format': llm_format.dict() if llm_format else None,
+                'processing_time': result['processing_time'],
+                'image_size': result['image_size']
+            }
+            add_result_fields(payload, result)
+            return render_columnar(payload, fmt, result_headers(result))
 
-        ocr_results = result['results']
-        image_size = result['image_size']
-        processing_time = result['processing_time']
+        response.headers.update(result_headers(result))
+        return build_format_response(result)
 
-        # 本地排版（始终执行）
-        local_format = format_locally(ocr_results, image_size)
+    except OverloadedError as e:
+        logger.warning(f"服务过载: {str(e)}")
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e:
+        logger.error(f"输入验证错误: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        logger.error(f"OCR 处理错误: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    except Exception as e:
+        logger.error(f"未知错误: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="服务器内部错误")
 
-        # LLM 排版（可选）
-        llm_format = None
-        if request.enable_llm_format:
-            llm_format = await format_with_llm(ocr_results)
 
-        logger.info(f"带排版 OCR 处理完成，返回 {len(ocr_results)} 个结果")
+@app.post("/predict-file", response_model=OCRFormatResponse)
+async def predict_file(
+    request: OCRFileRequest,
+    response: Response,
+    token: str = Depends(verify_token)
+):
+    """
+    本地文件 OCR 接口
 
-        return OCRFormatResponse(
-            results=ocr_results,
-            local_format=local_format,
-            llm_format=llm_format,
-            processing_time=processing_time,
-            image_size=image_size
-        )
+    与 /predict-format 相同，但图像从服务器本地路径读取（相对于 LOCAL_INPUT_ROOT），
+    使用内存映射，不经过 Base64 编码和 HTTP 传输。适用于与服务部署在同一台机器上的生产者。
+    """
+    try:
+        logger.info("开始处理本地文件 OCR 请求: %s", request.file_path)
+
+        result = await run_ocr_and_format(request)
 
+        logger.info("本地文件 OCR 处理完成，返回 %d 个结果", len(result['results']))
+        response.headers.update(result_headers(result))
+        return build_format_response(result)
+
+    except OverloadedError as e:
+        logger.warning(f"服务过载: {str(e)}")
+        raise HTTPException(status_code=503, detail=str(e))
     except ValueError as e:
         logger.error(f"输入验证错误: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
@@ -291,45 +604,423 @@ async def predict_format(
         raise HTTPException(status_code=500, detail="服务器内部错误")
 
 
+@app.post("/predict-document", response_model=OCRDocumentResponse)
+async def predict_document(
+    request: OCRDocumentRequest,
+    raw_request: Request,
+    token: str = Depends(verify_token)
+):
+    """
+    多页文档 OCR 接口
+
+    支持多页 TIFF 和 PDF，各页按需解码并并行识别，返回每页的结果和本地排版。
+    请求 Accept: application/x-ndjson（或 ?stream=true）时按完成顺序逐页流式返回。
+    """
+    try:
+        logger.info("开始处理多页文档 OCR 请求")
+
+        pages = iter_document_pages(request)
+        if wants_ndjson(raw_request):
+            return await ndjson_response(pages)
+
+        response = await collect_formatted_pages(pages)
+
+        logger.info("多页文档 OCR 处理完成，共 %d 页", response.page_count)
+
+        return response
+
+    except ValueError as e:
+        logger.error(f"输入验证错误: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        logger.error(f"OCR 处理错误: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    except Exception as e:
+        logger.error(f"未知错误: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="服务器内部错误")
+
+
+@app.post("/predict-batch", response_model=OCRDocumentResponse)
+async def predict_batch(
+    request: OCRBatchRequest,
+    raw_request: Request,
+    token: str = Depends(verify_token)
+):
+    """
+    批量图像 OCR 接口
+
+    各图像并行识别，page_index 为图像在请求中的下标。
+    请求 Accept: application/x-ndjson（或 ?stream=true）时按完成顺序逐张流式返回。
+    """
+    try:
+        logger.info("开始处理批量 OCR 请求，共 %d 张图像", len(request.images_base64))
+
+        pages = iter_batch_pages(request)
+        if wants_ndjson(raw_request):
+            return await ndjson_response(pages)
+
+        response = await collect_formatted_pages(pages)
+
+        logger.info("批量 OCR 处理完成，共 %d 张图像", response.page_count)
+
+        return response
+
+    except ValueError as e:
+        logger.error(f"输入验证错误: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        logger.error(f"OCR 处理错误: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    except Exception as e:
+        logger.error(f"未知错误: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="服务器内部错误")
+
+
+@app.post("/jobs", response_model=JobSubmitResponse, status_code=202)
+async def submit_job(
+    request: OCRJobRequest,
+    token: str = Depends(verify_token)
+):
+    """
+    提交异步 OCR 任务
+
+    立即返回任务 ID，通过 /jobs/{job_id} 轮询状态，或通过 callback_url 接收结果
+    """
+    try:
+        job = await job_manager.submit(request)
+        logger.info("已提交任务 %s", job['job_id'])
+        return job
+    except RuntimeError as e:
+        logger.error(f"提交任务失败: {str(e)}")
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+@app.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job_status(job_id: str, token: str = Depends(verify_token)):
+    """查询任务状态"""
+    job = await job_manager.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在或结果已过期")
+    return job
+
+
+@app.get("/jobs/{job_id}/result", response_model=OCRFormatResponse)
+async def get_job_result(job_id: str, token: str = Depends(verify_token)):
+    """获取任务结果（与 /predict-format 响应格式相同）"""
+    row = await job_manager.get_result(job_id)
+    if row is None:
+        raise HTTPException(status_code=404, detail="任务不存在或结果已过期")
+    if row['status'] != JOB_SUCCEEDED:
+        detail = f"任务状态为 {row['status']}"
+        if row['error']:
+            detail += f": {row['error']}"
+        raise HTTPException(status_code=409, detail=detail)
+    # 结果已经是序列化好的 JSON，直接返回
+    return Response(content=row['result'], media_type="application/json")
+
+
+def frame_options(params) -> Dict[str, Any]:
+    """解析帧流连接的识别参数（查询参数）"""
+    options: Dict[str, Any] = {}
+    recognition_level = params.get("recognition_level")
+    if recognition_level:
+        if recognition_level not in ['accurate', 'fast', 'cascade']:
+            raise ValueError("识别级别必须是 'accurate'、'fast' 或 'cascade'")
+        options['recognition_level'] = recognition_level
+    framework = params.get("framework")
+    if framework:
+        if framework not in ['vision', 'livetext']:
+            raise ValueError("框架必须是 'vision' 或 'livetext'")
+        options['framework'] = framework
+    language_preference = params.get("language_preference")
+    if language_preference:
+        options['language_preference'] = [lang.strip() for lang in language_preference.split(",") if lang.strip()]
+    confidence_threshold = params.get("confidence_threshold")
+    if confidence_threshold:
+        try:
+            options['confidence_threshold'] = float(confidence_threshold)
+        except ValueError:
+            raise ValueError("置信度阈值必须是 0.0-1.0 之间的数字")
+        if not 0.0 <= options['confidence_threshold'] <= 1.0:
+            raise ValueError("置信度阈值必须是 0.0-1.0 之间的数字")
+    return options
+
+
+@app.websocket("/ws/frames")
+async def frames_websocket(websocket: WebSocket):
+    """
+    增量 OCR 帧流接口（WebSocket）
+
+    连接时通过 Authorization 头或 token 查询参数认证，识别参数也通过查询参数指定
+    （recognition_level、language_preference（逗号分隔）、confidence_threshold、framework）。
+    之后每条二进制消息为一帧图像；每帧只重新识别与上一帧相比发生变化的区域，
+    服务端按顺序为每帧返回一条 JSON 文本消息，results 为整帧的列式结果。
+    """
+    authorization = websocket.headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        token = authorization[7:]
+    else:
+        token = websocket.query_params.get("token")
+    tenant = tenant_registry.authenticate(token) if token else None
+    if tenant is None:
+        await websocket.close(code=1008, reason="无效的认证令牌")
+        return
+    if drain_controller.rejecting:
+        await websocket.close(code=1013, reason="服务正在重启，请稍后重试")
+        return
+    tenant.requests += 1
+    current_tenant.set(tenant)
+
+    try:
+        options = frame_options(websocket.query_params)
+    except ValueError as e:
+        await websocket.close(code=1008, reason=str(e))
+        return
+
+    await websocket.accept()
+    session = FrameSession(settings.frame_tile_size, settings.frame_full_refresh_ratio)
+    frame_index = 0
+    logger.info("帧流连接已建立")
+
+    try:
+        while True:
+            if drain_controller.rejecting:
+                # 排空时在帧之间关闭连接，客户端应重新连接到其他实例
+                await websocket.close(code=1012, reason="服务正在重启")
+                break
+
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+
+            data = message.get("bytes")
+            if data is None:
+                payload = {'frame_index': frame_index, 'error': "请以二进制消息发送图像数据"}
+            else:
+                # 只统计正在处理的帧，空闲的连接不阻止排空
+                drain_controller.enter()
+                try:
+                    result = await ocr_service.process_frame(session, data, **options)
+                    payload = {
+                        'frame_index': frame_index,
+                        'results': results_to_columns(result['results']),
+                        'image_size': result['image_size'],
+                        'changed_tiles': result['changed_tiles'],
+                        'total_tiles': result['total_tiles'],
+                        'recognized_regions': result['recognized_regions'],
+                        'full_frame': result['full_frame'],
+                        'processing_time': result['processing_time']
+                    }
+                    if result['degradations']:
+                        payload['degradations'] = result['degradations']
+                except (ValueError, RuntimeError, OverloadedError) as e:
+                    logger.error(f"帧处理失败: {str(e)}")
+                    payload = {'frame_index': frame_index, 'error': str(e)}
+                finally:
+                    drain_controller.leave()
+
+            await websocket.send_text(dumps_json(payload).decode('utf-8'))
+            frame_index += 1
+    except WebSocketDisconnect:
+        pass
+    logger.info("帧流连接已关闭，共处理 %d 帧", session.frames)
+
+
+@app.get("/admin/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_request_profile(profile_id: str, token: str = Depends(verify_admin_token)):
+    """获取单请求性能分析结果（折叠栈格式）"""
+    collapsed = load_profile(profile_id)
+    if collapsed is None:
+        raise HTTPException(status_code=404, detail=f"性能分析结果不存在: {profile_id}")
+    return PlainTextResponse(collapsed)
+
+
+@app.post("/admin/profile", response_class=PlainTextResponse)
+async def profile_process(
+    seconds: float = Query(10.0, gt=0, description="采样时长（秒）"),
+    interval: Optional[float] = Query(None, gt=0, description="采样间隔（秒），默认 PROFILE_INTERVAL"),
+    token: str = Depends(verify_admin_token)
+):
+    """
+    对整个进程做限时采样
+
+    返回折叠栈（flamegraph.pl、speedscope 等工具可直接读取），栈根为线程名。
+    采样在独立线程中进行，期间服务正常处理请求。
+    """
+    seconds = min(seconds, settings.profile_max_seconds)
+    logger.info(f"开始整进程采样 {seconds:.1f}s")
+    sampler = await asyncio.get_event_loop().run_in_executor(
+        None, sample_process, seconds, interval or settings.profile_interval
+    )
+    return PlainTextResponse(
+        sampler.collapsed(),
+        headers={"X-Profile-Samples": str(sampler.samples)}
+    )
+
+
+@app.get("/search", response_model=SearchResponse)
+async def search_results(
+    q: str = Query(..., min_length=1, description="检索词，多个词以空格分隔，需全部命中"),
+    limit: int = Query(20, ge=1, le=100, description="最多返回的图像数"),
+    include_markdown: bool = Query(False, description="是否返回本地排版 Markdown"),
+    token: str = Depends(verify_token)
+):
+    """
+    全文检索已保存的 OCR 结果（需启用 RESULT_STORE_ENABLED）
+
+    返回包含检索词的图像及命中文本行的坐标，无需重新识别。新结果在后台批量写入，
+    最多延迟 RESULT_STORE_FLUSH_INTERVAL 秒后可检索。
+    """
+    if result_store is None:
+        raise HTTPException(status_code=404, detail="结果存储未启用")
+
+    start_time = time.time()
+    try:
+        hits = await result_store.search(q, limit, include_markdown)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return SearchResponse(query=q, hits=hits, processing_time=time.time() - start_time)
+
+
+def is_worker_process() -> bool:
+    """是否为 uvicorn 主进程创建的工作进程（--workers 大于 1 或自动重载模式）"""
+    return multiprocessing.parent_process() is not None
+
+
+@app.post("/admin/drain", response_model=Dict[str, Any], status_code=202)
+async def drain(token: str = Depends(verify_admin_token)):
+    """
+    排空整个服务，完成后退出（launchd 的 KeepAlive 会重新启动服务）
+
+    单进程时排空本进程，与收到 SIGTERM 的效果相同。多进程部署时 uvicorn 不会补上退出的工作进程，
+    因此改为向主进程发送 SIGTERM：主进程向所有工作进程发送 SIGTERM，各工作进程排空后整个服务退出。
+    """
+    if not is_worker_process():
+        start_drain("管理接口")
+        return {**drain_controller.get_state(), 'scope': 'process'}
+
+    if not settings.drain_on_sigterm:
+        raise HTTPException(
+            status_code=409,
+            detail="多进程部署且 DRAIN_ON_SIGTERM=false 时工作进程收到 SIGTERM 会立即退出，无法通过管理接口排空"
+        )
+    logger.warning("管理接口请求排空，通知主进程 %d 停止所有工作进程", os.getppid())
+    os.kill(os.getppid(), signal.SIGTERM)
+    return {**drain_controller.get_state(), 'scope': 'service'}
+
+
 @app.get("/supported-languages", response_model=Dict[str, List[str]])
 async def get_supported_languages(token: str = Depends(verify_token)):
     """获取支持的语言列表"""
     try:
-        # 导入必要的模块
-        import Vision
-        import objc
-        
-        with objc.autorelease_pool():
-            req = Vision.VNRecognizeTextRequest.alloc().init()
-            
-            # 获取不同识别级别的支持语言
-            req.setRecognitionLevel_(0)  # accurate
-            accurate_languages = req.supportedRecognitionLanguagesAndReturnError_(None)[0]
-            
-            req.setRecognitionLevel_(1)  # fast
-            fast_languages = req.supportedRecognitionLanguagesAndReturnError_(None)[0]
-            
-            return {
-                "accurate": list(accurate_languages),
-                "fast": list(fast_languages)
-            }
-            
+        return ocr_service.get_supported_languages()
     except Exception as e:
         logger.error(f"获取支持语言失败: {str(e)}")
         raise HTTPException(status_code=500, detail="无法获取支持的语言列表")
 
 
+startup_report.mark("注册路由")
+
+
 # 应用启动和关闭事件
+warmup_task: Optional[asyncio.Task] = None
+host_stats_task: Optional[asyncio.Task] = None
+drain_task: Optional[asyncio.Task] = None
+# 发布本进程状态供整机汇总的间隔（秒）
+HOST_STATS_INTERVAL = 1.0
+
+
+def busy_background_work() -> int:
+    """排空时仍需等待的后台工作数：执行中的异步任务和监听文件"""
+    count = job_manager.active
+    if directory_watcher:
+        count += directory_watcher.get_stats()['in_progress']
+    return count
+
+
+async def drain_and_exit():
+    """排空后让 uvicorn 正常关闭（SIGINT），关闭事件中再停止各组件"""
+    job_manager.pause()
+    if directory_watcher:
+        # 停止扫描新文件，已开始识别的文件继续处理
+        await directory_watcher.stop()
+    await drain_controller.run(settings.drain_grace, settings.drain_timeout, busy_background_work)
+    os.kill(os.getpid(), signal.SIGINT)
+
+
+def start_drain(reason: str):
+    """开始排空（重复调用无效）"""
+    global drain_task
+    if drain_controller.begin(reason):
+        drain_task = asyncio.create_task(drain_and_exit())
+
+
+def handle_sigterm():
+    """SIGTERM：开始排空；排空中再次收到时立即退出"""
+    if drain_controller.draining:
+        logger.warning("排空中再次收到 SIGTERM，立即退出")
+        os.kill(os.getpid(), signal.SIGINT)
+        return
+    start_drain("SIGTERM")
+
+
 @app.on_event("startup")
 async def startup_event():
-    """应用启动事件"""
+    """
+    应用启动事件
+
+    服务对象占用的资源（线程池、整机槽位文件、任务数据库）在这里创建，导入 src.api 没有这些副作用。
+    """
+    global warmup_task, host_stats_task
+    with startup_report.step("启动 OCR 服务"):
+        ocr_service.start()
+    # 预热在后台进行，期间 /health 正常返回，/ready 返回 503
+    warmup_task = asyncio.create_task(ocr_service.warm_up())
+    host_stats_task = asyncio.create_task(ocr_service.publish_host_stats(HOST_STATS_INTERVAL))
+    with startup_report.step("启动任务队列"):
+        await job_manager.start()
+    if result_store:
+        with startup_report.step("启动结果存储"):
+            await result_store.start()
+    if directory_watcher:
+        directory_watcher.start()
+    if settings.drain_on_sigterm:
+        # 替换 uvicorn 的 SIGTERM 处理：先排空，再通过 SIGINT 走 uvicorn 的正常关闭流程
+        try:
+            asyncio.get_event_loop().add_signal_handler(signal.SIGTERM, handle_sigterm)
+        except (ValueError, RuntimeError, NotImplementedError):
+            # 事件循环不在主线程（如测试客户端）时无法注册信号处理
+            logger.debug("无法注册 SIGTERM 排空处理")
+
     logger.info(f"{settings.app_name} v{settings.app_version} 启动完成")
     logger.info(f"服务器地址: http://{settings.host}:{settings.port}")
     logger.info(f"API 文档: http://{settings.host}:{settings.port}/docs")
+    startup_report.log()
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    """应用关闭事件"""
+    """
+    应用关闭事件
+
+    排空后或直接关闭（SIGINT）时调用：停止后台任务、目录监听和任务队列
+    （未完成的任务在下次启动时重新排队），关闭 OCR 服务，并输出最终统计。
+    """
     logger.info(f"{settings.app_name} 正在关闭...")
-    # 这里可以添加清理代码 
\ No newline at end of file
+    tasks = [task for task in (warmup_task, host_stats_task, drain_task) if task and not task.done()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    if directory_watcher:
+        await directory_watcher.stop()
+    await job_manager.stop()
+    if result_store:
+        # 写入队列中剩余的结果
+        await result_store.stop()
+    ocr_service.shutdown()
+    stats = ocr_service.get_stats()
+    logger.info(
+        "最终统计: 请求 %d，成功 %d，失败 %d，平均耗时 %.3fs",
+        stats['total_requests'], stats['successful_requests'], stats['failed_requests'],
+        stats['average_processing_time']
+    ) 
\ No newline at end of file
@@ -0,0 +1,118 @@
+"""
+回调地址检查模块
+异步任务完成后服务端会向 callback_url 发起 POST，持有令牌的调用方可以借此让服务访问内网地址（SSRF）。
+未配置 JOB_CALLBACK_ALLOWED_HOSTS 时只允许解析到公网地址的主机，配置后只允许列出的主机
+"""
+import asyncio
+import ipaddress
+import socket
+from typing import Any, Dict, Optional, Tuple, Union
+from urllib.parse import urlsplit, urlunsplit
+
+from .config import settings
+
+IPAddress = Union[ipaddress.IPv4Address, ipaddress.IPv6Address]
+
+
+def _is_public(address: IPAddress) -> bool:
+    """是否为公网单播地址（排除回环、私有、链路本地、保留和组播地址）"""
+    if isinstance(address, ipaddress.IPv6Address) and address.ipv4_mapped is not None:
+        address = address.ipv4_mapped
+    return address.is_global and not address.is_multicast
+
+
+def _host_allowed(host: str) -> bool:
+    """主机是否在 JOB_CALLBACK_ALLOWED_HOSTS 中（*.example.com 匹配其所有子域名）"""
+    for pattern in settings.get_job_callback_allowed_hosts():
+        if pattern.startswith("*."):
+            if host.endswith(pattern[1:]):
+                return True
+        elif host == pattern:
+            return True
+    return False
+
+
+def check_callback_url(url: str) -> str:
+    """
+    检查回调地址的协议和主机（提交任务时调用，不做 DNS 解析）
+
+    Returns:
+        小写的主机名
+
+    Raises:
+        ValueError: 地址无效、主机不在允许列表中，或主机是非公网 IP
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError("回调地址必须是 http:// 或 https:// URL")
+    host = parts.hostname.lower().rstrip(".")
+
+    if settings.get_job_callback_allowed_hosts():
+        if not _host_allowed(host):
+            raise ValueError(f"回调主机不在允许列表中: {host}")
+        return host
+
+    if host == "localhost" or host.endswith(".localhost"):
+        raise ValueError(f"不允许回调到内网地址: {host}")
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return host
+    if not _is_public(address):
+        raise ValueError(f"不允许回调到内网地址: {host}")
+    return host
+
+
+async def resolve_callback_url(url: str) -> Optional[str]:
+    """
+    发送回调前再次检查地址，未配置允许列表时确认主机解析到的所有地址都是公网地址
+
+    Returns:
+        检查过的地址（发送时直接连接该地址，避免再次解析时 DNS 已被改指内网）；
+        配置了允许列表或主机本身就是 IP 时返回 None
+
+    Raises:
+        ValueError: 地址不允许或无法解析
+    """
+    host = check_callback_url(url)
+    if settings.get_job_callback_allowed_hosts():
+        return None
+    try:
+        ipaddress.ip_address(host)
+        return None
+    except ValueError:
+        pass
+
+    loop = asyncio.get_event_loop()
+    try:
+        infos = await loop.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+    except socket.gaierror as e:
+        raise ValueError(f"无法解析回调主机 {host}: {str(e)}")
+    addresses = [ipaddress.ip_address(info[4][0].split("%", 1)[0]) for info in infos]
+    if not addresses:
+        raise ValueError(f"无法解析回调主机 {host}")
+    for address in addresses:
+        if not _is_public(address):
+            raise ValueError(f"回调主机 {host} 解析到内网地址: {address}")
+    return str(addresses[0])
+
+
+def pin_callback_url(url: str, address: Optional[str]) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+    """
+    把回调地址中的主机替换为检查过的 IP
+
+    Returns:
+        (连接用的 URL, 请求头, 请求扩展)：Host 请求头保留原主机名，
+        https 时通过 sni_hostname 按原主机名握手并校验证书
+    """
+    if address is None:
+        return url, {}, {}
+    parts = urlsplit(url)
+    userinfo, _, host_header = parts.netloc.rpartition("@")
+    netloc = f"[{address}]" if ":" in address else address
+    if parts.port:
+        netloc = f"{netloc}:{parts.port}"
+    if userinfo:
+        netloc = f"{userinfo}@{netloc}"
+    extensions = {"sni_hostname": parts.hostname} if parts.scheme == "https" else {}
+    return urlunsplit(parts._replace(netloc=netloc)), {"Host": host_header}, extensions
@@ -0,0 +1,115 @@
+"""
+熔断器模块
+在下游服务连续失败时快速失败，并周期性放行探测请求以自动恢复
+"""
+import logging
+import time
+from typing import Any, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """
+    简单的三态熔断器
+
+    - closed: 正常放行，连续失败达到阈值后进入 open
+    - open: 直接拒绝，经过 recovery_time 后进入 half_open
+    - half_open: 只放行一个探测请求，成功则恢复 closed，失败则重新 open
+
+    所有方法都在事件循环线程中调用，不需要加锁。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int, recovery_time: float):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.recovery_time = recovery_time
+
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+
+        # 统计
+        self.total_failures = 0
+        self.total_successes = 0
+        self.times_opened = 0
+        self.rejected = 0
+
+    def allow_request(self) -> bool:
+        """判断当前是否允许发起请求"""
+        if self.state == self.CLOSED:
+            return True
+
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at >= self.recovery_time:
+                # 进入半开状态，放行一个探测请求
+                self.state = self.HALF_OPEN
+                self.probe_in_flight = True
+                logger.info(f"熔断器 {self.name} 进入半开状态，放行探测请求")
+                return True
+            self.rejected += 1
+            return False
+
+        # HALF_OPEN：探测请求未返回前拒绝其他请求
+        if self.probe_in_flight:
+            self.rejected += 1
+            return False
+        self.probe_in_flight = True
+        return True
+
+    def is_available(self) -> bool:
+        """判断是否可能放行请求（不改变状态）"""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            return time.monotonic() - self.opened_at >= self.recovery_time
+        return not self.probe_in_flight
+
+    def record_success(self):
+        """记录一次成功调用"""
+        self.total_successes += 1
+        self.consecutive_failures = 0
+        self.probe_in_flight = False
+        if self.state != self.CLOSED:
+            logger.info(f"熔断器 {self.name} 探测成功，恢复正常")
+            self.state = self.CLOSED
+
+    def record_failure(self):
+        """记录一次失败调用"""
+        self.total_failures += 1
+        self.consecutive_failures += 1
+        self.probe_in_flight = False
+
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.times_opened += 1
+                logger.warning(
+                    f"熔断器 {self.name} 打开，连续失败 {self.consecutive_failures} 次，"
+                    f"{self.recovery_time}s 后探测"
+                )
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def release_probe(self):
+        """探测请求未产生结论（如被取消）时释放探测名额"""
+        self.probe_in_flight = False
+
+    def get_state(self) -> Dict[str, Any]:
+        """获取熔断器状态"""
+        retry_in = 0.0
+        if self.state == self.OPEN:
+            retry_in = max(0.0, self.recovery_time - (time.monotonic() - self.opened_at))
+        return {
+            'state': self.state,
+            'consecutive_failures': self.consecutive_failures,
+            'total_failures': self.total_failures,
+            'total_successes': self.total_successes,
+            'times_opened': self.times_opened,
+            'rejected': self.rejected,
+            'retry_in': round(retry_in, 3)
+        }
@@ -0,0 +1,277 @@
+"""
+响应压缩模块
+根据 Accept-Encoding 协商 zstd / brotli / gzip 压缩，支持流式响应，并统计压缩率和 CPU 耗时
+"""
+import logging
+import time
+import zlib
+from typing import Dict, Any, List, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# 可选依赖：brotli 和 zstandard
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# 服务端偏好顺序：同等 q 值时优先压缩率/速度更好的编码
+ENCODING_PREFERENCE = ("zstd", "br", "gzip")
+
+
+def available_encodings() -> List[str]:
+    """当前环境可用的压缩编码"""
+    encodings = []
+    if zstandard is not None:
+        encodings.append("zstd")
+    if brotli is not None:
+        encodings.append("br")
+    encodings.append("gzip")
+    return encodings
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """解析 Accept-Encoding（含 q 值），返回选中的编码，不接受压缩时返回 None"""
+    accepted: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        parts = item.strip().split(";")
+        name = parts[0].strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in parts[1:]:
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[name] = q
+
+    candidates = []
+    for rank, encoding in enumerate(ENCODING_PREFERENCE):
+        if encoding not in available_encodings():
+            continue
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > 0:
+            candidates.append((-q, rank, encoding))
+    if not candidates:
+        return None
+    return min(candidates)[2]
+
+
+class _Compressor:
+    """统一不同编码的增量压缩接口"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "zstd":
+            self._obj = zstandard.ZstdCompressor(level=settings.compression_zstd_level).compressobj()
+        elif encoding == "br":
+            self._obj = brotli.Compressor(quality=settings.compression_brotli_quality)
+        else:
+            # wbits=31：带 gzip 头
+            self._obj = zlib.compressobj(settings.compression_gzip_level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._obj.process(data)
+        return self._obj.compress(data)
+
+    def flush(self) -> bytes:
+        """刷新已输入的数据，使客户端可以立即解码（流式响应每个分块后调用）"""
+        if self.encoding == "zstd":
+            return self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        if self.encoding == "br":
+            return self._obj.flush()
+        return self._obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        """结束压缩流"""
+        if self.encoding == "zstd":
+            return self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+        if self.encoding == "br":
+            return self._obj.finish()
+        return self._obj.flush(zlib.Z_FINISH)
+
+
+# 压缩统计
+_compression_stats: Dict[str, Any] = {
+    'responses_compressed': 0,
+    'responses_skipped_small': 0,
+    'bytes_in': 0,
+    'bytes_out': 0,
+    'cpu_time': 0.0,
+    'by_encoding': {}
+}
+
+
+def _record(encoding: str, bytes_in: int, bytes_out: int, cpu_time: float):
+    """记录一次压缩"""
+    _compression_stats['bytes_in'] += bytes_in
+    _compression_stats['bytes_out'] += bytes_out
+    _compression_stats['cpu_time'] += cpu_time
+    _compression_stats['responses_compressed'] += 1
+    per = _compression_stats['by_encoding'].setdefault(
+        encoding, {'responses': 0, 'bytes_in': 0, 'bytes_out': 0, 'cpu_time': 0.0}
+    )
+    per['responses'] += 1
+    per['bytes_in'] += bytes_in
+    per['bytes_out'] += bytes_out
+    per['cpu_time'] += cpu_time
+
+
+def get_compression_stats() -> Dict[str, Any]:
+    """获取压缩统计（ratio 为压缩后/压缩前）"""
+    stats = {k: v for k, v in _compression_stats.items() if k != 'by_encoding'}
+    stats['ratio'] = (
+        round(stats['bytes_out'] / stats['bytes_in'], 4) if stats['bytes_in'] else None
+    )
+    stats['by_encoding'] = {k: v.copy() for k, v in _compression_stats['by_encoding'].items()}
+    stats['available_encodings'] = available_encodings()
+    return stats
+
+
+def reset_compression_stats():
+    """重置压缩统计"""
+    _compression_stats.update({
+        'responses_compressed': 0,
+        'responses_skipped_small': 0,
+        'bytes_in': 0,
+        'bytes_out': 0,
+        'cpu_time': 0.0,
+        'by_encoding': {}
+    })
+
+
+class CompressionMiddleware:
+    """
+    ASGI 响应压缩中间件
+
+    - 普通响应：小于 min_size 的不压缩，否则整体压缩并更新 Content-Length
+    - 流式响应（more_body=True）：逐块压缩并在每块后刷新，客户端可以立即解码每一行
+    """
+
+    def __init__(self, app: ASGIApp, min_size: int = 1024):
+        self.app = app
+        self.min_size = min_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressionResponder(self.app, encoding, self.min_size)
+        await responder(scope, receive, send)
+
+
+class _CompressionResponder:
+    """单个请求的压缩状态"""
+
+    def __init__(self, app: ASGIApp, encoding: str, min_size: int):
+        self.app = app
+        self.encoding = encoding
+        self.min_size = min_size
+        self.send: Optional[Send] = None
+        self.start_message: Optional[Message] = None
+        self.started = False
+        self.passthrough = False
+        self.compressor: Optional[_Compressor] = None
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cpu_time = 0.0
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        self.send = send
+        await self.app(scope, receive, self.send_wrapper)
+
+    def _compress(self, data: bytes, final: bool, flush: bool) -> bytes:
+        start = time.thread_time()
+        out = self.compressor.compress(data)
+        if final:
+            out += self.compressor.finish()
+        elif flush:
+            out += self.compressor.flush()
+        self.cpu_time += time.thread_time() - start
+        self.bytes_in += len(data)
+        self.bytes_out += len(out)
+        return out
+
+    def _finish_stats(self):
+        _record(self.encoding, self.bytes_in, self.bytes_out, self.cpu_time)
+
+    async def send_wrapper(self, message: Message):
+        message_type = message["type"]
+
+        if message_type == "http.response.start":
+            # 等到第一个 body 分块再决定是否压缩
+            self.start_message = message
+            headers = Headers(raw=message["headers"])
+            if "content-encoding" in headers:
+                self.passthrough = True
+            return
+
+        if message_type != "http.response.body":
+            await self.send(message)
+            return
+
+        if self.passthrough:
+            if not self.started:
+                self.started = True
+                await self.send(self.start_message)
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if not self.started:
+            self.started = True
+            headers = MutableHeaders(raw=self.start_message["headers"])
+
+            if not more_body and len(body) < self.min_size:
+                # 小响应不值得压缩
+                self.passthrough = True
+                _compression_stats['responses_skipped_small'] += 1
+                await self.send(self.start_message)
+                await self.send(message)
+                return
+
+            self.compressor = _Compressor(self.encoding)
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+
+            if not more_body:
+                # 普通响应：整体压缩
+                compressed = self._compress(body, final=True, flush=False)
+                headers["Content-Length"] = str(len(compressed))
+                await self.send(self.start_message)
+                await self.send({"type": "http.response.body", "body": compressed})
+                self._finish_stats()
+                return
+
+            # 流式响应：长度未知
+            if "content-length" in headers:
+                del headers["content-length"]
+            await self.send(self.start_message)
+
+        chunk = self._compress(body, final=not more_body, flush=True)
+        await self.send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+        if not more_body:
+            self._finish_stats()
@@ -0,0 +1,167 @@
+"""
+自适应识别并发模块
+在运行时根据实测的吞吐量（每秒完成的识别数）用爬山法调整同时执行的识别数，
+不同机器、框架和图像尺寸下各自找到吞吐量最高的并发度
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# 吞吐量变化不超过该比例时视为持平
+THROUGHPUT_TOLERANCE = 0.05
+# 吞吐量持平而平均耗时上升超过该比例时，认为并发过高
+LATENCY_TOLERANCE = 0.2
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    爬山法并发限制器
+
+    每个窗口（interval 秒）结束时比较本窗口与上一窗口的吞吐量：
+    吞吐量上升则沿原方向继续调整一步，下降则反向；吞吐量持平时若平均耗时上升则减小并发，
+    否则保持原方向试探。只有窗口内并发达到上限（存在排队）时才调整，
+    负载不足时吞吐量反映的是请求量而不是处理能力。
+
+    enabled 为 False 时只统计，不限制并发。
+    所有方法都在事件循环线程中调用，不需要加锁。
+    """
+
+    def __init__(self, enabled: bool, initial: int, minimum: int, maximum: int, interval: float):
+        self.enabled = enabled
+        self.minimum = minimum
+        self.maximum = maximum
+        self.interval = interval
+        self.limit = max(minimum, min(maximum, initial))
+
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self.direction = 1
+
+        # 当前窗口
+        self._window_start = time.monotonic()
+        self._completions = 0
+        self._latency_sum = 0.0
+        self._saturated = False
+
+        # 上一个饱和窗口的测量值
+        self.last_throughput: Optional[float] = None
+        self.last_latency: Optional[float] = None
+
+        # 统计
+        self.increases = 0
+        self.decreases = 0
+
+    async def acquire(self):
+        """获取执行许可，并发已达上限时排队等待"""
+        if not self.enabled:
+            self.in_flight += 1
+            return
+        if self.in_flight >= self.limit or self._waiters:
+            self._saturated = True
+            future = asyncio.get_event_loop().create_future()
+            self._waiters.append(future)
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # 已被放行，归还许可
+                    self.in_flight -= 1
+                    self._wake()
+                else:
+                    self._waiters.remove(future)
+                raise
+            return
+        self.in_flight += 1
+        if self.in_flight >= self.limit:
+            self._saturated = True
+
+    def release(self, latency: Optional[float] = None):
+        """
+        归还许可
+
+        Args:
+            latency: 识别执行耗时（秒）；任务失败时为 None，不计入吞吐量
+        """
+        self.in_flight -= 1
+        if latency is not None:
+            self._completions += 1
+            self._latency_sum += latency
+        self._maybe_adjust()
+        self._wake()
+
+    def _wake(self):
+        """在并发上限内按顺序放行等待者"""
+        while self._waiters and self.in_flight < self.limit:
+            future = self._waiters.popleft()
+            if future.done():
+                continue
+            self.in_flight += 1
+            future.set_result(None)
+
+    def _maybe_adjust(self):
+        """窗口结束时根据吞吐量调整并发上限"""
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        elapsed = now - self._window_start
+        if elapsed < self.interval:
+            return
+
+        saturated, completions = self._saturated, self._completions
+        throughput = completions / elapsed
+        latency = self._latency_sum / completions if completions else None
+        self._window_start = now
+        self._completions = 0
+        self._latency_sum = 0.0
+        self._saturated = bool(self._waiters) or self.in_flight >= self.limit
+
+        if not saturated or not completions:
+            # 负载不足，无法判断增加并发是否有效；下次饱和时重新建立基线
+            self.last_throughput = self.last_latency = None
+            return
+
+        if self.last_throughput is not None:
+            if throughput > self.last_throughput * (1 + THROUGHPUT_TOLERANCE):
+                pass  # 上一步有效，沿原方向继续
+            elif throughput < self.last_throughput * (1 - THROUGHPUT_TOLERANCE):
+                self.direction = -self.direction
+            elif self.last_latency is not None and latency > self.last_latency * (1 + LATENCY_TOLERANCE):
+                # 吞吐量没有提升，只是每个任务变慢了
+                self.direction = -1
+
+        new_limit = self.limit + self.direction
+        if new_limit < self.minimum or new_limit > self.maximum:
+            self.direction = -self.direction
+            new_limit = self.limit + self.direction
+        new_limit = max(self.minimum, min(self.maximum, new_limit))
+
+        if new_limit != self.limit:
+            if new_limit > self.limit:
+                self.increases += 1
+            else:
+                self.decreases += 1
+            logger.info(
+                "识别并发 %d → %d（吞吐量 %.2f/s，平均耗时 %.3fs）", self.limit, new_limit, throughput, latency
+            )
+            self.limit = new_limit
+
+        self.last_throughput, self.last_latency = throughput, latency
+
+    def get_state(self) -> Dict[str, Any]:
+        """获取限制器状态"""
+        return {
+            'enabled': self.enabled,
+            'limit': self.limit,
+            'min': self.minimum,
+            'max': self.maximum,
+            'in_flight': self.in_flight,
+            'waiting': sum(1 for future in self._waiters if not future.done()),
+            'last_throughput': round(self.last_throughput, 4) if self.last_throughput is not None else None,
+            'last_latency': round(self.last_latency, 4) if self.last_latency is not None else None,
+            'increases': self.increases,
+            'decreases': self.decreases
+        }
@@ -3,7 +3,8 @@
 提供应用程序的配置管理功能
 """
 import os
-from typing import List, Optional
+import json
+from typing import List, Optional, Dict, Any
 from pydantic_settings import BaseSettings
 
 
@@ -14,22 +15,58 @@ class Settings(BaseSettings):
     host: str = "0.0.0.0"
     port: int = 8004
     workers: int = 4
+
+    # 排空（优雅停机）配置
+    drain_on_sigterm: bool = True  # 收到 SIGTERM 时先排空再退出（否则立即按 uvicorn 默认方式关闭）
+    drain_grace: float = 5.0  # 排空开始后 /ready 返回 503、但仍接收请求的秒数，留给负载均衡器摘除本实例
+    drain_timeout: float = 20.0  # 等待进行中的识别请求、异步任务和监听文件完成的最长秒数
     
     # 安全配置
     auth_token: str = "test"
     allowed_origins: str = "*"  # 简化为字符串，在使用时转换为列表
+    # 多租户令牌（JSON 数组），每项包含 token、tenant，可选 weight（调度权重）、rate（每秒请求数）、
+    # burst（突发请求数）、max_concurrency（同时执行的识别任务数）；auth_token 始终对应 default 租户
+    api_tokens: Optional[str] = None
+
+    admin_token: Optional[str] = None  # 管理接口（性能分析等）使用的令牌，未设置时管理接口不可用
+
+    def get_api_tokens(self) -> List[Dict[str, Any]]:
+        """解析多租户令牌列表"""
+        if not self.api_tokens:
+            return []
+        tokens = json.loads(self.api_tokens)
+        if not isinstance(tokens, list):
+            raise ValueError("API_TOKENS 必须是 JSON 数组")
+        return [t for t in tokens if t.get('token')]
     
     # OCR 配置
-    recognition_level: str = "accurate"  # accurate 或 fast
+    recognition_level: str = "accurate"  # accurate、fast 或 cascade
     language_preference: Optional[str] = None  # 用逗号分隔的语言列表，如 "en-US,zh-Hans"
     confidence_threshold: float = 0.0
     framework: str = "vision"  # vision 或 livetext
+    cascade_confidence_threshold: float = 0.5  # cascade 模式下 fast 结果低于该置信度时用 accurate 重识别
+    cascade_padding: float = 0.25  # 重识别裁剪框的外扩比例（相对文本框高度）
     
     def get_language_preference_list(self) -> Optional[List[str]]:
         """将逗号分隔的语言字符串转换为列表"""
         if not self.language_preference:
             return None
         return [lang.strip() for lang in self.language_preference.split(",") if lang.strip()]
+
+    # 预热配置
+    warmup_enabled: bool = True  # 启动时在每个工作线程上预热识别引擎，完成前 /ready 返回 503
+    warmup_frameworks: Optional[str] = None  # 需要预热的框架（逗号分隔），默认只预热 framework
+    warmup_levels: str = "accurate,fast"  # vision 框架需要预热的识别级别（逗号分隔）
+
+    def get_warmup_frameworks(self) -> List[str]:
+        """需要预热的框架列表"""
+        if not self.warmup_frameworks:
+            return [self.framework]
+        return [name.strip() for name in self.warmup_frameworks.split(",") if name.strip()]
+
+    def get_warmup_levels(self) -> List[str]:
+        """需要预热的识别级别列表"""
+        return [level.strip() for level in self.warmup_levels.split(",") if level.strip()]
     
     # 应用配置
     app_name: str = "OCR Mac API"
@@ -39,12 +76,107 @@ class Settings(BaseSettings):
     # 日志配置
     log_level: str = "INFO"
     log_file: Optional[str] = None
+    log_format: str = "text"  # 日志格式：text（文本）或 json（每行一条 JSON）
+    log_queue_size: int = 10000  # 日志队列容量，写入跟不上时丢弃新日志而不阻塞请求
+    log_success_sample_rate: float = 1.0  # 成功请求的 INFO/DEBUG 日志采样比例，WARNING 及以上始终记录
     
     # 性能配置
     max_image_size: int = 10 * 1024 * 1024  # 10MB
     max_image_width: int = 20000  # 最大图像宽度
     max_image_height: int = 20000  # 最大图像高度
     request_timeout: int = 30  # 30秒
+    image_formats: str = "PNG,JPEG,TIFF,BMP,GIF,WEBP"  # 接受的图像格式（PIL 格式名，逗号分隔），只注册这些解码器
+    max_document_size: int = 50 * 1024 * 1024  # 多页文档最大 50MB
+    max_document_pages: int = 200  # 多页文档最大页数
+    pdf_render_dpi: int = 200  # PDF 渲染分辨率
+    max_batch_images: int = 100  # 批量接口单次最多图像数
+    max_regions: int = 50  # 单次请求最多感兴趣区域数
+
+    # 自适应并发配置
+    adaptive_concurrency_enabled: bool = False  # 根据实测吞吐量自动调整本进程同时执行的识别数（初始值为 workers）
+    adaptive_min_concurrency: int = 1  # 自适应并发下限
+    adaptive_max_concurrency: int = 16  # 自适应并发上限（启用时线程池按该值创建）
+    adaptive_interval: float = 10.0  # 每次评估吞吐量的窗口长度（秒）
+
+    # 整机并发配置（多个工作进程共享）
+    host_max_concurrency: Optional[int] = None  # 整机同时进行的识别数上限，默认等于 workers（启用自适应并发时为其上限），0 表示不限制
+    host_lock_dir: Optional[str] = None  # 槽位锁文件和进程状态目录，默认为系统临时目录下的 ocrmac-api-<端口>
+
+    def get_host_max_concurrency(self) -> int:
+        """整机识别并发上限"""
+        if self.host_max_concurrency is not None:
+            return self.host_max_concurrency
+        return self.adaptive_max_concurrency if self.adaptive_concurrency_enabled else self.workers
+
+    def get_host_lock_dir(self) -> str:
+        """槽位锁文件目录"""
+        if self.host_lock_dir:
+            return self.host_lock_dir
+        import tempfile
+        return os.path.join(tempfile.gettempdir(), f"ocrmac-api-{self.port}")
+
+    # 路由模式配置（python main.py --router）
+    router_backends: Optional[str] = None  # 后端实例地址（逗号分隔），如 "http://mac1:8004,http://mac2:8004"
+    router_backend_token: Optional[str] = None  # 访问后端使用的认证令牌，默认与 auth_token 相同
+    router_health_interval: float = 2.0  # 后端健康检查间隔（秒）
+    router_eject_time: float = 10.0  # 后端请求失败或返回 429/503 后的摘除时间（秒）
+    router_timeout: float = 120.0  # 转发请求的超时时间（秒）
+    router_batch_min_chunk: int = 4  # 批量请求拆分到各后端时每块的最少图像数
+
+    def get_router_backends(self) -> List[str]:
+        """后端实例地址列表"""
+        if not self.router_backends:
+            return []
+        return [url.strip() for url in self.router_backends.split(",") if url.strip()]
+
+    # 性能分析配置（需要 admin_token）
+    profile_dir: Optional[str] = None  # 单请求分析结果目录，默认为系统临时目录下的 ocrmac-profiles
+    profile_interval: float = 0.002  # 采样间隔（秒）
+    profile_max_seconds: float = 60.0  # 整进程采样的最长时间（秒）
+    profile_keep: int = 100  # 保留最近多少份单请求分析结果
+
+    # 像素内存预算配置
+    memory_budget_mb: int = 4096  # 同时处理的图像解码后最多占用的内存（MB），0 表示不限制
+    memory_budget_wait: float = 30.0  # 等待内存预算的最长时间（秒），超时返回 503
+
+    # 负载自适应降级配置
+    degradation_enabled: bool = False  # 延迟目标有风险时自动降级（fast → 缩小图像 → 跳过 LLM 排版）
+    degradation_latency_target: float = 3.0  # OCR 延迟目标（秒，含线程池排队时间）
+    degradation_step_interval: float = 5.0  # 两次调整降级级别的最小间隔（秒）
+    degradation_max_side: int = 2000  # 缩小图像降级时的最长边（像素）
+
+    # 近似重复图像复用配置
+    dedup_enabled: bool = False  # 感知哈希相近的图像直接复用之前的识别结果
+    dedup_hash_size: int = 16  # dHash 边长，哈希位数为其平方
+    dedup_max_distance: int = 10  # 视为同一图像的最大汉明距离
+    dedup_max_entries: int = 1000  # 索引最多保存的图像数（超过时淘汰最久未使用的）
+
+    # 增量 OCR（帧流）配置
+    frame_tile_size: int = 128  # 比较相邻帧时的网格块大小（像素）
+    frame_full_refresh_ratio: float = 0.5  # 变化块超过该比例时直接识别整帧
+
+    # 本地文件输入配置
+    local_input_root: Optional[str] = None  # 允许 /predict-file 读取的根目录，未配置时禁用
+    watch_dir: Optional[str] = None  # 目录监听模式：自动识别放入该目录的图像，结果写在同目录
+    watch_interval: float = 2.0  # 扫描间隔（秒）
+    watch_settle_time: float = 1.0  # 文件最后修改后等待多久才处理（秒），避免读到未写完的文件
+    watch_extensions: str = ".png,.jpg,.jpeg,.tif,.tiff,.bmp,.gif,.webp"  # 监听的文件扩展名
+    watch_enable_llm_format: bool = False  # 监听模式是否同时进行 LLM 排版
+
+    def get_image_formats(self) -> List[str]:
+        """获取接受的图像格式列表"""
+        return [name.strip().upper() for name in self.image_formats.split(",") if name.strip()]
+
+    def get_watch_extensions(self) -> List[str]:
+        """将逗号分隔的扩展名转换为小写列表"""
+        return [ext.strip().lower() for ext in self.watch_extensions.split(",") if ext.strip()]
+
+    # 响应压缩配置
+    compression_enabled: bool = True  # 根据 Accept-Encoding 压缩响应
+    compression_min_size: int = 1024  # 小于该字节数的响应不压缩
+    compression_gzip_level: int = 5  # gzip 压缩级别（1-9，越高越省带宽越耗 CPU）
+    compression_brotli_quality: int = 4  # brotli 质量（0-11）
+    compression_zstd_level: int = 3  # zstd 压缩级别
 
     # LLM 排版配置
     llm_base_url: Optional[str] = None  # OpenAI 兼容 API 地址
@@ -52,10 +184,61 @@ class Settings(BaseSettings):
     llm_model: str = "gpt-4o-mini"  # 模型名称
     llm_timeout: int = 30  # LLM 请求超时（秒）
     llm_max_tokens: int = 4096  # 最大输出 token 数
+    llm_max_concurrency: int = 8  # 同时进行的 LLM 请求上限
+    llm_queue_timeout: float = 5.0  # 等待 LLM 并发槽位的最长时间（秒）
+    llm_breaker_failure_threshold: int = 5  # 连续超时/5xx 多少次后熔断
+    llm_breaker_recovery_time: float = 30.0  # 熔断后多久放行探测请求（秒）
+    # 多端点配置（JSON 数组），如 [{"base_url": "...", "api_key": "...", "weight": 2, "model": "..."}]
+    llm_endpoints: Optional[str] = None
+    llm_ewma_alpha: float = 0.3  # 端点延迟 EWMA 平滑系数
+    llm_latency_window: int = 200  # 计算延迟分位数的样本窗口
+    llm_hedge_enabled: bool = False  # 首个请求超过延迟分位数时向另一个端点发出对冲请求
+    llm_hedge_percentile: float = 95.0  # 触发对冲的延迟分位数
+    llm_hedge_min_samples: int = 20  # 开始对冲前需要的最少延迟样本数
+
+    # OCR 结果存储配置（全文检索）
+    result_store_enabled: bool = False  # 是否持久化带排版接口的识别结果并建立全文索引
+    result_store_path: str = "data/results.db"  # 结果存储 SQLite 数据库路径
+    result_store_batch_size: int = 100  # 每批写入的最大结果数
+    result_store_flush_interval: float = 1.0  # 未攒满一批时的最长写入间隔（秒）
+    result_store_queue_size: int = 10000  # 待写入队列容量，写入跟不上时丢弃新结果
+
+    # 异步任务配置
+    job_db_path: str = "data/jobs.db"  # 任务队列 SQLite 数据库路径
+    job_concurrency: int = 4  # 同时执行的任务数
+    job_result_ttl: int = 3600  # 任务结果保留时间（秒）
+    job_max_attempts: int = 3  # 任务因进程重启中断后的最大尝试次数
+    job_callback_timeout: float = 10.0  # 回调请求超时（秒）
+    # 允许的回调主机（逗号分隔，*.example.com 匹配子域名）；未配置时只允许解析到公网地址的主机
+    job_callback_allowed_hosts: Optional[str] = None
+    job_purge_interval: float = 60.0  # 清理过期结果的间隔（秒）
+
+    def get_job_callback_allowed_hosts(self) -> List[str]:
+        """将逗号分隔的回调主机转换为小写列表"""
+        if not self.job_callback_allowed_hosts:
+            return []
+        return [host.strip().lower() for host in self.job_callback_allowed_hosts.split(",") if host.strip()]
+
+    def get_llm_endpoints(self) -> List[Dict[str, Any]]:
+        """解析 LLM 端点列表，未配置 llm_endpoints 时回退到单端点配置"""
+        if self.llm_endpoints:
+            endpoints = json.loads(self.llm_endpoints)
+            if not isinstance(endpoints, list):
+                raise ValueError("LLM_ENDPOINTS 必须是 JSON 数组")
+            return [e for e in endpoints if e.get('base_url')]
+        if self.llm_base_url and self.llm_api_key:
+            return [{
+                'name': 'default',
+                'base_url': self.llm_base_url,
+                'api_key': self.llm_api_key,
+                'model': self.llm_model,
+                'weight': 1.0
+            }]
+        return []
 
     def is_llm_configured(self) -> bool:
         """检查 LLM 是否已配置"""
-        return bool(self.llm_base_url and self.llm_api_key)
+        return bool(self.get_llm_endpoints())
 
     class Config:
         env_file = ".env"
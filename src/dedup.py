@@ -0,0 +1,153 @@
+"""
+近似重复图像索引模块
+以感知哈希（dHash）索引最近识别过的图像，重新扫描或重新压缩的同一文档可以直接复用识别结果
+"""
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from .results import OCRResultSet
+
+# 宽高比差异超过该比例时不视为同一图像（dHash 会把图像缩放到固定尺寸，对宽高比不敏感）
+MAX_ASPECT_DIFF = 0.02
+
+
+def dhash(image: Image.Image, hash_size: int = 16) -> int:
+    """
+    计算差值哈希（dHash）
+
+    把图像缩小为 (hash_size + 1) x hash_size 的灰度图，比较每行相邻像素的亮度，
+    得到 hash_size * hash_size 位的整数。
+    """
+    small = image.resize((hash_size + 1, hash_size), Image.BOX).convert('L')
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).reshape(-1)
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def _popcount(value: int) -> int:
+    return bin(value).count('1')
+
+
+class _Entry:
+    __slots__ = ('image_hash', 'image_size', 'params', 'results')
+
+    def __init__(self, image_hash: int, image_size: Tuple[int, int], params: Tuple, results: OCRResultSet):
+        self.image_hash = image_hash
+        self.image_size = image_size
+        self.params = params
+        self.results = results
+
+
+class NearDuplicateIndex:
+    """
+    有界的感知哈希近邻索引（多索引哈希）
+
+    把 hash_bits 位的哈希均分为 max_distance + 1 段，每段一张哈希表。
+    根据抽屉原理，汉明距离不超过 max_distance 的两个哈希至少有一段完全相同，
+    因此只需比较在任一段上命中的候选项，而不是全表扫描。
+    超过 max_entries 时淘汰最久未使用的条目。
+
+    所有方法都在事件循环线程中调用，不需要加锁。
+    """
+
+    def __init__(self, hash_bits: int, max_distance: int, max_entries: int):
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+
+        chunks = max_distance + 1
+        bounds = [round(i * hash_bits / chunks) for i in range(chunks + 1)]
+        # 每段的 (起始位, 掩码)
+        self._chunks = [(start, (1 << (end - start)) - 1) for start, end in zip(bounds, bounds[1:])]
+        self._tables: List[Dict[int, set]] = [{} for _ in self._chunks]
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._next_id = 0
+
+        # 统计
+        self.lookups = 0
+        self.matches = 0
+        self.evictions = 0
+
+    def _keys(self, image_hash: int) -> List[int]:
+        return [(image_hash >> start) & mask for start, mask in self._chunks]
+
+    def lookup(self,
+               image_hash: int,
+               image_size: Tuple[int, int],
+               params: Tuple) -> Optional[Tuple[OCRResultSet, int]]:
+        """
+        查找近似重复的图像
+
+        Args:
+            image_hash: 新图像的感知哈希
+            image_size: 新图像尺寸，用于缩放缓存结果的坐标
+            params: 识别参数，只复用相同参数下的结果
+
+        Returns:
+            (坐标已缩放到新图像尺寸的结果, 汉明距离)，没有匹配时返回 None
+        """
+        self.lookups += 1
+
+        candidates = set()
+        for table, key in zip(self._tables, self._keys(image_hash)):
+            candidates.update(table.get(key, ()))
+
+        width, height = image_size
+        best_id, best_distance = None, self.max_distance + 1
+        for entry_id in candidates:
+            entry = self._entries[entry_id]
+            if entry.params != params:
+                continue
+            cached_width, cached_height = entry.image_size
+            if abs(width / height - cached_width / cached_height) > MAX_ASPECT_DIFF * (width / height):
+                continue
+            distance = _popcount(image_hash ^ entry.image_hash)
+            if distance < best_distance:
+                best_id, best_distance = entry_id, distance
+
+        if best_id is None:
+            return None
+
+        self.matches += 1
+        self._entries.move_to_end(best_id)
+        entry = self._entries[best_id]
+        scale_x, scale_y = width / entry.image_size[0], height / entry.image_size[1]
+        cached = entry.results
+        results = OCRResultSet(
+            list(cached.texts),
+            cached.scores.copy(),
+            cached.boxes * (scale_x, scale_y, scale_x, scale_y),
+            list(cached.region_ids) if cached.region_ids is not None else None
+        )
+        return results, best_distance
+
+    def add(self, image_hash: int, image_size: Tuple[int, int], params: Tuple, results: OCRResultSet):
+        """加入一张图像的识别结果"""
+        entry_id = self._next_id
+        self._next_id += 1
+        stored = OCRResultSet(list(results.texts), results.scores.copy(), results.boxes.copy(), results.region_ids)
+        self._entries[entry_id] = _Entry(image_hash, image_size, params, stored)
+        for table, key in zip(self._tables, self._keys(image_hash)):
+            table.setdefault(key, set()).add(entry_id)
+
+        while len(self._entries) > self.max_entries:
+            old_id, old = self._entries.popitem(last=False)
+            for table, key in zip(self._tables, self._keys(old.image_hash)):
+                bucket = table[key]
+                bucket.discard(old_id)
+                if not bucket:
+                    del table[key]
+            self.evictions += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取索引统计"""
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'max_distance': self.max_distance,
+            'lookups': self.lookups,
+            'matches': self.matches,
+            'evictions': self.evictions
+        }
@@ -0,0 +1,169 @@
+"""
+多页文档读取模块
+支持多页 TIFF（及其他多帧图像）和 PDF，按需逐页解码/渲染
+"""
+import io
+import logging
+from typing import Optional
+
+from PIL import Image
+
+from .config import settings
+from .memory_budget import estimate_pixel_bytes
+from .imaging import open_image
+
+logger = logging.getLogger(__name__)
+
+PDF_MAGIC = b'%PDF-'
+
+
+class DocumentReader:
+    """
+    多页文档读取器
+
+    打开时只解析文件头和页数，页面在 load_page 时才解码或渲染，
+    调用方可以控制同时驻留内存的页数。load_page 不是线程安全的，
+    同一个读取器的调用需要串行。
+    """
+
+    def __init__(self, data: bytes, pdf_dpi: int = 200):
+        self.data = data
+        self.pdf_dpi = pdf_dpi
+        self.kind = "pdf" if data[:len(PDF_MAGIC)] == PDF_MAGIC else "image"
+
+        self._image: Optional[Image.Image] = None
+        self._pdf = None
+
+        if self.kind == "pdf":
+            self._pdf = _open_pdf(data)
+            self.page_count = _pdf_page_count(self._pdf)
+        else:
+            try:
+                self._image = open_image(io.BytesIO(data))
+            except Exception as e:
+                raise ValueError(f"文档格式无效或损坏: {str(e)}")
+            self.page_count = getattr(self._image, 'n_frames', 1)
+
+        if self.page_count < 1:
+            raise ValueError("文档不包含任何页面")
+
+    def load_page(self, index: int) -> Image.Image:
+        """解码或渲染指定页（从 0 开始）"""
+        if index < 0 or index >= self.page_count:
+            raise ValueError(f"页码超出范围: {index}")
+
+        if self.kind == "pdf":
+            return _render_pdf_page(self._pdf, index, self.pdf_dpi)
+
+        try:
+            self._image.seek(index)
+            # copy 会完整解码当前帧，得到与文件对象无关的独立图像
+            return self._image.copy()
+        except Exception as e:
+            raise ValueError(f"第 {index + 1} 页解码失败: {str(e)}")
+
+    def page_pixel_bytes(self, index: int) -> int:
+        """估计解码或渲染指定页所需的内存（只读取页面信息，不解码）"""
+        if index < 0 or index >= self.page_count:
+            raise ValueError(f"页码超出范围: {index}")
+
+        if self.kind == "pdf":
+            width, height = _pdf_page_size(self._pdf, index, self.pdf_dpi)
+            # 位图上下文 (RGBX) + 复制出的像素数据 + 最终的 RGB 图像
+            return width * height * (4 + 4 + 3)
+
+        try:
+            self._image.seek(index)
+        except Exception as e:
+            raise ValueError(f"第 {index + 1} 页解码失败: {str(e)}")
+        return estimate_pixel_bytes(self._image.size, self._image.mode)
+
+    def close(self):
+        """释放底层资源"""
+        if self._image is not None:
+            self._image.close()
+            self._image = None
+        self._pdf = None
+
+
+def _open_pdf(data: bytes):
+    """使用 Quartz 打开 PDF 文档"""
+    try:
+        import Quartz
+    except ImportError:
+        raise ValueError("当前环境不支持 PDF（需要 macOS Quartz 框架）")
+
+    provider = Quartz.CGDataProviderCreateWithCFData(data)
+    document = Quartz.CGPDFDocumentCreateWithProvider(provider)
+    if document is None:
+        raise ValueError("PDF 文件无效或损坏")
+    if Quartz.CGPDFDocumentIsEncrypted(document) and not Quartz.CGPDFDocumentIsUnlocked(document):
+        raise ValueError("不支持加密的 PDF 文件")
+    return document
+
+
+def _pdf_page_count(document) -> int:
+    import Quartz
+    return Quartz.CGPDFDocumentGetNumberOfPages(document)
+
+
+def _pdf_page(document, index: int):
+    """获取 PDF 页面及其（考虑旋转后的）裁剪框尺寸（单位：点）"""
+    import Quartz
+
+    page = Quartz.CGPDFDocumentGetPage(document, index + 1)  # Quartz 页码从 1 开始
+    if page is None:
+        raise ValueError(f"第 {index + 1} 页不存在")
+
+    box = Quartz.CGPDFPageGetBoxRect(page, Quartz.kCGPDFCropBox)
+    rotation = Quartz.CGPDFPageGetRotationAngle(page) % 360
+    width_pt, height_pt = box.size.width, box.size.height
+    if rotation in (90, 270):
+        width_pt, height_pt = height_pt, width_pt
+    return page, width_pt, height_pt
+
+
+def _pdf_page_size(document, index: int, dpi: int):
+    """PDF 页面按指定 DPI 渲染后的像素尺寸"""
+    _, width_pt, height_pt = _pdf_page(document, index)
+    scale = dpi / 72.0
+    return max(1, int(round(width_pt * scale))), max(1, int(round(height_pt * scale)))
+
+
+def _render_pdf_page(document, index: int, dpi: int) -> Image.Image:
+    """将 PDF 的一页渲染为白底 RGB 图像"""
+    import Quartz
+
+    page, width_pt, height_pt = _pdf_page(document, index)
+    scale = dpi / 72.0
+    width, height = _pdf_page_size(document, index, dpi)
+    if width > settings.max_image_width or height > settings.max_image_height:
+        raise ValueError(
+            f"第 {index + 1} 页渲染尺寸太大: {(width, height)}，"
+            f"最大支持: {settings.max_image_width}x{settings.max_image_height}"
+        )
+
+    color_space = Quartz.CGColorSpaceCreateDeviceRGB()
+    context = Quartz.CGBitmapContextCreate(
+        None, width, height, 8, width * 4, color_space, Quartz.kCGImageAlphaNoneSkipLast
+    )
+    if context is None:
+        raise ValueError(f"第 {index + 1} 页渲染失败（{width}x{height}）")
+
+    # 白色背景
+    Quartz.CGContextSetRGBFillColor(context, 1.0, 1.0, 1.0, 1.0)
+    Quartz.CGContextFillRect(context, Quartz.CGRectMake(0, 0, width, height))
+
+    # 缩放到目标 DPI，并让 Quartz 处理页面旋转和裁剪框偏移
+    Quartz.CGContextScaleCTM(context, scale, scale)
+    transform = Quartz.CGPDFPageGetDrawingTransform(
+        page, Quartz.kCGPDFCropBox, Quartz.CGRectMake(0, 0, width_pt, height_pt), 0, True
+    )
+    Quartz.CGContextConcatCTM(context, transform)
+    Quartz.CGContextDrawPDFPage(context, page)
+
+    cg_image = Quartz.CGBitmapContextCreateImage(context)
+    bytes_per_row = Quartz.CGImageGetBytesPerRow(cg_image)
+    pixels = Quartz.CGDataProviderCopyData(Quartz.CGImageGetDataProvider(cg_image))
+
+    return Image.frombuffer('RGB', (width, height), bytes(pixels), 'raw', 'RGBX', bytes_per_row, 1)
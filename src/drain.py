@@ -0,0 +1,134 @@
+"""
+排空模块
+部署或重启前让实例先从负载均衡中摘除，再在限定时间内完成进行中的识别和任务后退出，
+滚动重启时客户端不会看到连接中断或大量错误
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, Optional
+
+from starlette.responses import Response
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+# 排空阶段
+PHASE_SERVING = "serving"      # 正常服务
+PHASE_NOT_READY = "not_ready"  # /ready 返回 503，仍接收请求，等待负载均衡器摘除
+PHASE_REJECTING = "rejecting"  # 拒绝新的识别请求，等待进行中的工作完成
+PHASE_STOPPED = "stopped"      # 排空结束，正在退出
+
+
+class DrainController:
+    """
+    排空状态和进行中请求计数
+
+    所有方法都在事件循环线程中调用，不需要加锁。
+    """
+
+    def __init__(self):
+        self.phase = PHASE_SERVING
+        self.reason: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.active = 0  # 进行中的识别请求（HTTP 和 WebSocket）
+        self.timed_out = False
+
+    @property
+    def draining(self) -> bool:
+        """是否已开始排空（/ready 应返回 503）"""
+        return self.phase != PHASE_SERVING
+
+    @property
+    def rejecting(self) -> bool:
+        """是否拒绝新的识别请求"""
+        return self.phase in (PHASE_REJECTING, PHASE_STOPPED)
+
+    def begin(self, reason: str) -> bool:
+        """开始排空；已在排空中时返回 False"""
+        if self.draining:
+            return False
+        self.phase = PHASE_NOT_READY
+        self.reason = reason
+        self.started_at = time.time()
+        logger.warning("开始排空（%s）", reason)
+        return True
+
+    def enter(self):
+        self.active += 1
+
+    def leave(self):
+        self.active -= 1
+
+    async def run(self, grace: float, timeout: float, busy: Callable[[], int]):
+        """
+        执行排空：先等待 grace 秒让负载均衡器摘除本实例，再拒绝新请求，
+        最多等待 timeout 秒直到没有进行中的请求且 busy() 返回 0
+
+        Args:
+            busy: 返回除识别请求外仍在进行的工作数（异步任务、监听文件等）
+        """
+        await asyncio.sleep(grace)
+        self.phase = PHASE_REJECTING
+        logger.warning("排空：停止接收新的识别请求，等待 %d 个请求和 %d 项工作完成", self.active, busy())
+
+        deadline = time.monotonic() + timeout
+        while self.active or busy():
+            if time.monotonic() >= deadline:
+                self.timed_out = True
+                logger.warning("排空超时，仍有 %d 个请求和 %d 项工作未完成", self.active, busy())
+                break
+            await asyncio.sleep(0.1)
+
+        self.phase = PHASE_STOPPED
+        self.finished_at = time.time()
+        logger.warning("排空完成，耗时 %.2fs", self.finished_at - self.started_at)
+
+    def get_state(self) -> Dict[str, Any]:
+        """获取排空状态"""
+        return {
+            'phase': self.phase,
+            'reason': self.reason,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'active_requests': self.active,
+            'timed_out': self.timed_out
+        }
+
+
+class DrainMiddleware:
+    """
+    ASGI 排空中间件：统计进行中的识别请求，排空进入拒绝阶段后对新的识别请求返回 rejection()
+
+    请求在响应体全部发送完（或客户端断开）后才计为结束，NDJSON 等流式响应在逐页识别期间一直计入进行中。
+    """
+
+    def __init__(self,
+                 app: ASGIApp,
+                 controller: DrainController,
+                 is_tracked: Callable[[Scope], bool],
+                 rejection: Callable[[], Response]):
+        self.app = app
+        self.controller = controller
+        self.is_tracked = is_tracked
+        self.rejection = rejection
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not self.is_tracked(scope):
+            await self.app(scope, receive, send)
+            return
+        if self.controller.rejecting:
+            await self.rejection()(scope, receive, send)
+            return
+
+        # 下游应用在最后一块响应体发送完后才返回
+        self.controller.enter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.leave()
+
+
+# 全局排空控制器
+drain_controller = DrainController()
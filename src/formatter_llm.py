@@ -4,15 +4,38 @@ LLM 排版模块
 """
 import logging
 import asyncio
-from typing import List
+import time
+from typing import List, Dict, Any, Optional, TYPE_CHECKING
 
-import httpx
-
-from .models import OCRResult, FormattedResult
+from .models import FormattedResult
+from .results import OCRResultSet
 from .config import settings
+from .llm_router import LLMRouter, LLMEndpoint
+
+if TYPE_CHECKING:
+    import httpx
 
 logger = logging.getLogger(__name__)
 
+# 全局 LLM 并发限制（所有请求共享）
+_llm_semaphore = asyncio.Semaphore(settings.llm_max_concurrency)
+
+# LLM 端点路由（每个端点各自带熔断器：连续超时或 5xx 后快速失败）
+llm_router = LLMRouter.from_settings()
+
+# LLM 调用统计
+_llm_stats = {
+    'total_calls': 0,
+    'in_flight': 0,
+    'waiting': 0,
+    'rejected_busy': 0,
+    'rejected_open': 0,
+    'timeouts': 0,
+    'server_errors': 0,
+    'hedged_requests': 0,
+    'hedge_wins': 0
+}
+
 # 排版 prompt
 FORMAT_PROMPT = """你是一个专业的文档排版助手。请将以下 OCR 识别的文本进行排版和校对，输出格式化的 Markdown 文本。
 
@@ -28,12 +51,12 @@ OCR 识别的原始文本：
 """
 
 
-async def format_with_llm(results: List[OCRResult]) -> FormattedResult:
+async def format_with_llm(results: OCRResultSet) -> FormattedResult:
     """
     使用 LLM 对 OCR 结果进行排版
 
     Args:
-        results: OCR 结果列表
+        results: OCR 结果
 
     Returns:
         FormattedResult 包含排版后的 markdown 文本
@@ -43,63 +66,214 @@ async def format_with_llm(results: List[OCRResult]) -> FormattedResult:
         return FormattedResult(
             markdown="",
             success=False,
-            error="LLM 未配置，请在 .env 中设置 LLM_BASE_URL 和 LLM_API_KEY"
+            error="LLM 未配置，请在 .env 中设置 LLM_BASE_URL 和 LLM_API_KEY 或 LLM_ENDPOINTS"
         )
 
     if not results:
         return FormattedResult(markdown="", success=True)
 
+    # 所有端点都熔断时直接快速失败，不占用连接
+    if not llm_router.is_available():
+        _llm_stats['rejected_open'] += 1
+        return FormattedResult(
+            markdown="",
+            success=False,
+            error="LLM 服务暂时不可用（熔断中），已跳过 LLM 排版"
+        )
+
+    # 等待并发槽位（有界等待）
+    _llm_stats['waiting'] += 1
+    try:
+        await asyncio.wait_for(_llm_semaphore.acquire(), timeout=settings.llm_queue_timeout)
+    except asyncio.TimeoutError:
+        _llm_stats['rejected_busy'] += 1
+        logger.warning(f"LLM 并发已满，等待 {settings.llm_queue_timeout}s 后放弃")
+        return FormattedResult(
+            markdown="",
+            success=False,
+            error=f"LLM 并发请求已满（上限 {settings.llm_max_concurrency}），已跳过 LLM 排版"
+        )
+    finally:
+        _llm_stats['waiting'] -= 1
+
+    _llm_stats['total_calls'] += 1
+    _llm_stats['in_flight'] += 1
     try:
-        # 提取纯文本（按顺序拼接）
-        raw_text = "\n".join(r.rec_txt for r in results)
+        return await _call_llm(results)
+    finally:
+        _llm_stats['in_flight'] -= 1
+        _llm_semaphore.release()
+
+
+async def _call_llm(results: OCRResultSet) -> FormattedResult:
+    """选择端点调用 LLM，必要时向第二个端点发出对冲请求"""
+    primary = llm_router.pick()
+    if primary is None:
+        _llm_stats['rejected_open'] += 1
+        return FormattedResult(
+            markdown="",
+            success=False,
+            error="LLM 服务暂时不可用（熔断中），已跳过 LLM 排版"
+        )
 
+    # httpx 在首次调用 LLM 时才导入，未启用 LLM 排版的进程不承担其导入开销
+    import httpx
+
+    # 提取纯文本（按顺序拼接）
+    raw_text = "\n".join(results.texts)
+
+    async with httpx.AsyncClient(timeout=settings.llm_timeout) as client:
+        first = asyncio.ensure_future(_call_endpoint(client, primary, raw_text))
+        tasks = [first]
+        hedge_slot = False
+        try:
+            hedge_delay = llm_router.hedge_delay()
+            if hedge_delay is None:
+                return await first
+
+            done, _ = await asyncio.wait({first}, timeout=hedge_delay)
+            if done:
+                return first.result()
+
+            # 首个请求超过延迟分位数，在有空闲槽位时对冲到另一个端点
+            secondary = None
+            if not _llm_semaphore.locked():
+                secondary = llm_router.pick(exclude=[primary])
+            if secondary is None:
+                return await first
+
+            await _llm_semaphore.acquire()
+            hedge_slot = True
+            _llm_stats['hedged_requests'] += 1
+            logger.debug("LLM 请求超过 %.3fs，对冲到端点 %s", hedge_delay, secondary.name)
+            second = asyncio.ensure_future(_call_endpoint(client, secondary, raw_text))
+            tasks.append(second)
+
+            pending = {first, second}
+            result: Optional[FormattedResult] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    if result.success:
+                        if task is second:
+                            _llm_stats['hedge_wins'] += 1
+                        return result
+            # 两个请求都失败，返回最后一个错误
+            return result
+        finally:
+            # 调用方被取消或一个请求已胜出时，取消并等待其余请求结束，
+            # 使其在客户端关闭前释放连接和端点的在途计数
+            unfinished = [task for task in tasks if not task.done()]
+            for task in unfinished:
+                task.cancel()
+            if unfinished:
+                await asyncio.gather(*unfinished, return_exceptions=True)
+            if hedge_slot:
+                _llm_semaphore.release()
+
+
+async def _call_endpoint(client: "httpx.AsyncClient",
+                         endpoint: LLMEndpoint,
+                         raw_text: str) -> FormattedResult:
+    """调用单个 LLM 端点，并根据结果更新该端点的延迟和熔断器"""
+    import httpx
+
+    endpoint.in_flight += 1
+    endpoint.requests += 1
+    start_time = time.monotonic()
+    try:
         # 构建请求
         messages = [
             {"role": "user", "content": FORMAT_PROMPT + raw_text}
         ]
 
+        headers = {"Content-Type": "application/json"}
+        if endpoint.api_key:
+            headers["Authorization"] = f"Bearer {endpoint.api_key}"
+
         # 调用 LLM API
-        async with httpx.AsyncClient(timeout=settings.llm_timeout) as client:
-            response = await client.post(
-                f"{settings.llm_base_url.rstrip('/')}/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {settings.llm_api_key}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": settings.llm_model,
-                    "messages": messages,
-                    "max_tokens": settings.llm_max_tokens,
-                    "temperature": 0.3  # 较低温度保持输出稳定
-                }
-            )
+        response = await client.post(
+            f"{endpoint.base_url}/chat/completions",
+            headers=headers,
+            json={
+                "model": endpoint.model,
+                "messages": messages,
+                "max_tokens": settings.llm_max_tokens,
+                "temperature": 0.3  # 较低温度保持输出稳定
+            }
+        )
+
+        response.raise_for_status()
+        latency = time.monotonic() - start_time
+        endpoint.breaker.record_success()
+        endpoint.record_latency(latency)
+        llm_router.latencies.append(latency)
+        data = response.json()
 
-            response.raise_for_status()
-            data = response.json()
-
-            # 提取响应内容
-            if "choices" in data and len(data["choices"]) > 0:
-                markdown = data["choices"][0]["message"]["content"].strip()
-                logger.info(f"LLM 排版完成，输出长度: {len(markdown)}")
-                return FormattedResult(markdown=markdown, success=True)
-            else:
-                return FormattedResult(
-                    markdown="",
-                    success=False,
-                    error="LLM 响应格式异常"
-                )
+        # 提取响应内容
+        if "choices" in data and len(data["choices"]) > 0:
+            markdown = data["choices"][0]["message"]["content"].strip()
+            logger.info("LLM 排版完成（%s），输出长度: %d", endpoint.name, len(markdown))
+            return FormattedResult(markdown=markdown, success=True)
+        else:
+            return FormattedResult(
+                markdown="",
+                success=False,
+                error="LLM 响应格式异常"
+            )
 
     except httpx.TimeoutException:
-        error_msg = f"LLM 请求超时（{settings.llm_timeout}秒）"
+        _llm_stats['timeouts'] += 1
+        endpoint.failures += 1
+        endpoint.breaker.record_failure()
+        endpoint.record_latency(settings.llm_timeout)
+        error_msg = f"LLM 请求超时（{settings.llm_timeout}秒，{endpoint.name}）"
         logger.error(error_msg)
         return FormattedResult(markdown="", success=False, error=error_msg)
 
     except httpx.HTTPStatusError as e:
+        endpoint.failures += 1
+        if e.response.status_code >= 500:
+            _llm_stats['server_errors'] += 1
+            endpoint.breaker.record_failure()
+            # 以超时时间作为惩罚延迟，降低该端点被选中的概率
+            endpoint.record_latency(settings.llm_timeout)
+        else:
+            # 4xx 说明服务可达，不计入熔断
+            endpoint.breaker.record_success()
         error_msg = f"LLM API 错误: {e.response.status_code} - {e.response.text}"
         logger.error(error_msg)
         return FormattedResult(markdown="", success=False, error=error_msg)
 
+    except httpx.TransportError as e:
+        endpoint.failures += 1
+        endpoint.breaker.record_failure()
+        endpoint.record_latency(settings.llm_timeout)
+        error_msg = f"LLM 连接失败（{endpoint.name}）: {str(e)}"
+        logger.error(error_msg)
+        return FormattedResult(markdown="", success=False, error=error_msg)
+
+    except asyncio.CancelledError:
+        # 对冲请求落败被取消，不计入健康状态
+        endpoint.breaker.release_probe()
+        raise
+
     except Exception as e:
+        endpoint.failures += 1
+        endpoint.breaker.release_probe()
         error_msg = f"LLM 排版失败: {str(e)}"
         logger.error(error_msg)
         return FormattedResult(markdown="", success=False, error=error_msg)
+
+    finally:
+        endpoint.in_flight -= 1
+
+
+def get_llm_stats() -> Dict[str, Any]:
+    """获取 LLM 调用统计和各端点状态"""
+    stats = _llm_stats.copy()
+    stats['max_concurrency'] = settings.llm_max_concurrency
+    stats['hedge_delay'] = llm_router.hedge_delay()
+    stats['endpoints'] = llm_router.get_state()
+    return stats
@@ -3,76 +3,70 @@
 根据 OCR 结果的坐标信息进行智能排版
 """
 import logging
-from typing import List, Tuple
-from dataclasses import dataclass
+from typing import List, Tuple, Union, Sequence
 
 from .models import OCRResult, FormattedResult
+from .results import OCRResultSet
 
 logger = logging.getLogger(__name__)
 
 
-@dataclass
-class TextBlock:
-    """文本块，包含文本和位置信息"""
-    text: str
-    x: float  # 左上角 x
-    y: float  # 左上角 y
-    width: float
-    height: float
-    score: float
-
-    @property
-    def center_y(self) -> float:
-        return self.y + self.height / 2
-
-    @property
-    def bottom_y(self) -> float:
-        return self.y + self.height
-
-
-def _ocr_result_to_block(result: OCRResult) -> TextBlock:
-    """将 OCRResult 转换为 TextBlock"""
-    boxes = result.dt_boxes
-    # dt_boxes 格式: [[x1,y1], [x2,y1], [x2,y2], [x1,y2]]
-    x1, y1 = boxes[0]
-    x2, y2 = boxes[2]
-    return TextBlock(
-        text=result.rec_txt,
-        x=x1,
-        y=y1,
-        width=x2 - x1,
-        height=y2 - y1,
-        score=result.score
-    )
-
-
-def _group_into_lines(blocks: List[TextBlock], y_threshold_ratio: float = 0.5) -> List[List[TextBlock]]:
+class _Layout:
     """
-    将文本块按行分组
+    排版用的坐标视图
+
+    直接引用 OCRResultSet 的数组（转换为 Python 列表以便逐个访问），
+    行用框下标列表表示，不再为每个框创建对象。
+    """
+
+    __slots__ = ('texts', 'x1', 'y1', 'x2', 'y2')
+
+    def __init__(self, results: OCRResultSet):
+        self.texts = results.texts
+        self.x1, self.y1, self.x2, self.y2 = (results.boxes[:, i].tolist() for i in range(4))
+
+    def height(self, i: int) -> float:
+        return self.y2[i] - self.y1[i]
+
+    def center_y(self, i: int) -> float:
+        return (self.y1[i] + self.y2[i]) / 2
+
+
+def _group_into_lines(layout: _Layout, y_threshold_ratio: float = 0.5) -> List[List[int]]:
+    """
+    将文本框按行分组，返回每行的框下标列表
     y_threshold_ratio: Y 坐标差异阈值（相对于行高的比例）
     """
-    if not blocks:
+    count = len(layout.texts)
+    if count == 0:
         return []
 
-    # 按 Y 坐标排序
-    sorted_blocks = sorted(blocks, key=lambda b: b.y)
+    # 按 Y 坐标排序（稳定排序，与原先按对象排序的顺序一致）
+    order = sorted(range(count), key=layout.y1.__getitem__)
 
-    lines: List[List[TextBlock]] = []
-    current_line: List[TextBlock] = [sorted_blocks[0]]
+    lines: List[List[int]] = []
+    current_line: List[int] = [order[0]]
+    # 当前行高度和中心 Y 的累加值，用于计算平均值
+    height_sum = layout.height(order[0])
+    center_sum = layout.center_y(order[0])
 
-    for block in sorted_blocks[1:]:
+    for i in order[1:]:
         # 使用当前行的平均高度计算阈值
-        avg_height = sum(b.height for b in current_line) / len(current_line)
-        y_threshold = avg_height * y_threshold_ratio
+        n = len(current_line)
+        y_threshold = height_sum / n * y_threshold_ratio
 
         # 检查是否属于同一行
-        current_line_center_y = sum(b.center_y for b in current_line) / len(current_line)
-        if abs(block.center_y - current_line_center_y) <= y_threshold:
-            current_line.append(block)
+        center_y = layout.center_y(i)
+        if abs(center_y - center_sum / n) <= y_threshold:
+            current_line.append(i)
+            height_sum += layout.height(i)
+            center_sum += center_y
         else:
             # 新行
             lines.append(current_line)
-            current_line = [block]
+            current_line = [i]
+            height_sum = layout.height(i)
+            center_sum = center_y
 
     # 添加最后一行
     if current_line:
@@ -80,12 +74,13 @@ def _group_into_lines(blocks: List[TextBlock], y_threshold_ratio: float = 0.5) -
 
     # 每行内按 X 坐标排序
     for line in lines:
-        line.sort(key=lambda b: b.x)
+        line.sort(key=layout.x1.__getitem__)
 
     return lines
 
 
-def _detect_paragraph_breaks(lines: List[List[TextBlock]],
+def _detect_paragraph_breaks(layout: _Layout,
+                             lines: List[List[int]],
                              gap_threshold_ratio: float = 1.5) -> List[int]:
     """
     检测段落分隔位置
@@ -102,8 +97,8 @@ def _detect_paragraph_breaks(lines: List[List[TextBlock]],
         prev_line = lines[i - 1]
         curr_line = lines[i]
 
-        prev_bottom = max(b.bottom_y for b in prev_line)
-        curr_top = min(b.y for b in curr_line)
+        prev_bottom = max(layout.y2[i] for i in prev_line)
+        curr_top = min(layout.y1[i] for i in curr_line)
         gap = curr_top - prev_bottom
         line_gaps.append(gap)
 
@@ -121,8 +116,8 @@ def _detect_paragraph_breaks(lines: List[List[TextBlock]],
     return paragraph_breaks
 
 
-def _is_potential_heading(line: List[TextBlock],
-                          all_lines: List[List[TextBlock]],
+def _is_potential_heading(layout: _Layout,
+                          line: List[int],
                           image_width: float) -> bool:
     """
     判断一行是否可能是标题
@@ -135,15 +130,15 @@ def _is_potential_heading(line: List[TextBlock],
         return False
 
     # 合并行文本
-    line_text = " ".join(b.text for b in line)
+    line_text = " ".join(layout.texts[i] for i in line)
 
     # 标题通常较短
     if len(line_text) > 50:
         return False
 
     # 计算行宽度占比
-    line_start = min(b.x for b in line)
-    line_end = max(b.x + b.width for b in line)
+    line_start = min(layout.x1[i] for i in line)
+    line_end = max(layout.x2[i] for i in line)
     line_width = line_end - line_start
 
     # 如果行宽度小于图像宽度的 60%，可能是标题
@@ -162,13 +157,13 @@ def _is_potential_heading(line: List[TextBlock],
     return False
 
 
-def format_locally(results: List[OCRResult],
+def format_locally(results: Union[OCRResultSet, Sequence[OCRResult]],
                    image_size: Tuple[int, int]) -> FormattedResult:
     """
     使用本地算法对 OCR 结果进行智能排版
 
     Args:
-        results: OCR 结果列表
+        results: OCR 结果（OCRResultSet，或兼容旧调用方的 OCRResult 列表）
         image_size: 图像尺寸 (width, height)
 
     Returns:
@@ -180,31 +175,32 @@ def format_locally(results: List[OCRResult],
 
         image_width, image_height = image_size
 
-        # 转换为 TextBlock
-        blocks = [_ocr_result_to_block(r) for r in results]
+        if not isinstance(results, OCRResultSet):
+            results = OCRResultSet.from_ocr_results(results)
+        layout = _Layout(results)
 
         # 按行分组
-        lines = _group_into_lines(blocks)
+        lines = _group_into_lines(layout)
 
         if not lines:
             return FormattedResult(markdown="", success=True)
 
         # 检测段落分隔
-        paragraph_breaks = set(_detect_paragraph_breaks(lines))
+        paragraph_breaks = set(_detect_paragraph_breaks(layout, lines))
 
         # 构建 markdown
         markdown_parts = []
 
         for i, line in enumerate(lines):
             # 合并行内文本
-            line_text = " ".join(b.text for b in line)
+            line_text = " ".join(layout.texts[j] for j in line)
 
             # 检查是否是段落开始
             if i in paragraph_breaks:
                 markdown_parts.append("")  # 空行表示段落分隔
 
             # 检查是否是标题
-            if _is_potential_heading(line, lines, image_width):
+            if _is_potential_heading(layout, line, image_width):
                 # 简单标题检测：使用 ## 标记
                 # 如果是第一行且较短，用 #
                 if i == 0 and len(line_text) < 30:
@@ -217,7 +213,7 @@ def format_locally(results: List[OCRResult],
         # 合并段落内的连续行
         markdown = _merge_paragraphs(markdown_parts)
 
-        logger.debug(f"本地排版完成，共 {len(lines)} 行")
+        logger.debug("本地排版完成，共 %d 行", len(lines))
         return FormattedResult(markdown=markdown, success=True)
 
     except Exception as e:
@@ -0,0 +1,201 @@
+"""
+整机识别并发协调模块
+多个 uvicorn 工作进程通过文件锁共享同一组识别槽位，无论启动多少个 HTTP 工作进程，
+整机同时进行的识别数都不超过槽位数；各进程定期发布自身的队列和统计，便于查看整机状态
+"""
+import fcntl
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 等待槽位时的轮询间隔（秒），逐步退避到上限
+POLL_INTERVAL = 0.005
+MAX_POLL_INTERVAL = 0.05
+
+
+class HostConcurrency:
+    """
+    基于 flock 的整机信号量
+
+    每个槽位对应目录下的一个锁文件，持有某个文件的排他锁即占用一个槽位。
+    进程异常退出时操作系统会自动释放它持有的锁，不会泄漏槽位。
+    flock 以打开的文件为单位，同一进程内的多个线程共用文件描述符，
+    因此进程内还需要记录哪些槽位已被本进程的线程占用。
+
+    acquire / release 在线程池的工作线程中调用；publish / collect 在事件循环线程中调用。
+    slots 为 0 时不做限制。
+    """
+
+    def __init__(self, directory: str, slots: int):
+        self.directory = directory
+        self.slots = slots
+        self._lock = threading.Lock()
+        self._held: set = set()
+        self._fds: List[int] = []
+        if slots:
+            os.makedirs(directory, exist_ok=True)
+            self._fds = [
+                os.open(os.path.join(directory, f"slot-{i}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+                for i in range(slots)
+            ]
+
+        # 本进程统计（在锁内更新）
+        self.active = 0
+        self.waiting = 0
+        self.acquired = 0
+        self.waited = 0
+        self.total_wait_time = 0.0
+
+    def _try_acquire(self) -> Optional[int]:
+        """尝试占用任一空闲槽位，失败返回 None"""
+        with self._lock:
+            if not self._fds:
+                return None
+            start = random.randrange(self.slots)
+            for offset in range(self.slots):
+                slot = (start + offset) % self.slots
+                if slot in self._held:
+                    continue
+                try:
+                    fcntl.flock(self._fds[slot], fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+                self._held.add(slot)
+                return slot
+        return None
+
+    def acquire(self) -> Optional[int]:
+        """占用一个槽位，没有空闲槽位时阻塞当前线程等待"""
+        if not self.slots:
+            with self._lock:
+                self.active += 1
+                self.acquired += 1
+            return None
+
+        slot = self._try_acquire()
+        if slot is None:
+            start = time.monotonic()
+            with self._lock:
+                self.waiting += 1
+                self.waited += 1
+            interval = POLL_INTERVAL
+            try:
+                while slot is None and self._fds:
+                    time.sleep(interval)
+                    interval = min(interval * 2, MAX_POLL_INTERVAL)
+                    slot = self._try_acquire()
+            finally:
+                with self._lock:
+                    self.waiting -= 1
+                    self.total_wait_time += time.monotonic() - start
+
+        with self._lock:
+            self.active += 1
+            self.acquired += 1
+        return slot
+
+    def release(self, slot: Optional[int]):
+        """释放槽位"""
+        with self._lock:
+            self.active -= 1
+            if slot is not None and self._fds:
+                fcntl.flock(self._fds[slot], fcntl.LOCK_UN)
+                self._held.discard(slot)
+
+    @contextmanager
+    def slot(self):
+        """在 with 范围内占用一个槽位"""
+        slot = self.acquire()
+        try:
+            yield
+        finally:
+            self.release(slot)
+
+    def _stats_path(self, pid: int) -> str:
+        return os.path.join(self.directory, f"stats-{pid}.json")
+
+    def local_stats(self) -> Dict[str, Any]:
+        """本进程的槽位使用情况"""
+        with self._lock:
+            return {
+                'active': self.active,
+                'waiting': self.waiting,
+                'acquired': self.acquired,
+                'waited': self.waited,
+                'total_wait_time': self.total_wait_time
+            }
+
+    def publish(self, data: Dict[str, Any]):
+        """把本进程的状态写入共享目录，供其他进程汇总"""
+        if not self.slots:
+            return
+        data = {**data, 'pid': os.getpid(), 'updated_at': time.time()}
+        path = self._stats_path(os.getpid())
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def unpublish(self):
+        """删除本进程发布的状态（进程退出时调用）"""
+        if not self.slots:
+            return
+        try:
+            os.remove(self._stats_path(os.getpid()))
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        """删除本进程发布的状态并关闭槽位文件（进程内不再有识别任务时调用）"""
+        self.unpublish()
+        with self._lock:
+            # 关闭文件同时释放其上的锁；仍在等待槽位的线程不再等待
+            for fd in self._fds:
+                os.close(fd)
+            self._fds = []
+
+    def collect(self) -> List[Dict[str, Any]]:
+        """读取所有存活进程发布的状态，并清理已退出进程留下的文件"""
+        if not self.slots:
+            return []
+
+        processes = []
+        for name in os.listdir(self.directory):
+            if not (name.startswith("stats-") and name.endswith(".json")):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                pid = int(name[len("stats-"):-len(".json")])
+            except ValueError:
+                continue
+            if not _pid_alive(pid):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            try:
+                with open(path, encoding='utf-8') as f:
+                    processes.append(json.load(f))
+            except (OSError, ValueError):
+                # 正在被替换或已被删除
+                continue
+        return processes
+
+
+def _pid_alive(pid: int) -> bool:
+    """进程是否存在"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
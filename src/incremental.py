@@ -0,0 +1,209 @@
+"""
+增量 OCR 模块
+用于屏幕截图、视频帧等连续画面：把每帧切成网格，与同一会话的上一帧逐块比较哈希，
+只重新识别发生变化的区域，其余部分沿用上一帧的结果
+"""
+import hashlib
+from typing import List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from .results import OCRResultSet
+
+# 像素矩形 (left, top, right, bottom)
+Rect = Tuple[int, int, int, int]
+
+
+class FrameSession:
+    """
+    单个帧流会话的状态
+
+    保存上一帧每个网格块的哈希和整帧的识别结果（原图坐标）。
+    diff 和 merge 都不是线程安全的，同一会话的帧需要依次处理。
+    """
+
+    def __init__(self, tile_size: int, full_refresh_ratio: float):
+        self.tile_size = tile_size
+        self.full_refresh_ratio = full_refresh_ratio
+        self.image_size: Optional[Tuple[int, int]] = None
+        self.tile_hashes: Optional[List[List[bytes]]] = None
+        self.results: Optional[OCRResultSet] = None
+        self.frames = 0
+        self.degraded = False  # 缓存的结果是否来自降级识别
+
+    def _hash_tiles(self, image: Image.Image) -> List[List[bytes]]:
+        """计算每个网格块的哈希"""
+        pixels = np.asarray(image)
+        height, width = pixels.shape[:2]
+        size = self.tile_size
+        return [
+            [
+                hashlib.blake2b(pixels[y:y + size, x:x + size].tobytes(), digest_size=8).digest()
+                for x in range(0, width, size)
+            ]
+            for y in range(0, height, size)
+        ]
+
+    def diff(self, image: Image.Image) -> Tuple[Optional[List[Rect]], int, int, List[List[bytes]]]:
+        """
+        与上一帧比较（在线程池中执行）
+
+        不修改会话状态：本帧的块哈希在识别成功后由 merge 保存，识别失败时上一帧的状态保持不变。
+
+        Returns:
+            (需要重新识别的矩形列表, 变化的块数, 总块数, 本帧的块哈希)；矩形列表为 None 表示需要识别整帧
+            （首帧、尺寸变化或变化块比例超过 full_refresh_ratio）
+        """
+        hashes = self._hash_tiles(image)
+        rows, cols = len(hashes), len(hashes[0])
+        total = rows * cols
+
+        if self.tile_hashes is None or self.image_size != image.size:
+            return None, total, total, hashes
+
+        changed = np.array([
+            [hashes[r][c] != self.tile_hashes[r][c] for c in range(cols)]
+            for r in range(rows)
+        ], dtype=bool)
+        changed_count = int(changed.sum())
+
+        if changed_count > total * self.full_refresh_ratio:
+            return None, changed_count, total, hashes
+        if changed_count == 0:
+            return [], 0, total, hashes
+
+        rects = [self._tile_rect(rect) for rect in _connected_components(changed)]
+        return self._expand_rects(rects), changed_count, total, hashes
+
+    def reset(self):
+        """丢弃缓存的块哈希和识别结果，下一帧识别整帧（本帧识别失败时调用）"""
+        self.image_size = None
+        self.tile_hashes = None
+        self.results = None
+        self.degraded = False
+
+    def _tile_rect(self, tile_rect: Rect) -> Rect:
+        """网格坐标转换为像素矩形（裁掉超出图像的部分）"""
+        width, height = self.image_size
+        size = self.tile_size
+        left, top, right, bottom = tile_rect
+        return left * size, top * size, min(width, right * size), min(height, bottom * size)
+
+    def _expand_rects(self, rects: List[Rect]) -> List[Rect]:
+        """
+        把与变化区域相交的已有文本框整体并入矩形，并合并重叠的矩形
+
+        只有一部分像素变化的文本行（如时钟的最后一位）会被完整地重新识别，
+        而不是只识别出半行。
+        """
+        boxes = self.results.boxes if self.results is not None else np.zeros((0, 4))
+        while True:
+            expanded = []
+            for left, top, right, bottom in rects:
+                hit = _intersects(boxes, (left, top, right, bottom))
+                if hit.any():
+                    left = min(left, int(np.floor(boxes[hit, 0].min())))
+                    top = min(top, int(np.floor(boxes[hit, 1].min())))
+                    right = max(right, int(np.ceil(boxes[hit, 2].max())))
+                    bottom = max(bottom, int(np.ceil(boxes[hit, 3].max())))
+                width, height = self.image_size
+                expanded.append((max(0, left), max(0, top), min(width, right), min(height, bottom)))
+
+            merged = _merge_overlapping(expanded)
+            if merged == rects:
+                return merged
+            rects = merged
+
+    def merge(self,
+              rects: Optional[List[Rect]],
+              parts: List[OCRResultSet],
+              tile_hashes: List[List[bytes]],
+              image_size: Tuple[int, int]) -> OCRResultSet:
+        """
+        用新识别的结果更新缓存
+
+        Args:
+            rects: diff 返回的矩形列表（None 表示整帧）
+            parts: 每个矩形（或整帧）的识别结果，坐标已映射回原图
+            tile_hashes: diff 返回的本帧块哈希
+            image_size: 本帧尺寸
+        """
+        self.frames += 1
+        self.tile_hashes, self.image_size = tile_hashes, image_size
+        if rects is None:
+            self.results = parts[0]
+            return self.results
+
+        cached = self.results if self.results is not None else OCRResultSet.empty()
+        keep = np.ones(len(cached), dtype=bool)
+        for rect in rects:
+            keep &= ~_intersects(cached.boxes, rect)
+
+        texts = [text for text, k in zip(cached.texts, keep) if k]
+        scores = [cached.scores[keep]]
+        boxes = [cached.boxes[keep]]
+        for part in parts:
+            texts.extend(part.texts)
+            scores.append(part.scores)
+            boxes.append(part.boxes)
+        boxes_array = np.concatenate(boxes)
+        scores_array = np.concatenate(scores)
+
+        # 按阅读顺序（先上后下、先左后右）排列
+        order = np.lexsort((boxes_array[:, 0], boxes_array[:, 1])) if len(texts) else np.zeros(0, dtype=int)
+        self.results = OCRResultSet(
+            [texts[i] for i in order.tolist()], scores_array[order], boxes_array[order]
+        )
+        return self.results
+
+
+def _intersects(boxes: np.ndarray, rect: Rect) -> np.ndarray:
+    """每个文本框是否与矩形相交"""
+    left, top, right, bottom = rect
+    return (boxes[:, 0] < right) & (boxes[:, 2] > left) & (boxes[:, 1] < bottom) & (boxes[:, 3] > top)
+
+
+def _connected_components(mask: np.ndarray) -> List[Rect]:
+    """变化块的四连通分量，返回每个分量的外接矩形（网格坐标，右下不含）"""
+    rows, cols = mask.shape
+    seen = np.zeros_like(mask)
+    rects = []
+    for r in range(rows):
+        for c in range(cols):
+            if not mask[r, c] or seen[r, c]:
+                continue
+            seen[r, c] = True
+            stack = [(r, c)]
+            top, left, bottom, right = r, c, r, c
+            while stack:
+                y, x = stack.pop()
+                top, left, bottom, right = min(top, y), min(left, x), max(bottom, y), max(right, x)
+                for ny, nx in ((y - 1, x), (y + 1, x), (y, x - 1), (y, x + 1)):
+                    if 0 <= ny < rows and 0 <= nx < cols and mask[ny, nx] and not seen[ny, nx]:
+                        seen[ny, nx] = True
+                        stack.append((ny, nx))
+            rects.append((left, top, right + 1, bottom + 1))
+    return rects
+
+
+def _merge_overlapping(rects: List[Rect]) -> List[Rect]:
+    """合并相互重叠的矩形，直到没有重叠"""
+    rects = sorted(rects)
+    merged = True
+    while merged:
+        merged = False
+        result: List[Rect] = []
+        for rect in rects:
+            for i, other in enumerate(result):
+                if rect[0] < other[2] and rect[2] > other[0] and rect[1] < other[3] and rect[3] > other[1]:
+                    result[i] = (
+                        min(rect[0], other[0]), min(rect[1], other[1]),
+                        max(rect[2], other[2]), max(rect[3], other[3])
+                    )
+                    merged = True
+                    break
+            else:
+                result.append(rect)
+        rects = sorted(result)
+    return rects
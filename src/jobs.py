@@ -0,0 +1,434 @@
+"""
+异步任务模块
+基于 SQLite 的持久化任务队列，提交后立即返回任务 ID，结果可轮询或回调获取
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Set
+
+from .models import OCRJobRequest
+from .callbacks import pin_callback_url, resolve_callback_url
+from .config import settings
+from .pipeline import ocr_and_format
+from .tenants import DEFAULT_TENANT, current_tenant, get_current_tenant, tenant_registry
+
+logger = logging.getLogger(__name__)
+
+# 任务状态
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+
+def _pid_alive(pid: int) -> bool:
+    """检查进程是否仍然存活"""
+    if pid == os.getpid():
+        # 本进程刚启动，数据库中本 PID 的记录来自之前的同号进程
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobStore:
+    """
+    SQLite 任务存储
+
+    所有方法都是同步的，由 JobManager 放在单线程执行器中调用，
+    因此同一时间只有一个线程访问连接。
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.conn: Optional[sqlite3.Connection] = None
+
+    def open(self):
+        """打开数据库并建表"""
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # isolation_level=None：手动控制事务，领取任务时使用 BEGIN IMMEDIATE
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False,
+                                    isolation_level=None, timeout=30.0)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                request TEXT,
+                result TEXT,
+                error TEXT,
+                callback_url TEXT,
+                tenant TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                owner_pid INTEGER,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                expires_at REAL
+            )
+        """)
+        # 早期版本的数据库没有 tenant 列
+        columns = {row['name'] for row in self.conn.execute("PRAGMA table_info(jobs)")}
+        if 'tenant' not in columns:
+            self.conn.execute("ALTER TABLE jobs ADD COLUMN tenant TEXT")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_expires ON jobs (expires_at)")
+
+    def close(self):
+        """关闭数据库"""
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def create(self, job_id: str, request_json: str, callback_url: Optional[str], tenant: str) -> float:
+        """创建排队中的任务，返回创建时间"""
+        now = time.time()
+        self.conn.execute(
+            "INSERT INTO jobs (id, status, request, callback_url, tenant, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, JOB_QUEUED, request_json, callback_url, tenant, now)
+        )
+        return now
+
+    def claim_next(self) -> Optional[sqlite3.Row]:
+        """
+        取出最早排队的任务并标记为运行中
+
+        多个 uvicorn 工作进程共享同一个数据库，使用 BEGIN IMMEDIATE 保证同一任务只被领取一次。
+        """
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.conn.execute(
+                "SELECT id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1",
+                (JOB_QUEUED,)
+            ).fetchone()
+            if row is None:
+                self.conn.execute("COMMIT")
+                return None
+
+            self.conn.execute(
+                "UPDATE jobs SET status = ?, started_at = ?, attempts = attempts + 1, owner_pid = ? "
+                "WHERE id = ?",
+                (JOB_RUNNING, time.time(), os.getpid(), row['id'])
+            )
+            claimed = self.conn.execute("SELECT * FROM jobs WHERE id = ?", (row['id'],)).fetchone()
+            self.conn.execute("COMMIT")
+            return claimed
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def finish(self, job_id: str, status: str, result_json: Optional[str], error: Optional[str]):
+        """记录任务结果，并清空请求数据以节省空间"""
+        now = time.time()
+        self.conn.execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, request = NULL, "
+            "finished_at = ?, expires_at = ? WHERE id = ?",
+            (status, result_json, error, now, now + settings.job_result_ttl, job_id)
+        )
+
+    def get(self, job_id: str, tenant: str) -> Optional[sqlite3.Row]:
+        """查询任务（只返回属于该租户的任务，早期版本的任务属于 default 租户）"""
+        return self.conn.execute(
+            "SELECT id, status, error, callback_url, attempts, created_at, started_at, "
+            "finished_at, expires_at FROM jobs WHERE id = ? AND COALESCE(tenant, ?) = ?",
+            (job_id, DEFAULT_TENANT, tenant)
+        ).fetchone()
+
+    def get_result(self, job_id: str, tenant: str) -> Optional[sqlite3.Row]:
+        """查询任务结果（只返回属于该租户的任务）"""
+        return self.conn.execute(
+            "SELECT status, result, error, expires_at FROM jobs WHERE id = ? AND COALESCE(tenant, ?) = ?",
+            (job_id, DEFAULT_TENANT, tenant)
+        ).fetchone()
+
+    def recover(self) -> int:
+        """
+        进程重启后恢复中断的任务
+
+        只处理领取进程已经不存在的运行中任务：重新排队，超过最大尝试次数的标记为失败。
+        """
+        rows = self.conn.execute(
+            "SELECT id, attempts, owner_pid FROM jobs WHERE status = ?",
+            (JOB_RUNNING,)
+        ).fetchall()
+
+        now = time.time()
+        recovered = 0
+        for row in rows:
+            if row['owner_pid'] and _pid_alive(row['owner_pid']):
+                continue
+            if row['attempts'] >= settings.job_max_attempts:
+                self.conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, request = NULL, finished_at = ?, "
+                    "expires_at = ? WHERE id = ?",
+                    (JOB_FAILED, "任务多次中断，已放弃", now, now + settings.job_result_ttl, row['id'])
+                )
+            else:
+                self.conn.execute(
+                    "UPDATE jobs SET status = ?, started_at = NULL, owner_pid = NULL WHERE id = ?",
+                    (JOB_QUEUED, row['id'])
+                )
+                recovered += 1
+        return recovered
+
+    def purge_expired(self) -> int:
+        """删除已过期的任务结果"""
+        cursor = self.conn.execute(
+            "DELETE FROM jobs WHERE expires_at IS NOT NULL AND expires_at < ?",
+            (time.time(),)
+        )
+        return cursor.rowcount
+
+    def count_by_status(self) -> Dict[str, int]:
+        """按状态统计任务数"""
+        rows = self.conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row['status']: row['n'] for row in rows}
+
+
+class JobManager:
+    """异步任务管理器"""
+
+    def __init__(self):
+        self.store = JobStore(settings.job_db_path)
+        # SQLite 操作放在单独的单线程执行器中，不占用 OCR 线程池
+        self.db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="jobs-db")
+        self.workers: List[asyncio.Task] = []
+        self.purge_task: Optional[asyncio.Task] = None
+        self.callback_tasks: Set[asyncio.Task] = set()  # 尚未完成的回调推送
+        self.condition: Optional[asyncio.Condition] = None
+        self.running = False
+        self.paused = False  # 排空时不再领取新任务
+        self.active = 0  # 正在执行的任务数
+
+        self.stats = {
+            'submitted': 0,
+            'succeeded': 0,
+            'failed': 0,
+            'callbacks_sent': 0,
+            'callbacks_failed': 0
+        }
+
+    async def _db(self, func, *args):
+        """在数据库线程中执行存储操作"""
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.db_executor, func, *args)
+
+    async def start(self):
+        """打开存储、恢复中断任务并启动工作协程"""
+        if self.running:
+            return
+        await self._db(self.store.open)
+        recovered = await self._db(self.store.recover)
+        if recovered:
+            logger.info(f"恢复了 {recovered} 个中断的任务")
+
+        self.condition = asyncio.Condition()
+        self.running = True
+        self.workers = [
+            asyncio.create_task(self._worker(i)) for i in range(settings.job_concurrency)
+        ]
+        self.purge_task = asyncio.create_task(self._purge_loop())
+        logger.info(f"任务队列已启动，{settings.job_concurrency} 个并发任务，数据库: {settings.job_db_path}")
+
+    async def stop(self):
+        """停止工作协程并关闭存储（运行中的任务在下次启动时重新排队）"""
+        if not self.running:
+            return
+        self.running = False
+        tasks = self.workers + ([self.purge_task] if self.purge_task else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.workers = []
+        self.purge_task = None
+        if self.callback_tasks:
+            # 已完成任务的回调最多再等一个回调超时，仍未发出的取消（结果可通过轮询获取）
+            _, pending = await asyncio.wait(set(self.callback_tasks), timeout=settings.job_callback_timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            if pending:
+                logger.warning("停止时取消了 %d 个未完成的回调", len(pending))
+        await self._db(self.store.close)
+        self.db_executor.shutdown(wait=True)
+        logger.info("任务队列已停止")
+
+    def pause(self):
+        """停止领取新任务（排队中的任务留在数据库中，下次启动时执行）"""
+        self.paused = True
+
+    async def submit(self, request: OCRJobRequest) -> Dict[str, Any]:
+        """提交任务，立即返回任务 ID（任务记录提交者所属的租户，执行时按该租户排队和统计）"""
+        if not self.running:
+            raise RuntimeError("任务队列未启动")
+
+        job_id = uuid.uuid4().hex
+        request_json = request.json(exclude={'callback_url'})
+        tenant = get_current_tenant().name
+        created_at = await self._db(self.store.create, job_id, request_json, request.callback_url, tenant)
+        self.stats['submitted'] += 1
+
+        async with self.condition:
+            self.condition.notify()
+
+        return {'job_id': job_id, 'status': JOB_QUEUED, 'created_at': created_at}
+
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """查询当前租户的任务状态，其他租户的任务视为不存在"""
+        row = await self._db(self.store.get, job_id, get_current_tenant().name)
+        if row is None or self._expired(row['expires_at']):
+            return None
+        return {
+            'job_id': row['id'],
+            'status': row['status'],
+            'error': row['error'],
+            'attempts': row['attempts'],
+            'created_at': row['created_at'],
+            'started_at': row['started_at'],
+            'finished_at': row['finished_at'],
+            'expires_at': row['expires_at']
+        }
+
+    async def get_result(self, job_id: str) -> Optional[sqlite3.Row]:
+        """查询当前租户的任务结果（原始 JSON 文本），其他租户的任务视为不存在"""
+        row = await self._db(self.store.get_result, job_id, get_current_tenant().name)
+        if row is None or self._expired(row['expires_at']):
+            return None
+        return row
+
+    async def get_stats(self) -> Dict[str, Any]:
+        """获取任务统计"""
+        stats = self.stats.copy()
+        stats['active'] = self.active
+        stats['paused'] = self.paused
+        if self.running:
+            stats['by_status'] = await self._db(self.store.count_by_status)
+        return stats
+
+    @staticmethod
+    def _expired(expires_at: Optional[float]) -> bool:
+        return expires_at is not None and expires_at < time.time()
+
+    async def _worker(self, index: int):
+        """工作协程：循环领取并执行任务"""
+        while self.running:
+            try:
+                if self.paused:
+                    await asyncio.sleep(1.0)
+                    continue
+                row = await self._db(self.store.claim_next)
+                if row is None:
+                    async with self.condition:
+                        try:
+                            await asyncio.wait_for(self.condition.wait(), timeout=1.0)
+                        except asyncio.TimeoutError:
+                            pass
+                    continue
+                self.active += 1
+                try:
+                    await self._run_job(row)
+                finally:
+                    self.active -= 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"任务工作协程 {index} 异常: {str(e)}", exc_info=True)
+                await asyncio.sleep(1.0)
+
+    @staticmethod
+    def _job_tenant(row: sqlite3.Row):
+        """任务所属的租户；租户已从配置中移除（或任务来自早期版本）时归入 default 租户"""
+        tenant = tenant_registry.tenants.get(row['tenant'] or DEFAULT_TENANT)
+        if tenant is None:
+            logger.warning(f"任务 {row['id']} 所属的租户 {row['tenant']} 不存在，按 {DEFAULT_TENANT} 租户执行")
+            tenant = tenant_registry.tenants[DEFAULT_TENANT]
+        return tenant
+
+    async def _run_job(self, row: sqlite3.Row):
+        """执行单个任务（以提交者租户的身份参与识别调度）"""
+        job_id = row['id']
+        tenant_token = current_tenant.set(self._job_tenant(row))
+        try:
+            request = OCRJobRequest.parse_raw(row['request'])
+            response = await ocr_and_format(request)
+            result_json = response.json()
+            await self._db(self.store.finish, job_id, JOB_SUCCEEDED, result_json, None)
+            self.stats['succeeded'] += 1
+            logger.info("任务 %s 完成，返回 %d 个结果", job_id, len(response.results))
+            status, error = JOB_SUCCEEDED, None
+        except asyncio.CancelledError:
+            # 停止时中断的任务保持运行中状态，下次启动时重新排队
+            raise
+        except Exception as e:
+            result_json = None
+            status, error = JOB_FAILED, str(e)
+            await self._db(self.store.finish, job_id, JOB_FAILED, None, error)
+            self.stats['failed'] += 1
+            logger.error(f"任务 {job_id} 失败: {error}")
+        finally:
+            current_tenant.reset(tenant_token)
+
+        if row['callback_url']:
+            self._schedule_callback(row['callback_url'], job_id, status, result_json, error)
+
+    def _schedule_callback(self, url: str, job_id: str, status: str,
+                           result_json: Optional[str], error: Optional[str]):
+        """在后台推送回调，不占用任务工作协程"""
+        task = asyncio.create_task(self._send_callback(url, job_id, status, result_json, error))
+        # 事件循环只保留任务的弱引用，需要持有引用直到回调完成
+        self.callback_tasks.add(task)
+        task.add_done_callback(self.callback_tasks.discard)
+
+    async def _send_callback(self, url: str, job_id: str, status: str,
+                             result_json: Optional[str], error: Optional[str]):
+        """向回调地址推送任务结果"""
+        import httpx
+
+        payload = {
+            'job_id': job_id,
+            'status': status,
+            'error': error,
+            'result': json.loads(result_json) if result_json else None
+        }
+        try:
+            # 提交后主机的 DNS 记录可能已指向内网地址，发送前再检查一次，
+            # 并直接连接检查过的 IP，不再让 httpx 重新解析（不跟随重定向）
+            address = await resolve_callback_url(url)
+            pinned_url, headers, extensions = pin_callback_url(url, address)
+            async with httpx.AsyncClient(timeout=settings.job_callback_timeout) as client:
+                response = await client.post(pinned_url, json=payload, headers=headers, extensions=extensions)
+                response.raise_for_status()
+            self.stats['callbacks_sent'] += 1
+        except Exception as e:
+            self.stats['callbacks_failed'] += 1
+            logger.warning(f"任务 {job_id} 回调失败: {str(e)}")
+
+    async def _purge_loop(self):
+        """定期清理过期结果"""
+        while self.running:
+            await asyncio.sleep(settings.job_purge_interval)
+            try:
+                purged = await self._db(self.store.purge_expired)
+                if purged:
+                    logger.info(f"清理了 {purged} 个过期任务")
+            except Exception as e:
+                logger.error(f"清理过期任务失败: {str(e)}")
+
+
+# 全局任务管理器实例
+job_manager = JobManager()
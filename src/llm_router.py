@@ -0,0 +1,142 @@
+"""
+LLM 多端点路由模块
+在多个 OpenAI 兼容后端之间按延迟和健康状况分配请求
+"""
+import logging
+import random
+from collections import deque
+from typing import List, Optional, Dict, Any, Iterable
+
+from .config import settings
+from .circuit_breaker import CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+
+class LLMEndpoint:
+    """单个 LLM 后端及其运行状态"""
+
+    def __init__(self, name: str, base_url: str, api_key: Optional[str],
+                 model: str, weight: float):
+        self.name = name
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.model = model
+        self.weight = max(weight, 0.01)
+
+        # 最近延迟的指数加权移动平均（秒），None 表示还没有样本
+        self.ewma_latency: Optional[float] = None
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+
+        self.breaker = CircuitBreaker(
+            name=f"llm:{name}",
+            failure_threshold=settings.llm_breaker_failure_threshold,
+            recovery_time=settings.llm_breaker_recovery_time
+        )
+
+    def record_latency(self, latency: float):
+        """记录一次成功请求的延迟"""
+        alpha = settings.llm_ewma_alpha
+        if self.ewma_latency is None:
+            self.ewma_latency = latency
+        else:
+            self.ewma_latency = alpha * latency + (1 - alpha) * self.ewma_latency
+
+    def score(self, default_latency: float) -> float:
+        """路由评分，越低越好：预计延迟 × 排队请求数 / 权重"""
+        latency = self.ewma_latency if self.ewma_latency is not None else default_latency
+        return latency * (self.in_flight + 1) / self.weight
+
+    def get_state(self) -> Dict[str, Any]:
+        """获取端点状态"""
+        return {
+            'name': self.name,
+            'base_url': self.base_url,
+            'model': self.model,
+            'weight': self.weight,
+            'ewma_latency': round(self.ewma_latency, 4) if self.ewma_latency is not None else None,
+            'in_flight': self.in_flight,
+            'requests': self.requests,
+            'failures': self.failures,
+            'circuit_breaker': self.breaker.get_state()
+        }
+
+
+class LLMRouter:
+    """
+    LLM 端点路由器
+
+    使用加权的 power-of-two-choices：按权重随机抽取两个可用端点，
+    选择 EWMA 延迟 × 在途请求数 / 权重 更低的一个。
+    """
+
+    def __init__(self, endpoints: List[LLMEndpoint]):
+        self.endpoints = endpoints
+        # 最近成功请求的延迟样本，用于计算对冲阈值
+        self.latencies: deque = deque(maxlen=settings.llm_latency_window)
+
+    @classmethod
+    def from_settings(cls) -> "LLMRouter":
+        """根据配置创建路由器"""
+        endpoints = []
+        for i, cfg in enumerate(settings.get_llm_endpoints()):
+            endpoints.append(LLMEndpoint(
+                name=cfg.get('name') or f"endpoint-{i}",
+                base_url=cfg['base_url'],
+                api_key=cfg.get('api_key'),
+                model=cfg.get('model') or settings.llm_model,
+                weight=float(cfg.get('weight', 1.0))
+            ))
+        if len(endpoints) > 1:
+            logger.info(f"LLM 路由已配置 {len(endpoints)} 个端点")
+        return cls(endpoints)
+
+    def _default_latency(self) -> float:
+        """未有样本的端点使用已知端点的平均延迟"""
+        known = [e.ewma_latency for e in self.endpoints if e.ewma_latency is not None]
+        return sum(known) / len(known) if known else 1.0
+
+    def pick(self, exclude: Iterable[LLMEndpoint] = ()) -> Optional[LLMEndpoint]:
+        """选择一个端点，没有可用端点时返回 None"""
+        excluded = set(id(e) for e in exclude)
+        candidates = [
+            e for e in self.endpoints
+            if id(e) not in excluded and e.breaker.is_available()
+        ]
+        default_latency = self._default_latency()
+
+        while candidates:
+            if len(candidates) == 1:
+                chosen = candidates[0]
+            else:
+                first = random.choices(candidates, weights=[c.weight for c in candidates])[0]
+                rest = [c for c in candidates if c is not first]
+                second = random.choices(rest, weights=[c.weight for c in rest])[0]
+                chosen = min((first, second), key=lambda e: e.score(default_latency))
+
+            # allow_request 可能会占用半开状态的探测名额
+            if chosen.breaker.allow_request():
+                return chosen
+            candidates.remove(chosen)
+
+        return None
+
+    def hedge_delay(self) -> Optional[float]:
+        """对冲请求的触发延迟：最近延迟的指定分位数，样本不足时返回 None"""
+        if not settings.llm_hedge_enabled or len(self.endpoints) < 2:
+            return None
+        if len(self.latencies) < settings.llm_hedge_min_samples:
+            return None
+        samples = sorted(self.latencies)
+        index = int(len(samples) * settings.llm_hedge_percentile / 100.0)
+        return samples[min(index, len(samples) - 1)]
+
+    def is_available(self) -> bool:
+        """是否存在可以接收请求的端点（不占用探测名额）"""
+        return any(e.breaker.is_available() for e in self.endpoints)
+
+    def get_state(self) -> List[Dict[str, Any]]:
+        """获取所有端点状态"""
+        return [e.get_state() for e in self.endpoints]
@@ -0,0 +1,125 @@
+"""
+负载自适应降级模块
+根据线程池排队时间和近期 OCR 耗时估计请求延迟，在延迟目标有风险时逐级降级，负载下降后自动恢复
+"""
+import logging
+import time
+from typing import Any, Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+# 降级措施
+DEGRADE_FAST = "fast"            # 未指定识别级别的请求改用 fast
+DEGRADE_DOWNSCALE = "downscale"  # 缩小大图后再识别
+DEGRADE_SKIP_LLM = "skip_llm"    # 跳过 LLM 排版
+
+# 各降级级别启用的措施（级别越高措施越多）
+LEVELS: List[List[str]] = [
+    [],
+    [DEGRADE_FAST],
+    [DEGRADE_FAST, DEGRADE_DOWNSCALE],
+    [DEGRADE_FAST, DEGRADE_DOWNSCALE, DEGRADE_SKIP_LLM]
+]
+
+# 估计延迟超过目标的该比例时升级，低于该比例时降级（中间区间保持不变，避免抖动）
+ESCALATE_RATIO = 0.8
+RECOVER_RATIO = 0.5
+
+
+class DegradationController:
+    """
+    延迟目标驱动的降级控制器
+
+    每次 OCR 任务完成后记录排队时间和执行时间的 EWMA，估计延迟 = 两者之和。
+    估计延迟超过 latency_target * ESCALATE_RATIO 时升一级，低于
+    latency_target * RECOVER_RATIO 时降一级；两次调整至少间隔 step_interval 秒。
+    没有在途或排队的识别任务、且一段时间内没有新的观测时（空闲）也会逐级恢复；
+    只要还有任务在执行，即使单个任务耗时很长也不算空闲。
+
+    所有方法都在事件循环线程中调用，不需要加锁。
+    """
+
+    def __init__(self, enabled: bool, latency_target: float, step_interval: float, alpha: float = 0.3,
+                 inflight: Callable[[], int] = lambda: 0):
+        self.enabled = enabled
+        self.inflight = inflight  # 返回当前在途（含排队）的识别任务数
+        self.latency_target = latency_target
+        self.step_interval = step_interval
+        self.alpha = alpha
+
+        self.level = 0
+        self.queue_wait = 0.0
+        self.latency = 0.0
+        self.samples = 0
+        self.last_change = 0.0
+        self.last_observation = 0.0
+
+        # 统计
+        self.escalations = 0
+        self.recoveries = 0
+        self.degraded_requests = {name: 0 for name in LEVELS[-1]}
+
+    def estimate(self) -> float:
+        """估计的请求延迟（秒）"""
+        return self.queue_wait + self.latency
+
+    def observe(self, queue_wait: float, latency: float):
+        """记录一次 OCR 任务的排队时间和执行时间"""
+        if self.samples == 0:
+            self.queue_wait, self.latency = queue_wait, latency
+        else:
+            self.queue_wait += self.alpha * (queue_wait - self.queue_wait)
+            self.latency += self.alpha * (latency - self.latency)
+        self.samples += 1
+        self.last_observation = time.monotonic()
+        self._adjust()
+
+    def _adjust(self):
+        """根据估计延迟调整降级级别"""
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        if now - self.last_change < self.step_interval:
+            return
+
+        estimate = self.estimate()
+        idle = (self.samples > 0 and self.inflight() == 0
+                and now - self.last_observation > max(2 * self.step_interval, 1.0))
+        if estimate > self.latency_target * ESCALATE_RATIO and not idle and self.level < len(LEVELS) - 1:
+            self.level += 1
+            self.escalations += 1
+            self.last_change = now
+            logger.warning(
+                f"估计延迟 {estimate:.2f}s 接近目标 {self.latency_target:.2f}s，"
+                f"降级到第 {self.level} 级: {','.join(LEVELS[self.level])}"
+            )
+        elif (estimate < self.latency_target * RECOVER_RATIO or idle) and self.level > 0:
+            self.level -= 1
+            self.recoveries += 1
+            self.last_change = now
+            logger.info(f"估计延迟 {estimate:.2f}s，恢复到第 {self.level} 级")
+
+    def active_degradations(self) -> List[str]:
+        """当前级别启用的降级措施"""
+        self._adjust()
+        return list(LEVELS[self.level])
+
+    def record_applied(self, degradations: List[str]):
+        """记录实际应用到请求上的降级措施"""
+        for name in degradations:
+            self.degraded_requests[name] += 1
+
+    def get_state(self) -> Dict[str, Any]:
+        """获取控制器状态"""
+        return {
+            'enabled': self.enabled,
+            'level': self.level,
+            'active': list(LEVELS[self.level]),
+            'latency_target': self.latency_target,
+            'estimated_latency': round(self.estimate(), 4),
+            'queue_wait_ewma': round(self.queue_wait, 4),
+            'latency_ewma': round(self.latency, 4),
+            'escalations': self.escalations,
+            'recoveries': self.recoveries,
+            'degraded_requests': self.degraded_requests.copy()
+        }
@@ -0,0 +1,158 @@
+"""
+日志流水线模块
+日志记录只在调用线程中放入内存队列，格式化和写入（控制台、文件）由后台线程完成，
+事件循环不会被磁盘 IO 阻塞；支持 JSON 结构化日志、请求 ID、阶段耗时和成功日志采样
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+from .config import settings
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# LogRecord 的标准属性，其余属性（通过 extra 传入）作为结构化字段输出
+_STANDARD_ATTRS = set(logging.LogRecord("", 0, "", 0, "", (), None).__dict__) | {"message", "asctime", "request_id"}
+
+# 当前请求的 ID、是否采样成功日志、各阶段耗时（在请求日志中间件中设置）
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+log_sampled_var: ContextVar[bool] = ContextVar("log_sampled", default=True)
+stage_timings_var: ContextVar[Optional[Dict[str, float]]] = ContextVar("stage_timings", default=None)
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional["DroppingQueueHandler"] = None
+
+
+class RequestContextFilter(logging.Filter):
+    """
+    在调用线程中为记录附加请求 ID，并丢弃未被采样的请求的成功日志
+
+    WARNING 及以上级别的日志始终保留。
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return record.levelno >= logging.WARNING or log_sampled_var.get()
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """队列已满时丢弃日志并计数，而不是阻塞调用线程"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 只合并消息参数（异常堆栈在这里格式化，避免跨线程持有 traceback），其余格式化交给后台线程
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JSONFormatter(logging.Formatter):
+    """每条记录输出为一行 JSON，extra 传入的字段原样保留"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data: Dict[str, Any] = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        if getattr(record, 'request_id', None):
+            data['request_id'] = record.request_id
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS and not key.startswith('_'):
+                data[key] = value
+        if record.exc_text:
+            data['exception'] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+def setup_logging():
+    """
+    配置根日志器（可重复调用，只生效一次）
+
+    根日志器只挂一个 QueueHandler，控制台和文件 Handler 由 QueueListener 在后台线程中调用。
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    formatter = JSONFormatter() if settings.log_format == "json" else logging.Formatter(TEXT_FORMAT)
+    handlers = [logging.StreamHandler()]
+    if settings.log_file:
+        handlers.append(logging.FileHandler(settings.log_file))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    _queue_handler = DroppingQueueHandler(queue.Queue(maxsize=settings.log_queue_size))
+    _queue_handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    root.setLevel(getattr(logging, settings.log_level))
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+
+    _listener = logging.handlers.QueueListener(_queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def get_dropped_logs() -> int:
+    """队列已满而丢弃的日志数"""
+    return _queue_handler.dropped if _queue_handler else 0
+
+
+def begin_request(request_id: Optional[str] = None) -> str:
+    """
+    开始记录一个请求的上下文：请求 ID、是否采样成功日志、阶段耗时
+
+    Returns:
+        请求 ID（未传入时生成）
+    """
+    request_id = request_id or uuid.uuid4().hex[:16]
+    request_id_var.set(request_id)
+    log_sampled_var.set(random.random() < settings.log_success_sample_rate)
+    stage_timings_var.set({})
+    return request_id
+
+
+def get_stage_timings() -> Dict[str, float]:
+    """当前请求已记录的各阶段耗时（秒）"""
+    return stage_timings_var.get() or {}
+
+
+def record_stage(name: str, seconds: float):
+    """累加当前请求某个阶段的耗时（多页、多区域时按阶段求和）"""
+    timings = stage_timings_var.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+@contextmanager
+def stage(name: str):
+    """记录 with 范围内的耗时为当前请求的一个阶段"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
@@ -0,0 +1,147 @@
+"""
+像素内存预算模块
+按解码后的像素字节数控制同时处理的图像：小图可以高并发，超大图一次只处理一张
+"""
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, Tuple
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+
+class OverloadedError(Exception):
+    """服务资源不足，请求被拒绝（接口返回 503）"""
+
+
+def estimate_pixel_bytes(size: Tuple[int, int], mode: str) -> int:
+    """
+    根据图像头中的尺寸和模式估计解码所需内存
+
+    包括按原始模式解码的像素，以及非 RGB 图像转换为 RGB 时的额外副本。
+    """
+    width, height = size
+    pixels = width * height
+    if mode in ('I', 'F'):
+        band_bytes = 4
+    elif mode.startswith('I;16'):
+        band_bytes = 2
+    else:
+        band_bytes = 1
+    try:
+        bands = Image.getmodebands(mode)
+    except Exception:
+        bands = 4
+    total = pixels * bands * band_bytes
+    if mode != 'RGB':
+        total += pixels * 3
+    return total
+
+
+class PixelBudget:
+    """
+    像素内存预算
+
+    每个请求在完整解码前预留其像素字节数，预算不足时按先来先得的顺序排队等待，
+    超过 max_wait 秒仍未获得预算则抛出 OverloadedError。超过整个预算的单张图像
+    在没有其他预留时也可以执行（此时独占预算）。budget_bytes 为 0 时不做限制。
+
+    所有方法都在事件循环线程中调用，不需要加锁。
+    """
+
+    def __init__(self, budget_bytes: int, max_wait: float):
+        self.budget_bytes = budget_bytes
+        self.max_wait = max_wait
+
+        self.reserved = 0
+        self.active = 0
+        self._waiters: Deque[Tuple[int, asyncio.Future]] = deque()
+
+        # 统计
+        self.peak_reserved = 0
+        self.admitted = 0
+        self.waited = 0
+        self.rejected = 0
+
+    def _fits(self, nbytes: int) -> bool:
+        return self.active == 0 or self.reserved + nbytes <= self.budget_bytes
+
+    def _take(self, nbytes: int):
+        self.reserved += nbytes
+        self.active += 1
+        self.admitted += 1
+        self.peak_reserved = max(self.peak_reserved, self.reserved)
+
+    def _wake(self):
+        """按顺序放行队首能够放下的等待者"""
+        while self._waiters:
+            nbytes, future = self._waiters[0]
+            if future.done():
+                # 已超时或被取消
+                self._waiters.popleft()
+                continue
+            if not self._fits(nbytes):
+                break
+            self._waiters.popleft()
+            self._take(nbytes)
+            future.set_result(None)
+
+    async def acquire(self, nbytes: int):
+        """预留 nbytes 字节，预算不足时等待"""
+        if not self.budget_bytes:
+            self._take(nbytes)
+            return
+        if not self._waiters and self._fits(nbytes):
+            self._take(nbytes)
+            return
+
+        self.waited += 1
+        future = asyncio.get_event_loop().create_future()
+        self._waiters.append((nbytes, future))
+        try:
+            await asyncio.wait_for(future, self.max_wait)
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                # 超时与放行同时发生：已经预留，需要归还
+                self.release(nbytes)
+            else:
+                future.cancel()
+                self._wake()
+            if isinstance(e, asyncio.TimeoutError):
+                self.rejected += 1
+                raise OverloadedError(
+                    f"图像内存预算不足（需要 {nbytes / 1048576:.1f} MB，"
+                    f"已预留 {self.reserved / 1048576:.1f} / {self.budget_bytes / 1048576:.1f} MB），请稍后重试"
+                )
+            raise
+
+    def release(self, nbytes: int):
+        """归还预留"""
+        self.reserved -= nbytes
+        self.active -= 1
+        self._wake()
+
+    @asynccontextmanager
+    async def reserve(self, nbytes: int):
+        """在 async with 范围内预留 nbytes 字节"""
+        await self.acquire(nbytes)
+        try:
+            yield
+        finally:
+            self.release(nbytes)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取预算使用情况"""
+        return {
+            'budget_bytes': self.budget_bytes,
+            'reserved_bytes': self.reserved,
+            'peak_reserved_bytes': self.peak_reserved,
+            'active': self.active,
+            'waiting': sum(1 for _, future in self._waiters if not future.done()),
+            'admitted': self.admitted,
+            'waited': self.waited,
+            'rejected': self.rejected
+        }
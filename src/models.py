@@ -2,11 +2,31 @@
 数据模型定义
 包含 API 请求和响应的数据结构
 """
-from typing import List, Optional, Tuple
+from typing import List, Optional, Tuple, Union
 from pydantic import BaseModel, Field, validator
 import base64
 import binascii
 
+from .callbacks import check_callback_url
+
+
+class RegionOfInterest(BaseModel):
+    """感兴趣区域（只识别图像中的指定区域）"""
+
+    id: Optional[str] = Field(None, description="区域 ID，结果中通过 region_id 对应；默认为区域下标")
+    x: float = Field(..., ge=0, description="左上角 X 坐标")
+    y: float = Field(..., ge=0, description="左上角 Y 坐标")
+    width: float = Field(..., gt=0, description="宽度")
+    height: float = Field(..., gt=0, description="高度")
+    unit: str = Field("pixel", description="坐标单位 ('pixel' 像素 或 'relative' 相对图像尺寸的 0-1 比例)")
+
+    @validator('unit')
+    def validate_unit(cls, v):
+        """验证坐标单位"""
+        if v not in ['pixel', 'relative']:
+            raise ValueError("坐标单位必须是 'pixel' 或 'relative'")
+        return v
+
 
 class OCRRequest(BaseModel):
     """OCR 请求模型"""
@@ -14,7 +34,7 @@ class OCRRequest(BaseModel):
     image_base64: str = Field(..., description="Base64 编码的图像数据")
     recognition_level: Optional[str] = Field(
         None, 
-        description="识别级别 ('accurate' 或 'fast')"
+        description="识别级别 ('accurate'、'fast' 或 'cascade'：先 fast，低置信度部分再用 accurate 重识别)"
     )
     language_preference: Optional[List[str]] = Field(
         None, 
@@ -30,6 +50,10 @@ class OCRRequest(BaseModel):
         None, 
         description="使用的框架 ('vision' 或 'livetext')"
     )
+    regions: Optional[List[RegionOfInterest]] = Field(
+        None,
+        description="只识别这些区域（可选），结果坐标仍相对于整张图像"
+    )
     
     @validator('image_base64')
     def validate_base64(cls, v):
@@ -48,8 +72,8 @@ class OCRRequest(BaseModel):
     @validator('recognition_level')
     def validate_recognition_level(cls, v):
         """验证识别级别"""
-        if v is not None and v not in ['accurate', 'fast']:
-            raise ValueError("识别级别必须是 'accurate' 或 'fast'")
+        if v is not None and v not in ['accurate', 'fast', 'cascade']:
+            raise ValueError("识别级别必须是 'accurate'、'fast' 或 'cascade'")
         return v
     
     @validator('framework')
@@ -77,6 +101,12 @@ class OCRResult(BaseModel):
     score: float = Field(..., description="置信度分数")
 
 
+class RegionOCRResult(OCRResult):
+    """按感兴趣区域识别时的单个 OCR 结果"""
+
+    region_id: str = Field(..., description="所属区域 ID")
+
+
 class ErrorResponse(BaseModel):
     """错误响应模型"""
     
@@ -101,7 +131,7 @@ class OCRFormatRequest(BaseModel):
     image_base64: str = Field(..., description="Base64 编码的图像数据")
     recognition_level: Optional[str] = Field(
         None,
-        description="识别级别 ('accurate' 或 'fast')"
+        description="识别级别 ('accurate'、'fast' 或 'cascade'：先 fast，低置信度部分再用 accurate 重识别)"
     )
     language_preference: Optional[List[str]] = Field(
         None,
@@ -117,6 +147,10 @@ class OCRFormatRequest(BaseModel):
         None,
         description="使用的框架 ('vision' 或 'livetext')"
     )
+    regions: Optional[List[RegionOfInterest]] = Field(
+        None,
+        description="只识别这些区域（可选），结果坐标仍相对于整张图像"
+    )
     enable_llm_format: bool = Field(
         False,
         description="是否启用 LLM 排版（需配置 OpenAI API）"
@@ -138,8 +172,8 @@ class OCRFormatRequest(BaseModel):
     @validator('recognition_level')
     def validate_recognition_level(cls, v):
         """验证识别级别"""
-        if v is not None and v not in ['accurate', 'fast']:
-            raise ValueError("识别级别必须是 'accurate' 或 'fast'")
+        if v is not None and v not in ['accurate', 'fast', 'cascade']:
+            raise ValueError("识别级别必须是 'accurate'、'fast' 或 'cascade'")
         return v
 
     @validator('framework')
@@ -161,8 +195,234 @@ class FormattedResult(BaseModel):
 class OCRFormatResponse(BaseModel):
     """带排版的 OCR 响应模型"""
 
-    results: List[OCRResult] = Field(..., description="原始 OCR 结果列表")
+    results: List[Union[RegionOCRResult, OCRResult]] = Field(..., description="原始 OCR 结果列表")
     local_format: FormattedResult = Field(..., description="本地算法排版结果")
     llm_format: Optional[FormattedResult] = Field(None, description="LLM 排版结果")
     processing_time: float = Field(..., description="处理时间（秒）")
-    image_size: Tuple[int, int] = Field(..., description="图像尺寸 (width, height)") 
\ No newline at end of file
+    image_size: Tuple[int, int] = Field(..., description="图像尺寸 (width, height)") 
+
+
+class OCRJobRequest(OCRFormatRequest):
+    """异步 OCR 任务请求模型"""
+
+    callback_url: Optional[str] = Field(
+        None,
+        description="任务完成后推送结果的回调地址（可选）"
+    )
+
+    @validator('callback_url')
+    def validate_callback_url(cls, v):
+        """验证回调地址（协议、允许的主机，不允许内网地址）"""
+        if v is not None:
+            check_callback_url(v)
+        return v
+
+
+class JobSubmitResponse(BaseModel):
+    """任务提交响应"""
+
+    job_id: str = Field(..., description="任务 ID")
+    status: str = Field(..., description="任务状态")
+    created_at: float = Field(..., description="创建时间（Unix 时间戳）")
+
+
+class JobStatusResponse(BaseModel):
+    """任务状态响应"""
+
+    job_id: str = Field(..., description="任务 ID")
+    status: str = Field(..., description="任务状态 (queued/running/succeeded/failed)")
+    error: Optional[str] = Field(None, description="失败时的错误信息")
+    attempts: int = Field(..., description="已尝试执行次数")
+    created_at: float = Field(..., description="创建时间（Unix 时间戳）")
+    started_at: Optional[float] = Field(None, description="开始执行时间")
+    finished_at: Optional[float] = Field(None, description="完成时间")
+    expires_at: Optional[float] = Field(None, description="结果过期时间")
+
+
+class OCRFileRequest(BaseModel):
+    """本地文件 OCR 请求模型（文件需位于 LOCAL_INPUT_ROOT 下）"""
+
+    file_path: str = Field(..., description="文件路径（绝对路径或相对于 LOCAL_INPUT_ROOT 的路径）")
+    recognition_level: Optional[str] = Field(
+        None,
+        description="识别级别 ('accurate'、'fast' 或 'cascade'：先 fast，低置信度部分再用 accurate 重识别)"
+    )
+    language_preference: Optional[List[str]] = Field(
+        None,
+        description="语言偏好列表，如 ['en-US', 'zh-Hans']"
+    )
+    confidence_threshold: Optional[float] = Field(
+        None,
+        ge=0.0,
+        le=1.0,
+        description="置信度阈值 (0.0-1.0)"
+    )
+    framework: Optional[str] = Field(
+        None,
+        description="使用的框架 ('vision' 或 'livetext')"
+    )
+    regions: Optional[List[RegionOfInterest]] = Field(
+        None,
+        description="只识别这些区域（可选），结果坐标仍相对于整张图像"
+    )
+    enable_llm_format: bool = Field(
+        False,
+        description="是否启用 LLM 排版（需配置 OpenAI API）"
+    )
+
+    @validator('file_path')
+    def validate_file_path(cls, v):
+        """验证文件路径"""
+        if not v or '\x00' in v:
+            raise ValueError("文件路径无效")
+        return v
+
+    @validator('recognition_level')
+    def validate_recognition_level(cls, v):
+        """验证识别级别"""
+        if v is not None and v not in ['accurate', 'fast', 'cascade']:
+            raise ValueError("识别级别必须是 'accurate'、'fast' 或 'cascade'")
+        return v
+
+    @validator('framework')
+    def validate_framework(cls, v):
+        """验证框架选择"""
+        if v is not None and v not in ['vision', 'livetext']:
+            raise ValueError("框架必须是 'vision' 或 'livetext'")
+        return v
+
+
+class OCRDocumentRequest(BaseModel):
+    """多页文档 OCR 请求模型（多页 TIFF 或 PDF）"""
+
+    document_base64: str = Field(..., description="Base64 编码的文档数据（TIFF/PDF 或普通图像）")
+    recognition_level: Optional[str] = Field(
+        None,
+        description="识别级别 ('accurate'、'fast' 或 'cascade'：先 fast，低置信度部分再用 accurate 重识别)"
+    )
+    language_preference: Optional[List[str]] = Field(
+        None,
+        description="语言偏好列表，如 ['en-US', 'zh-Hans']"
+    )
+    confidence_threshold: Optional[float] = Field(
+        None,
+        ge=0.0,
+        le=1.0,
+        description="置信度阈值 (0.0-1.0)"
+    )
+    framework: Optional[str] = Field(
+        None,
+        description="使用的框架 ('vision' 或 'livetext')"
+    )
+
+    @validator('document_base64')
+    def validate_base64(cls, v):
+        """验证 Base64 文档数据"""
+        if not v:
+            raise ValueError("文档数据不能为空")
+
+        try:
+            base64.b64decode(v, validate=True)
+        except (binascii.Error, ValueError):
+            raise ValueError("无效的 Base64 文档数据")
+
+        return v
+
+    @validator('recognition_level')
+    def validate_recognition_level(cls, v):
+        """验证识别级别"""
+        if v is not None and v not in ['accurate', 'fast', 'cascade']:
+            raise ValueError("识别级别必须是 'accurate'、'fast' 或 'cascade'")
+        return v
+
+    @validator('framework')
+    def validate_framework(cls, v):
+        """验证框架选择"""
+        if v is not None and v not in ['vision', 'livetext']:
+            raise ValueError("框架必须是 'vision' 或 'livetext'")
+        return v
+
+
+class OCRBatchRequest(BaseModel):
+    """批量图像 OCR 请求模型"""
+
+    images_base64: List[str] = Field(..., description="Base64 编码的图像数据列表")
+    recognition_level: Optional[str] = Field(
+        None,
+        description="识别级别 ('accurate'、'fast' 或 'cascade'：先 fast，低置信度部分再用 accurate 重识别)"
+    )
+    language_preference: Optional[List[str]] = Field(
+        None,
+        description="语言偏好列表，如 ['en-US', 'zh-Hans']"
+    )
+    confidence_threshold: Optional[float] = Field(
+        None,
+        ge=0.0,
+        le=1.0,
+        description="置信度阈值 (0.0-1.0)"
+    )
+    framework: Optional[str] = Field(
+        None,
+        description="使用的框架 ('vision' 或 'livetext')"
+    )
+
+    @validator('images_base64')
+    def validate_images(cls, v):
+        """验证图像列表（单张图像的 Base64 在处理时逐张校验）"""
+        if not v:
+            raise ValueError("图像列表不能为空")
+        return v
+
+    @validator('recognition_level')
+    def validate_recognition_level(cls, v):
+        """验证识别级别"""
+        if v is not None and v not in ['accurate', 'fast', 'cascade']:
+            raise ValueError("识别级别必须是 'accurate'、'fast' 或 'cascade'")
+        return v
+
+    @validator('framework')
+    def validate_framework(cls, v):
+        """验证框架选择"""
+        if v is not None and v not in ['vision', 'livetext']:
+            raise ValueError("框架必须是 'vision' 或 'livetext'")
+        return v
+
+
+class DocumentPageResult(BaseModel):
+    """文档单页结果"""
+
+    page_index: int = Field(..., description="页码（从 0 开始；批量请求中为图像下标）")
+    results: List[OCRResult] = Field(..., description="该页的 OCR 结果列表")
+    local_format: FormattedResult = Field(..., description="该页的本地排版结果")
+    image_size: Tuple[int, int] = Field(..., description="页面尺寸 (width, height)")
+    processing_time: float = Field(..., description="该页处理时间（秒）")
+    degradations: Optional[List[str]] = Field(None, description="负载过高时应用到该页的降级措施（未降级时为空）")
+    error: Optional[str] = Field(None, description="该页失败时的错误信息")
+
+
+class OCRDocumentResponse(BaseModel):
+    """多页文档 OCR 响应模型"""
+
+    pages: List[DocumentPageResult] = Field(..., description="按页码排序的各页结果")
+    page_count: int = Field(..., description="总页数")
+    processing_time: float = Field(..., description="总处理时间（秒）")
+
+
+class SearchHit(BaseModel):
+    """全文检索命中的一张图像"""
+
+    image_hash: str = Field(..., description="图像内容的 SHA-256")
+    source: Optional[str] = Field(None, description="来源（本地文件路径），Base64 上传的图像为空")
+    image_size: Tuple[int, int] = Field(..., description="图像尺寸 (width, height)")
+    matches: List[OCRResult] = Field(..., description="包含检索词的文本行及其坐标（像素）")
+    markdown: Optional[str] = Field(None, description="本地排版结果（include_markdown=true 时返回）")
+    created_at: float = Field(..., description="首次保存时间（Unix 时间戳）")
+    updated_at: float = Field(..., description="最近一次识别时间（Unix 时间戳）")
+
+
+class SearchResponse(BaseModel):
+    """全文检索响应"""
+
+    query: str = Field(..., description="检索语句")
+    hits: List[SearchHit] = Field(..., description="命中的图像，按相关度排序")
+    processing_time: float = Field(..., description="检索耗时（秒）")
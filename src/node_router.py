@@ -0,0 +1,567 @@
+"""
+多节点路由模块（python main.py --router）
+对外提供与单机相同的 /predict* 接口，按在途请求数和后端上报的队列深度把请求转发给多台 OCR 实例，
+自动摘除不健康或过载的后端，并把批量请求拆分到多个节点并行处理
+
+本模块不导入 ocr_service，可以在没有 Vision 框架的机器上运行。
+"""
+import asyncio
+import json
+import logging
+import math
+import random
+import time
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+import httpx
+from fastapi import FastAPI, HTTPException, Depends, Request, Security
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+
+from .config import settings
+from .models import ErrorResponse
+from .tenants import tenant_registry
+from .logging_pipeline import setup_logging
+
+# 配置日志
+setup_logging()
+
+logger = logging.getLogger(__name__)
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# 转发给后端的请求头和回传给客户端的响应头
+FORWARD_REQUEST_HEADERS = ("accept", "content-type")
+FORWARD_RESPONSE_PREFIX = "x-ocr-"
+
+# 这些状态码表示后端暂时不可用，请求会换一个后端重试，并暂时摘除该后端
+RETRY_STATUS_CODES = (429, 502, 503, 504)
+
+
+class BackendUnavailable(Exception):
+    """没有可用的后端，或所有后端都拒绝了请求"""
+
+
+class OCRBackend:
+    """单个 OCR 后端实例及其运行状态"""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip('/')
+
+        self.in_flight = 0
+        self.queue_depth = 0  # 最近一次健康检查时后端上报的整机队列深度
+        self.healthy = True  # 最近一次健康检查是否成功（启动时乐观地认为可用）
+        self.ejected_until = 0.0
+        self.last_error: Optional[str] = None
+
+        # 统计
+        self.requests = 0
+        self.failures = 0
+        self.ejections = 0
+
+    def is_available(self) -> bool:
+        """是否可以接收请求"""
+        return self.healthy and time.monotonic() >= self.ejected_until
+
+    def score(self) -> int:
+        """路由评分，越低越好：本路由器的在途请求数 + 后端上报的排队数"""
+        return self.in_flight + self.queue_depth
+
+    def eject(self, duration: float, reason: str):
+        """暂时摘除该后端"""
+        self.ejected_until = time.monotonic() + duration
+        self.ejections += 1
+        self.last_error = reason
+        logger.warning(f"后端 {self.base_url} 已摘除 {duration:.1f}s: {reason}")
+
+    def get_state(self) -> Dict[str, Any]:
+        """获取后端状态"""
+        return {
+            'base_url': self.base_url,
+            'available': self.is_available(),
+            'healthy': self.healthy,
+            'ejected_for': round(max(0.0, self.ejected_until - time.monotonic()), 3),
+            'in_flight': self.in_flight,
+            'queue_depth': self.queue_depth,
+            'requests': self.requests,
+            'failures': self.failures,
+            'ejections': self.ejections,
+            'last_error': self.last_error
+        }
+
+
+class NodeRouter:
+    """
+    OCR 节点路由器
+
+    选择可用后端中 在途请求数 + 上报队列深度 最小的一个（相同时随机），
+    请求遇到连接错误、超时或 429/502/503/504 时摘除该后端并换一个后端重试；
+    后台定期访问各后端的 /ready，更新健康状态和队列深度。
+    """
+
+    def __init__(self, backends: List[OCRBackend]):
+        self.backends = backends
+        self.client: Optional[httpx.AsyncClient] = None
+        self._health_task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_settings(cls) -> "NodeRouter":
+        """根据配置创建路由器"""
+        return cls([OCRBackend(url) for url in settings.get_router_backends()])
+
+    async def start(self):
+        """创建 HTTP 客户端并启动健康检查"""
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.router_timeout, connect=5.0),
+            headers={"Authorization": f"Bearer {settings.router_backend_token or settings.auth_token}"}
+        )
+        self._health_task = asyncio.create_task(self._health_loop())
+        logger.info(f"节点路由已启动，共 {len(self.backends)} 个后端")
+
+    async def stop(self):
+        """停止健康检查并关闭客户端"""
+        if self._health_task:
+            self._health_task.cancel()
+        if self.client:
+            await self.client.aclose()
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.gather(*(self._check(backend) for backend in self.backends))
+            await asyncio.sleep(settings.router_health_interval)
+
+    async def _check(self, backend: OCRBackend):
+        """访问后端的 /ready，更新健康状态和队列深度"""
+        try:
+            response = await self.client.get(f"{backend.base_url}/ready", timeout=settings.router_health_interval + 1.0)
+            data = response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            if backend.healthy:
+                logger.warning(f"后端 {backend.base_url} 健康检查失败: {str(e)}")
+            backend.healthy = False
+            backend.last_error = str(e) or type(e).__name__
+            return
+
+        healthy = response.status_code == 200 and data.get('ready', True)
+        if healthy and not backend.healthy:
+            logger.info(f"后端 {backend.base_url} 已恢复")
+        elif not healthy and backend.healthy:
+            logger.warning(f"后端 {backend.base_url} 未就绪: {response.status_code}")
+        backend.healthy = healthy
+        backend.queue_depth = int(data.get('queue_depth') or 0)
+
+    def pick(self, exclude: Iterable[OCRBackend] = ()) -> Optional[OCRBackend]:
+        """选择一个后端，没有可用后端时返回 None"""
+        excluded = set(id(b) for b in exclude)
+        candidates = [b for b in self.backends if id(b) not in excluded and b.is_available()]
+        if not candidates:
+            return None
+        best = min(b.score() for b in candidates)
+        return random.choice([b for b in candidates if b.score() == best])
+
+    def available_count(self) -> int:
+        """当前可用的后端数"""
+        return sum(1 for b in self.backends if b.is_available())
+
+    def _should_retry(self, backend: OCRBackend, response: httpx.Response) -> bool:
+        """后端暂时不可用时摘除并返回 True"""
+        if response.status_code not in RETRY_STATUS_CODES:
+            return False
+        backend.failures += 1
+        eject_time = settings.router_eject_time
+        retry_after = response.headers.get("retry-after")
+        if retry_after and retry_after.isdigit():
+            eject_time = max(eject_time, float(retry_after))
+        backend.eject(eject_time, f"HTTP {response.status_code}")
+        return True
+
+    async def send(self, path: str, body: bytes, headers: Dict[str, str],
+                   stream: bool = False) -> Tuple[OCRBackend, httpx.Response]:
+        """
+        转发请求，后端不可用时换一个后端重试（OCR 请求是幂等的）
+
+        stream 为 True 时返回未读取响应体的流式响应，调用方负责关闭；
+        返回时该后端的 in_flight 仍然计入本请求，调用方完成后需要调用 done。
+
+        Raises:
+            BackendUnavailable: 所有后端都不可用
+        """
+        tried: List[OCRBackend] = []
+        last_error = "没有可用的后端"
+        while True:
+            backend = self.pick(exclude=tried)
+            if backend is None:
+                raise BackendUnavailable(last_error)
+            tried.append(backend)
+
+            backend.in_flight += 1
+            backend.requests += 1
+            try:
+                request = self.client.build_request("POST", f"{backend.base_url}{path}", content=body, headers=headers)
+                response = await self.client.send(request, stream=stream)
+            except httpx.HTTPError as e:
+                self.done(backend)
+                backend.failures += 1
+                last_error = f"后端 {backend.base_url} 请求失败: {str(e) or type(e).__name__}"
+                backend.eject(settings.router_eject_time, last_error)
+                continue
+
+            if self._should_retry(backend, response):
+                last_error = f"后端 {backend.base_url} 返回 {response.status_code}"
+                if stream:
+                    await response.aclose()
+                self.done(backend)
+                continue
+            return backend, response
+
+    def done(self, backend: OCRBackend):
+        """请求完成，减少在途计数"""
+        backend.in_flight -= 1
+
+    def get_state(self) -> List[Dict[str, Any]]:
+        """获取所有后端状态"""
+        return [b.get_state() for b in self.backends]
+
+
+# 全局路由器实例
+node_router = NodeRouter.from_settings()
+
+# 创建 FastAPI 应用
+app = FastAPI(
+    title=f"{settings.app_name} Router",
+    version=settings.app_version,
+    description="把 OCR 请求分发到多台 OCR Mac API 实例的路由服务",
+    debug=settings.debug
+)
+
+# 添加 CORS 中间件
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=[settings.allowed_origins] if settings.allowed_origins != "*" else ["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+# 安全认证
+security = HTTPBearer()
+
+# 应用启动时间
+app_start_time = time.time()
+
+
+def verify_token(credentials: HTTPAuthorizationCredentials = Security(security)):
+    """
+    验证认证令牌，并按令牌所属租户限流
+
+    转发给后端时统一使用 ROUTER_BACKEND_TOKEN（或 AUTH_TOKEN），租户限流在路由器上进行。
+    """
+    tenant = tenant_registry.authenticate(credentials.credentials)
+    if tenant is None:
+        raise HTTPException(
+            status_code=401,
+            detail="无效的认证令牌"
+        )
+    tenant.requests += 1
+    retry_after = tenant.bucket.try_take()
+    if retry_after:
+        tenant.rate_limited += 1
+        raise HTTPException(
+            status_code=429,
+            detail=f"租户 {tenant.name} 请求过于频繁，请稍后重试",
+            headers={"Retry-After": str(math.ceil(retry_after))}
+        )
+    return credentials.credentials
+
+
+@app.exception_handler(HTTPException)
+async def http_exception_handler(request: Request, exc: HTTPException):
+    """HTTP 异常处理器"""
+    logger.error(f"HTTP 异常: {exc.status_code} - {exc.detail}")
+    return JSONResponse(
+        status_code=exc.status_code,
+        content=ErrorResponse(
+            error="HTTP_ERROR",
+            message=exc.detail,
+            code=exc.status_code,
+            timestamp=datetime.now().isoformat()
+        ).dict(),
+        headers=exc.headers
+    )
+
+
+def _forward_headers(raw_request: Request) -> Dict[str, str]:
+    return {name: raw_request.headers[name] for name in FORWARD_REQUEST_HEADERS if name in raw_request.headers}
+
+
+def _response_headers(response: httpx.Response) -> Dict[str, str]:
+    return {
+        name: value for name, value in response.headers.items()
+        if name.lower().startswith(FORWARD_RESPONSE_PREFIX)
+    }
+
+
+def _wants_ndjson(raw_request: Request) -> bool:
+    """客户端是否请求 NDJSON 流式响应（Accept 头或 ?stream=true）"""
+    if raw_request.query_params.get("stream", "").lower() in ("1", "true"):
+        return True
+    return NDJSON_MEDIA_TYPE in raw_request.headers.get("accept", "")
+
+
+def _backend_path(path: str, query: str, stream: bool) -> str:
+    """转发路径：保留客户端的查询参数（format 等），流式转发时带上 stream=true"""
+    params = [
+        (name, value) for name, value in parse_qsl(query, keep_blank_values=True)
+        if not (stream and name == "stream")
+    ]
+    if stream:
+        params.append(("stream", "true"))
+    return f"{path}?{urlencode(params)}" if params else path
+
+
+async def _forward(path: str, raw_request: Request) -> Response:
+    """把请求原样转发给一个后端，并回传其响应"""
+    body = await raw_request.body()
+    headers = _forward_headers(raw_request)
+    stream = _wants_ndjson(raw_request)
+    path = _backend_path(path, raw_request.url.query, stream)
+
+    try:
+        backend, response = await node_router.send(path, body, headers, stream=stream)
+    except BackendUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    response_headers = _response_headers(response)
+    response_headers["X-OCR-Backend"] = backend.base_url
+    media_type = response.headers.get("content-type")
+
+    if not stream:
+        node_router.done(backend)
+        return Response(
+            content=response.content,
+            status_code=response.status_code,
+            headers=response_headers,
+            media_type=media_type
+        )
+
+    async def body_iter():
+        try:
+            async for chunk in response.aiter_bytes():
+                yield chunk
+        finally:
+            await response.aclose()
+            node_router.done(backend)
+
+    return StreamingResponse(
+        body_iter(), status_code=response.status_code, headers=response_headers, media_type=media_type
+    )
+
+
+def _error_page(index: int, error: str) -> Dict[str, Any]:
+    """整块转发失败时为其中每张图像构造失败页"""
+    return {
+        'page_index': index,
+        'results': [],
+        'local_format': {'markdown': "", 'success': False, 'error': error},
+        'image_size': [0, 0],
+        'processing_time': 0.0,
+        'error': error
+    }
+
+
+def _split_batch(count: int) -> List[Tuple[int, int]]:
+    """
+    把批量请求按可用后端数拆成连续的块
+
+    每块至少 router_batch_min_chunk 张图像，避免拆得过碎；返回 (起始下标, 结束下标) 列表。
+    """
+    parts = max(1, min(node_router.available_count(), count // max(1, settings.router_batch_min_chunk)))
+    bounds = [round(i * count / parts) for i in range(parts + 1)]
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+
+
+async def _run_chunk(payload: Dict[str, Any], start: int, end: int,
+                     headers: Dict[str, str], query: str = "") -> AsyncIterator[Dict[str, Any]]:
+    """
+    把批量请求的一块转发给一个后端，逐页产出结果（page_index 已换算为整个请求中的下标）
+
+    后端不可用或返回错误时，该块的每张图像都产出失败页。
+    """
+    chunk = {**payload, 'images_base64': payload['images_base64'][start:end]}
+    body = json.dumps(chunk).encode('utf-8')
+    headers = {**headers, 'accept': NDJSON_MEDIA_TYPE, 'content-type': 'application/json'}
+
+    try:
+        backend, response = await node_router.send(
+            _backend_path("/predict-batch", query, stream=True), body, headers, stream=True
+        )
+    except BackendUnavailable as e:
+        for index in range(start, end):
+            yield _error_page(index, str(e))
+        return
+
+    seen = set()
+    try:
+        if response.status_code != 200:
+            await response.aread()
+            error = f"后端 {backend.base_url} 返回 {response.status_code}: {response.text[:200]}"
+            for index in range(start, end):
+                yield _error_page(index, error)
+            return
+
+        async for line in response.aiter_lines():
+            if not line.strip():
+                continue
+            page = json.loads(line)
+            page['page_index'] += start
+            seen.add(page['page_index'])
+            yield page
+    except (httpx.HTTPError, ValueError) as e:
+        # 流中途断开：没有返回的图像记为失败
+        backend.failures += 1
+        error = f"后端 {backend.base_url} 响应中断: {str(e) or type(e).__name__}"
+        for index in range(start, end):
+            if index not in seen:
+                yield _error_page(index, error)
+    finally:
+        await response.aclose()
+        node_router.done(backend)
+
+
+async def _fan_out(payload: Dict[str, Any], headers: Dict[str, str],
+                   query: str = "") -> AsyncIterator[Dict[str, Any]]:
+    """把批量请求拆分到多个后端并行处理，按完成顺序合并逐页结果（query 为客户端的查询参数）"""
+    queue: asyncio.Queue = asyncio.Queue()
+    chunks = _split_batch(len(payload['images_base64']))
+
+    async def pump(start: int, end: int):
+        try:
+            async for page in _run_chunk(payload, start, end, headers, query):
+                await queue.put(page)
+        finally:
+            await queue.put(None)
+
+    tasks = [asyncio.create_task(pump(start, end)) for start, end in chunks]
+    remaining = len(tasks)
+    try:
+        while remaining:
+            page = await queue.get()
+            if page is None:
+                remaining -= 1
+                continue
+            yield page
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+@app.get("/health")
+async def health_check():
+    """路由器自身的健康检查"""
+    return {
+        "status": "healthy",
+        "version": settings.app_version,
+        "uptime": time.time() - app_start_time,
+        "backends_available": node_router.available_count(),
+        "backends_total": len(node_router.backends)
+    }
+
+
+@app.get("/ready")
+async def readiness_check():
+    """至少有一个可用后端时就绪"""
+    available = node_router.available_count()
+    content = {
+        "ready": available > 0,
+        "backends_available": available,
+        "queue_depth": sum(b.in_flight for b in node_router.backends)
+    }
+    if not available:
+        return JSONResponse(status_code=503, content=content)
+    return content
+
+
+@app.get("/stats")
+async def get_stats(token: str = Depends(verify_token)):
+    """各后端的路由状态"""
+    return {
+        "backends": node_router.get_state(),
+        "tenant_stats": tenant_registry.get_stats(),
+        "uptime": time.time() - app_start_time,
+        "timestamp": datetime.now().isoformat()
+    }
+
+
+@app.post("/predict")
+async def predict(raw_request: Request, token: str = Depends(verify_token)):
+    """转发到一个后端的 /predict"""
+    return await _forward("/predict", raw_request)
+
+
+@app.post("/predict-format")
+async def predict_format(raw_request: Request, token: str = Depends(verify_token)):
+    """转发到一个后端的 /predict-format"""
+    return await _forward("/predict-format", raw_request)
+
+
+@app.post("/predict-document")
+async def predict_document(raw_request: Request, token: str = Depends(verify_token)):
+    """转发到一个后端的 /predict-document（多页文档由同一个后端逐页解码）"""
+    return await _forward("/predict-document", raw_request)
+
+
+@app.post("/predict-batch")
+async def predict_batch(raw_request: Request, token: str = Depends(verify_token)):
+    """
+    批量图像 OCR：拆分到多个后端并行处理
+
+    page_index 仍为图像在原请求中的下标；支持与单机相同的 NDJSON 流式返回。
+    """
+    try:
+        payload = await raw_request.json()
+        images = payload['images_base64']
+        if not isinstance(images, list):
+            raise ValueError("images_base64 必须是列表")
+    except (ValueError, KeyError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"无效的批量请求: {str(e)}")
+    if not images:
+        raise HTTPException(status_code=400, detail="images_base64 不能为空")
+    if len(images) > settings.max_batch_images:
+        raise HTTPException(status_code=400, detail=f"图像数量超过限制: {len(images)} > {settings.max_batch_images}")
+    if not node_router.available_count():
+        raise HTTPException(status_code=503, detail="没有可用的后端")
+
+    start_time = time.time()
+    pages = _fan_out(payload, _forward_headers(raw_request), raw_request.url.query)
+
+    if _wants_ndjson(raw_request):
+        async def body():
+            async for page in pages:
+                yield json.dumps(page, ensure_ascii=False) + "\n"
+        return StreamingResponse(body(), media_type=NDJSON_MEDIA_TYPE)
+
+    results = [page async for page in pages]
+    results.sort(key=lambda p: p['page_index'])
+    return {
+        "pages": results,
+        "page_count": len(results),
+        "processing_time": time.time() - start_time
+    }
+
+
+# 应用启动和关闭事件
+@app.on_event("startup")
+async def startup_event():
+    """应用启动事件"""
+    if not node_router.backends:
+        logger.error("路由模式需要配置 ROUTER_BACKENDS")
+    await node_router.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """应用关闭事件"""
+    await node_router.stop()
@@ -4,26 +4,90 @@ OCR 服务封装模块
 """
 import asyncio
 import base64
+import contextvars
+import hashlib
 import io
 import logging
+import mmap
+import os
+import threading
 import time
-from typing import List, Optional, Tuple, Dict, Any
+from typing import List, Optional, Tuple, Dict, Any, AsyncIterator, Callable
 from concurrent.futures import ThreadPoolExecutor
-from PIL import Image
+from PIL import Image, ImageDraw
+import numpy as np
 
 
-from ocrmac.ocrmac import OCR, text_from_image, livetext_from_image, convert_coordinates_pil
-from .models import OCRResult
+from .results import OCRResultSet
 from .config import settings
+from .document import DocumentReader
+from .imaging import open_image
+from .models import RegionOfInterest
+from .load_control import DegradationController, DEGRADE_FAST, DEGRADE_DOWNSCALE
+from .incremental import FrameSession
+from .dedup import NearDuplicateIndex, dhash
+from .memory_budget import PixelBudget, estimate_pixel_bytes
+from .host_limit import HostConcurrency
+from .concurrency_control import AdaptiveConcurrencyLimiter
+from .tenants import FairScheduler, get_current_tenant
+from .profiling import current_profile
+from .logging_pipeline import record_stage, stage
+
+# 预热时等待所有工作线程就位的最长时间（秒）
+WARMUP_BARRIER_TIMEOUT = 10.0
 
 
 class OCRService:
     """OCR 服务类"""
     
     def __init__(self):
-        """初始化 OCR 服务"""
+        """
+        初始化 OCR 服务
+
+        这里只创建不占用系统资源的状态；线程池和整机槽位文件在 start 中创建（应用启动事件中调用），
+        导入模块时没有副作用。
+        """
         self.logger = logging.getLogger(__name__)
-        self.executor = ThreadPoolExecutor(max_workers=settings.workers)
+        # 启用自适应并发时线程池按上限创建，实际并发由 concurrency_limiter 控制
+        self.executor_size = (
+            max(settings.workers, settings.adaptive_max_concurrency)
+            if settings.adaptive_concurrency_enabled else settings.workers
+        )
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.concurrency_limiter = AdaptiveConcurrencyLimiter(
+            enabled=settings.adaptive_concurrency_enabled,
+            initial=settings.workers,
+            minimum=settings.adaptive_min_concurrency,
+            maximum=settings.adaptive_max_concurrency,
+            interval=settings.adaptive_interval
+        )
+        self.load_controller = DegradationController(
+            enabled=settings.degradation_enabled,
+            latency_target=settings.degradation_latency_target,
+            step_interval=settings.degradation_step_interval,
+            inflight=lambda: self.ocr_inflight
+        )
+        # 按解码后的像素字节数限制同时处理的图像
+        self.pixel_budget = PixelBudget(
+            budget_bytes=settings.memory_budget_mb * 1024 * 1024,
+            max_wait=settings.memory_budget_wait
+        )
+        # 按租户加权公平排队，容量跟随自适应并发上限
+        self.scheduler = FairScheduler(lambda: self.concurrency_limiter.limit)
+        # 整机识别槽位（多个工作进程共享，在 start 中创建）
+        self.host_slots: Optional[HostConcurrency] = None
+        # 本进程已提交到线程池、尚未完成的识别任务数（只在事件循环线程中更新）
+        self.ocr_inflight = 0
+        # 近似重复图像索引（可选）
+        self.dedup_index = NearDuplicateIndex(
+            hash_bits=settings.dedup_hash_size ** 2,
+            max_distance=settings.dedup_max_distance,
+            max_entries=settings.dedup_max_entries
+        ) if settings.dedup_enabled else None
+        # 各识别级别支持的语言（首次查询后缓存）
+        self.supported_languages: Optional[Dict[str, List[str]]] = None
+        # 预热状态：pending / warming / ready / failed
+        self.warmup_state: Dict[str, Any] = {'status': 'pending'}
         
         # 性能统计
         self.stats = {
@@ -31,122 +95,167 @@ class OCRService:
             'successful_requests': 0,
             'failed_requests': 0,
             'total_processing_time': 0.0,
-            'average_processing_time': 0.0
+            'average_processing_time': 0.0,
+            'total_pages': 0,
+            'failed_pages': 0,
+            'cascade_boxes': 0,
+            'cascade_escalated': 0,
+            'total_frames': 0,
+            'frame_tiles': 0,
+            'frame_tiles_changed': 0
         }
-        
-        self.logger.info(f"OCR 服务已初始化，使用 {settings.workers} 个工作线程")
+
+    def start(self):
+        """创建线程池和整机槽位（重复调用无效）"""
+        if self.executor is not None:
+            return
+        self.executor = ThreadPoolExecutor(max_workers=self.executor_size)
+        self.host_slots = HostConcurrency(
+            directory=settings.get_host_lock_dir(),
+            slots=settings.get_host_max_concurrency()
+        )
+        self.logger.info(f"OCR 服务已初始化，使用 {self.executor_size} 个工作线程")
     
-    def _base64_to_image(self, base64_string: str) -> Image.Image:
-        """将 Base64 字符串转换为 PIL 图像"""
+    def _decode_base64(self, base64_string: str, max_size: int) -> bytes:
+        """将 Base64 字符串解码为原始字节，并检查大小"""
+        # 验证 base64 字符串格式
+        if not base64_string:
+            raise ValueError("base64 字符串不能为空")
+
+        # 移除可能的 data URL 前缀
+        if base64_string.startswith('data:'):
+            base64_string = base64_string.split(',', 1)[1]
+
+        # 添加缺失的填充
+        missing_padding = len(base64_string) % 4
+        if missing_padding:
+            base64_string += '=' * (4 - missing_padding)
+
+        self.logger.debug("处理 base64 字符串，长度: %d", len(base64_string))
+
+        # 解码 base64
         try:
-            # 验证 base64 字符串格式
-            if not base64_string:
-                raise ValueError("base64 字符串不能为空")
-            
-            # 移除可能的 data URL 前缀
-            if base64_string.startswith('data:image/'):
-                base64_string = base64_string.split(',', 1)[1]
-            
-            # 添加缺失的填充
-            missing_padding = len(base64_string) % 4
-            if missing_padding:
-                base64_string += '=' * (4 - missing_padding)
-            
-            self.logger.debug(f"处理 base64 字符串，长度: {len(base64_string)}")
-            
-            # 解码 base64
-            try:
-                image_data = base64.b64decode(base64_string, validate=True)
-            except Exception as e:
-                raise ValueError(f"base64 解码失败: {str(e)}")
-            
-            # 检查图像数据大小
-            if len(image_data) < 100:  # 最小图像大小检查
-                raise ValueError(f"图像数据太小，可能损坏 ({len(image_data)} bytes)")
-            
-            if len(image_data) > settings.max_image_size:
-                raise ValueError(f"图像大小超过限制 ({settings.max_image_size} bytes)")
-            
-            self.logger.debug(f"图像数据解码成功，大小: {len(image_data)} bytes")
-            
-            # 创建 PIL 图像
-            image_stream = io.BytesIO(image_data)
-            
-            try:
-                # 尝试打开图像
-                image = Image.open(image_stream)
-                
-                # 验证图像完整性
-                image.verify()
-                
-                # 重新打开图像（verify 会关闭图像）
-                image_stream.seek(0)
-                image = Image.open(image_stream)
-                
-                # 确保图像完全加载
-                image.load()
-                
-            except Exception as e:
-                raise ValueError(f"图像文件格式无效或损坏: {str(e)}")
-            
-            # 检查图像尺寸
-            if image.size[0] < 10 or image.size[1] < 10:
-                raise ValueError(f"图像尺寸太小: {image.size}")
-            
-            if image.size[0] > settings.max_image_width or image.size[1] > settings.max_image_height:
-                raise ValueError(f"图像尺寸太大: {image.size}，最大支持: {settings.max_image_width}x{settings.max_image_height}")
-            
-            # 转换为 RGB 模式（如果需要）
-            if image.mode not in ['RGB', 'RGBA']:
-                self.logger.debug(f"转换图像模式从 {image.mode} 到 RGB")
-                image = image.convert('RGB')
-            elif image.mode == 'RGBA':
-                # 处理透明背景
-                rgb_image = Image.new('RGB', image.size, (255, 255, 255))
-                rgb_image.paste(image, mask=image.split()[3])
-                image = rgb_image
-            
-            self.logger.debug(f"图像转换成功，尺寸: {image.size}，模式: {image.mode}")
-            return image
-            
+            data = base64.b64decode(base64_string, validate=True)
+        except Exception as e:
+            raise ValueError(f"base64 解码失败: {str(e)}")
+
+        # 检查数据大小
+        if len(data) < 100:  # 最小图像大小检查
+            raise ValueError(f"图像数据太小，可能损坏 ({len(data)} bytes)")
+
+        if len(data) > max_size:
+            raise ValueError(f"图像大小超过限制 ({max_size} bytes)")
+
+        self.logger.debug("图像数据解码成功，大小: %d bytes", len(data))
+        return data
+
+    def _open_image(self, image_data) -> Image.Image:
+        """
+        从字节数据（或 mmap 等可寻址的只读缓冲区）打开 PIL 图像并验证完整性
+
+        返回的图像只解析了文件头（尺寸、模式），像素在 _finish_load 时才解码。
+        """
+        image_stream = io.BytesIO(image_data) if isinstance(image_data, bytes) else image_data
+
+        try:
+            # 尝试打开图像（只接受 IMAGE_FORMATS 中的格式）
+            image = open_image(image_stream)
+
+            # 验证图像完整性
+            image.verify()
+
+            # 重新打开图像（verify 会关闭图像）
+            image_stream.seek(0)
+            image = open_image(image_stream)
+
+        except Exception as e:
+            raise ValueError(f"图像文件格式无效或损坏: {str(e)}")
+
+        return image
+
+    def _finish_load(self, image: Image.Image) -> Image.Image:
+        """完整解码 _open_image 打开的图像"""
+        try:
+            # 确保图像完全加载
+            image.load()
+        except Exception as e:
+            raise ValueError(f"图像文件格式无效或损坏: {str(e)}")
+        return image
+
+    def _load_image(self, image_data) -> Image.Image:
+        """从字节数据（或 mmap 等可寻址的只读缓冲区）打开并完整加载 PIL 图像"""
+        return self._finish_load(self._open_image(image_data))
+
+    def _check_image_size(self, size: Tuple[int, int]):
+        """检查图像尺寸是否在允许范围内"""
+        if size[0] < 10 or size[1] < 10:
+            raise ValueError(f"图像尺寸太小: {size}")
+
+        if size[0] > settings.max_image_width or size[1] > settings.max_image_height:
+            raise ValueError(f"图像尺寸太大: {size}，最大支持: {settings.max_image_width}x{settings.max_image_height}")
+
+    def _prepare_image(self, image: Image.Image) -> Image.Image:
+        """检查图像尺寸并转换为 RGB 模式"""
+        # 检查图像尺寸
+        self._check_image_size(image.size)
+
+        # 转换为 RGB 模式（如果需要）
+        if image.mode not in ['RGB', 'RGBA']:
+            self.logger.debug("转换图像模式从 %s 到 RGB", image.mode)
+            image = image.convert('RGB')
+        elif image.mode == 'RGBA':
+            # 处理透明背景
+            rgb_image = Image.new('RGB', image.size, (255, 255, 255))
+            rgb_image.paste(image, mask=image.split()[3])
+            image = rgb_image
+
+        self.logger.debug("图像转换成功，尺寸: %s，模式: %s", image.size, image.mode)
+        return image
+
+    def _decode_image(self, image: Image.Image) -> Image.Image:
+        """完整解码 _open_image 打开的图像，检查尺寸并转换为 RGB"""
+        try:
+            return self._prepare_image(self._finish_load(image))
+
         except ValueError:
             # 重新抛出已知的 ValueError
             raise
         except Exception as e:
             self.logger.error(f"图像转换失败: {str(e)}")
             raise ValueError(f"图像转换失败: {str(e)}")
-    
+
+    def _resolve_local_path(self, file_path: str, root: Optional[str] = None) -> str:
+        """解析本地文件路径，确保位于允许的根目录下"""
+        root = root or settings.local_input_root
+        if not root:
+            raise ValueError("未启用本地文件输入，请配置 LOCAL_INPUT_ROOT")
+
+        root = os.path.realpath(root)
+        # realpath 会解析符号链接，防止通过 .. 或链接逃逸出根目录
+        path = os.path.realpath(os.path.join(root, file_path))
+        if os.path.commonpath([root, path]) != root:
+            raise ValueError(f"文件不在允许的目录下: {file_path}")
+        if not os.path.isfile(path):
+            raise ValueError(f"文件不存在: {file_path}")
+        return path
+
+    def _map_local_file(self, path: str) -> mmap.mmap:
+        """以只读内存映射打开本地图像文件，检查与 Base64 输入相同（在线程池中执行）"""
+        size = os.path.getsize(path)
+        if size < 100:
+            raise ValueError(f"图像数据太小，可能损坏 ({size} bytes)")
+        if size > settings.max_image_size:
+            raise ValueError(f"图像大小超过限制 ({settings.max_image_size} bytes)")
+
+        # mmap 持有自己的文件描述符，关闭文件后映射仍然有效
+        with open(path, 'rb') as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
     def _convert_result_format(self, 
                               ocr_results: List[Tuple[str, float, List[float]]], 
-                              image_size: Tuple[int, int]) -> List[OCRResult]:
-        """将 ocrmac 结果转换为 API 格式"""
-        results = []
-        
-        for text, confidence, bbox in ocr_results:
-            # 将相对坐标转换为像素坐标
-            x, y, w, h = bbox
-            x1, y1, x2, y2 = convert_coordinates_pil(
-                (x, y, w, h), 
-                image_size[0], 
-                image_size[1]
-            )
-            
-            # 创建边界框坐标 (左上，右上，右下，左下)
-            dt_boxes = [
-                [x1, y1],  # 左上
-                [x2, y1],  # 右上
-                [x2, y2],  # 右下
-                [x1, y2]   # 左下
-            ]
-            
-            result = OCRResult(
-                dt_boxes=dt_boxes,
-                rec_txt=text,
-                score=confidence
-            )
-            results.append(result)
-        
-        return results
+                              image_size: Tuple[int, int]) -> OCRResultSet:
+        """将 ocrmac 结果转换为数组形式的结果容器（坐标换算向量化）"""
+        return OCRResultSet.from_ocrmac(ocr_results, image_size)
     
     def _perform_ocr(self, 
                      image: Image.Image, 
@@ -156,6 +265,9 @@ class OCRService:
                      framework: str) -> List[Tuple[str, float, List[float]]]:
         """执行 OCR 识别（同步）"""
         try:
+            # ocrmac 和 Vision 框架绑定在首次识别（通常是预热）时才导入，不计入进程启动时间
+            from ocrmac.ocrmac import text_from_image, livetext_from_image
+
             if framework == "livetext":
                 # 使用 livetext 框架
                 results = livetext_from_image(
@@ -175,7 +287,7 @@ class OCRService:
                     detail=True
                 )
             
-            self.logger.debug(f"OCR 识别完成，找到 {len(results)} 个文本")
+            self.logger.debug("OCR 识别完成，找到 %d 个文本", len(results))
             return results
             
         except Exception as e:
@@ -187,7 +299,9 @@ class OCRService:
                           recognition_level: Optional[str] = None,
                           language_preference: Optional[List[str]] = None,
                           confidence_threshold: Optional[float] = None,
-                          framework: Optional[str] = None) -> Dict[str, Any]:
+                          framework: Optional[str] = None,
+                          regions: Optional[List[RegionOfInterest]] = None,
+                          with_content_hash: bool = False) -> Dict[str, Any]:
         """
         异步处理图像 OCR
         
@@ -197,40 +311,107 @@ class OCRService:
             language_preference: 语言偏好
             confidence_threshold: 置信度阈值
             framework: 使用的框架
+            regions: 感兴趣区域，指定时只识别这些区域
+            with_content_hash: 是否计算图像内容的 SHA-256（结果需要保存到结果存储时）
             
         Returns:
             包含 OCR 结果的字典
         """
+        return await self._process(
+            lambda: self._decode_base64(image_base64, settings.max_image_size),
+            False,
+            recognition_level,
+            language_preference,
+            confidence_threshold,
+            framework,
+            regions,
+            with_content_hash
+        )
+
+    async def process_file(self,
+                           file_path: str,
+                           recognition_level: Optional[str] = None,
+                           language_preference: Optional[List[str]] = None,
+                           confidence_threshold: Optional[float] = None,
+                           framework: Optional[str] = None,
+                           root: Optional[str] = None,
+                           regions: Optional[List[RegionOfInterest]] = None,
+                           with_content_hash: bool = False) -> Dict[str, Any]:
+        """
+        异步处理本地文件 OCR
+
+        文件必须位于允许的根目录下，通过内存映射读取，不经过 HTTP 传输和 Base64 编码。
+
+        Args:
+            file_path: 文件路径（绝对路径或相对于根目录的路径）
+            root: 允许的根目录，默认为 settings.local_input_root
+            regions: 感兴趣区域，指定时只识别这些区域
+            with_content_hash: 是否计算图像内容的 SHA-256（结果需要保存到结果存储时）
+
+        Returns:
+            包含 OCR 结果的字典
+        """
+        return await self._process(
+            lambda: self._map_local_file(self._resolve_local_path(file_path, root)),
+            True,
+            recognition_level,
+            language_preference,
+            confidence_threshold,
+            framework,
+            regions,
+            with_content_hash
+        )
+
+    async def _process(self,
+                       load_source: Callable[[], Any],
+                       load_in_executor: bool,
+                       recognition_level: Optional[str],
+                       language_preference: Optional[List[str]],
+                       confidence_threshold: Optional[float],
+                       framework: Optional[str],
+                       regions: Optional[List[RegionOfInterest]] = None,
+                       with_content_hash: bool = False) -> Dict[str, Any]:
+        """
+        读取图像数据，按像素内存预算准入后解码并执行 OCR，记录统计信息
+
+        Args:
+            load_source: 返回图像数据（bytes 或 mmap）的函数
+            load_in_executor: 读取和解码是否涉及磁盘 IO，需要放到线程池中
+            with_content_hash: 是否计算图像内容的 SHA-256，结果中的 image_hash 否则为 None
+        """
         start_time = time.time()
+        source = None
         
         try:
             # 更新统计信息
             self.stats['total_requests'] += 1
             
-            # 使用默认值
-            recognition_level = recognition_level or settings.recognition_level
-            confidence_threshold = confidence_threshold or settings.confidence_threshold
-            framework = framework or settings.framework
-            language_preference = language_preference or settings.get_language_preference_list()
-            
-            # 转换图像
-            image = self._base64_to_image(image_base64)
-            image_size = image.size
-            
-            # 在线程池中执行 OCR
-            loop = asyncio.get_event_loop()
-            ocr_results = await loop.run_in_executor(
-                self.executor,
-                self._perform_ocr,
-                image,
-                recognition_level,
-                language_preference,
-                confidence_threshold,
-                framework
-            )
-            
-            # 转换结果格式
-            results = self._convert_result_format(ocr_results, image_size)
+            # 读取图像数据并解析文件头（涉及磁盘 IO 时放到线程池中）
+            with stage('load'):
+                if load_in_executor:
+                    source = await self._run_in_executor(load_source)
+                    image = await self._run_in_executor(self._open_image, source)
+                else:
+                    source = load_source()
+                    image = self._open_image(source)
+            self._check_image_size(image.size)
+
+            # 结果存储按图像内容哈希保存结果（hashlib 计算时释放 GIL）
+            image_hash = None
+            if with_content_hash:
+                with stage('hash'):
+                    image_hash = await self._run_in_executor(_content_hash, source)
+
+            # 完整解码前按像素字节数预留内存预算，直到识别完成
+            async with self.pixel_budget.reserve(estimate_pixel_bytes(image.size, image.mode)):
+                with stage('decode'):
+                    if load_in_executor:
+                        image = await self._run_in_executor(self._decode_image, image)
+                    else:
+                        image = self._decode_image(image)
+                result = await self._recognize_image(
+                    image, recognition_level, language_preference, confidence_threshold, framework, regions
+                )
             
             # 计算处理时间
             processing_time = time.time() - start_time
@@ -242,14 +423,11 @@ class OCRService:
                 self.stats['total_processing_time'] / self.stats['total_requests']
             )
             
-            self.logger.info(f"OCR 处理完成，耗时: {processing_time:.3f}s，文本数: {len(results)}")
+            self.logger.info("OCR 处理完成，耗时: %.3fs，文本数: %d", processing_time, result['total_texts'])
             
-            return {
-                'results': results,
-                'processing_time': processing_time,
-                'image_size': image_size,
-                'total_texts': len(results)
-            }
+            result['processing_time'] = processing_time
+            result['image_hash'] = image_hash
+            return result
             
         except Exception as e:
             # 更新统计信息
@@ -257,7 +435,792 @@ class OCRService:
             
             self.logger.error(f"OCR 处理失败: {str(e)}")
             raise
-    
+        finally:
+            if isinstance(source, mmap.mmap):
+                source.close()
+
+    async def _recognize_image(self,
+                               image: Image.Image,
+                               recognition_level: Optional[str],
+                               language_preference: Optional[List[str]],
+                               confidence_threshold: Optional[float],
+                               framework: Optional[str],
+                               regions: Optional[List[RegionOfInterest]]) -> Dict[str, Any]:
+        """对已解码的图像应用降级、近似重复复用或区域识别，返回结果字典（不含处理时间）"""
+        # 负载过高时的降级措施（只降级未指定识别级别的请求）
+        active = self.load_controller.active_degradations()
+        degradations = []
+        if self._degrade_fast(active, recognition_level):
+            degradations.append(DEGRADE_FAST)
+
+        # 使用默认值
+        recognition_level = "fast" if degradations else (recognition_level or settings.recognition_level)
+        confidence_threshold = confidence_threshold or settings.confidence_threshold
+        framework = framework or settings.framework
+        language_preference = language_preference or settings.get_language_preference_list()
+        
+        image_size = image.size
+        near_duplicate_distance = None
+        
+        if regions:
+            # 只识别感兴趣区域
+            results, cascade = await self._recognize_regions(
+                image, regions, recognition_level, language_preference, confidence_threshold, framework
+            )
+        else:
+            # 近似重复的图像（重新扫描、重新压缩）直接复用之前的识别结果
+            image_hash = None
+            if self.dedup_index is not None:
+                image_hash = await self._run_in_executor(dhash, image, settings.dedup_hash_size)
+                dedup_params = (
+                    recognition_level, tuple(language_preference or ()), confidence_threshold, framework
+                )
+                reused = self.dedup_index.lookup(image_hash, image_size, dedup_params)
+                if reused is not None:
+                    results, near_duplicate_distance = reused
+                    cascade = None
+
+            if near_duplicate_distance is None:
+                scale = self._degrade_scale(active, image_size)
+                if scale < 1.0:
+                    degradations.append(DEGRADE_DOWNSCALE)
+
+                # 在线程池中执行 OCR 并转换结果格式
+                results, cascade = await self._run_ocr_task(
+                    self._recognize_scaled,
+                    image,
+                    scale,
+                    recognition_level,
+                    language_preference,
+                    confidence_threshold,
+                    framework
+                )
+
+                # 缩小图像识别的结果质量较低，不加入索引
+                if image_hash is not None and scale == 1.0:
+                    self.dedup_index.add(image_hash, image_size, dedup_params, results)
+        cascade = self._record_cascade(cascade, image_size)
+        self.load_controller.record_applied(degradations)
+        
+        return {
+            'results': results,
+            'image_size': image_size,
+            'total_texts': len(results),
+            'cascade': cascade,
+            'degradations': degradations,
+            'near_duplicate_distance': near_duplicate_distance
+        }
+
+    @staticmethod
+    def _degrade_fast(active: List[str], recognition_level: Optional[str]) -> bool:
+        """是否改用 fast 识别（只降级未指定识别级别的请求）"""
+        return DEGRADE_FAST in active and recognition_level is None and settings.recognition_level != "fast"
+
+    @staticmethod
+    def _degrade_scale(active: List[str], image_size: Tuple[int, int]) -> float:
+        """缩小大图识别的比例，不缩小时为 1.0"""
+        if DEGRADE_DOWNSCALE in active and max(image_size) > settings.degradation_max_side:
+            return settings.degradation_max_side / max(image_size)
+        return 1.0
+
+    def _run_in_executor(self, func: Callable, *args) -> asyncio.Future:
+        """
+        在线程池中执行 func
+
+        func 在当前请求的上下文副本中执行，工作线程中的日志带有请求 ID；
+        当前请求开启了性能分析时，执行期间该线程参与采样。
+        """
+        loop = asyncio.get_event_loop()
+        context = contextvars.copy_context()
+        profile = current_profile.get()
+        if profile is not None:
+            return loop.run_in_executor(self.executor, context.run, profile.run, func, *args)
+        return loop.run_in_executor(self.executor, context.run, func, *args)
+
+    async def _run_ocr_task(self, func: Callable, *args):
+        """
+        在线程池中执行识别任务，并把排队时间和执行时间提供给降级控制器
+
+        任务先按所属租户加权公平排队，再获取本进程的自适应并发许可，
+        最后在工作线程中占用一个整机槽位后执行，整机的识别并发不超过 host_max_concurrency。
+        """
+        submitted = time.monotonic()
+
+        def task():
+            # 排队时间包括等待整机槽位的时间
+            with self.host_slots.slot():
+                started = time.monotonic()
+                return started, func(*args)
+
+        tenant = get_current_tenant()
+        self.ocr_inflight += 1
+        latency = None
+        try:
+            await self.scheduler.acquire(tenant)
+            try:
+                await self.concurrency_limiter.acquire()
+                try:
+                    started, result = await self._run_in_executor(task)
+                    latency = time.monotonic() - started
+                finally:
+                    self.concurrency_limiter.release(latency)
+            finally:
+                self.scheduler.release(tenant)
+        finally:
+            self.ocr_inflight -= 1
+        self.load_controller.observe(started - submitted, latency)
+        record_stage('queue', started - submitted)
+        record_stage('recognize', latency)
+        tenant.ocr_tasks += 1
+        tenant.total_queue_wait += started - submitted
+        tenant.total_ocr_time += latency
+        return result
+
+    def _recognize_scaled(self,
+                          image: Image.Image,
+                          scale: float,
+                          recognition_level: str,
+                          language_preference: Optional[List[str]],
+                          confidence_threshold: float,
+                          framework: str) -> Tuple[OCRResultSet, Optional[Dict[str, Any]]]:
+        """按比例缩小图像后识别，坐标换算回原图（在线程池中执行）"""
+        if scale >= 1.0:
+            return self._recognize(image, recognition_level, language_preference, confidence_threshold, framework)
+
+        width, height = image.size
+        scaled = image.resize((max(1, round(width * scale)), max(1, round(height * scale))), Image.BILINEAR)
+        results, cascade = self._recognize(
+            scaled, recognition_level, language_preference, confidence_threshold, framework
+        )
+        scale_x, scale_y = width / scaled.size[0], height / scaled.size[1]
+        results.boxes *= (scale_x, scale_y, scale_x, scale_y)
+        if cascade is not None:
+            cascade['escalated_pixels'] = int(cascade['escalated_pixels'] * scale_x * scale_y)
+        return results, cascade
+
+    def _region_box(self,
+                    region_id: str,
+                    region: RegionOfInterest,
+                    image_size: Tuple[int, int]) -> Tuple[int, int, int, int]:
+        """将区域换算为原图中的像素裁剪框 (left, top, right, bottom)，超出图像的部分被裁掉"""
+        width, height = image_size
+        if region.unit == "relative":
+            if region.x + region.width > 1 or region.y + region.height > 1:
+                raise ValueError(f"区域 {region_id} 的相对坐标超出图像范围")
+            x, y = region.x * width, region.y * height
+            w, h = region.width * width, region.height * height
+        else:
+            x, y, w, h = region.x, region.y, region.width, region.height
+
+        left, top = int(round(x)), int(round(y))
+        right, bottom = min(width, int(round(x + w))), min(height, int(round(y + h)))
+        if right - left < 1 or bottom - top < 1:
+            raise ValueError(f"区域 {region_id} 不在图像范围内: ({x:.0f}, {y:.0f}, {w:.0f}, {h:.0f})，图像尺寸: {image_size}")
+        return left, top, right, bottom
+
+    def _recognize_crop(self,
+                        image: Image.Image,
+                        box: Tuple[int, int, int, int],
+                        recognition_level: str,
+                        language_preference: Optional[List[str]],
+                        confidence_threshold: float,
+                        framework: str) -> Tuple[OCRResultSet, Optional[Dict[str, Any]]]:
+        """裁剪并识别一个区域（在线程池中执行）"""
+        return self._recognize(
+            image.crop(box), recognition_level, language_preference, confidence_threshold, framework
+        )
+
+    async def _recognize_regions(self,
+                                 image: Image.Image,
+                                 regions: List[RegionOfInterest],
+                                 recognition_level: str,
+                                 language_preference: Optional[List[str]],
+                                 confidence_threshold: float,
+                                 framework: str) -> Tuple[OCRResultSet, Optional[Dict[str, Any]]]:
+        """在线程池中并行识别各区域，并把坐标映射回原图；cascade 统计为各区域之和"""
+        if len(regions) > settings.max_regions:
+            raise ValueError(f"区域数量超过限制: {len(regions)}，最大支持: {settings.max_regions}")
+
+        region_ids = [region.id or str(index) for index, region in enumerate(regions)]
+        boxes = [self._region_box(region_id, region, image.size) for region_id, region in zip(region_ids, regions)]
+
+        region_results = await asyncio.gather(*(
+            self._run_ocr_task(
+                self._recognize_crop,
+                image,
+                box,
+                recognition_level,
+                language_preference,
+                confidence_threshold,
+                framework
+            )
+            for box in boxes
+        ))
+
+        cascade = None
+        if recognition_level == "cascade" and framework != "livetext":
+            cascade = {
+                key: sum(region_cascade[key] for _, region_cascade in region_results)
+                for key in ('boxes', 'escalated', 'escalated_pixels')
+            }
+
+        results = OCRResultSet.concat_regions([
+            (region_id, region_result, (box[0], box[1]))
+            for region_id, (region_result, _), box in zip(region_ids, region_results, boxes)
+        ])
+        return results, cascade
+
+    def _record_cascade(self,
+                        cascade: Optional[Dict[str, Any]],
+                        image_size: Tuple[int, int]) -> Optional[Dict[str, Any]]:
+        """累计 cascade 统计，并换算出重识别面积占整张图像的比例"""
+        if cascade is None:
+            return None
+        self.stats['cascade_boxes'] += cascade['boxes']
+        self.stats['cascade_escalated'] += cascade['escalated']
+        width, height = image_size
+        return {
+            'boxes': cascade['boxes'],
+            'escalated': cascade['escalated'],
+            'escalated_area': round(min(1.0, cascade['escalated_pixels'] / (width * height)), 4)
+        }
+
+    def _open_frame(self, data: bytes) -> Image.Image:
+        """打开一帧图像并做与单张图像相同的检查，只解析文件头（在线程池中执行）"""
+        if len(data) < 100:
+            raise ValueError(f"图像数据太小，可能损坏 ({len(data)} bytes)")
+        if len(data) > settings.max_image_size:
+            raise ValueError(f"图像大小超过限制 ({settings.max_image_size} bytes)")
+        image = self._open_image(data)
+        self._check_image_size(image.size)
+        return image
+
+    async def process_frame(self,
+                            session: FrameSession,
+                            data: bytes,
+                            recognition_level: Optional[str] = None,
+                            language_preference: Optional[List[str]] = None,
+                            confidence_threshold: Optional[float] = None,
+                            framework: Optional[str] = None) -> Dict[str, Any]:
+        """
+        增量识别帧流中的一帧
+
+        与会话中的上一帧逐块比较，只重新识别变化的区域（并行），其余部分沿用缓存结果。
+        首帧、尺寸变化或变化过多时识别整帧。同一会话的帧需要依次调用。
+        负载过高时与单张图像相同地降级（未指定识别级别时改用 fast，整帧识别时缩小大图）；
+        降级结束后的第一帧识别整帧，替换缓存中降级识别的结果。
+
+        Args:
+            session: 帧流会话
+            data: 原始图像字节（PNG、JPEG 等）
+
+        Returns:
+            包含 results（整帧结果）、image_size、changed_tiles、total_tiles、
+            recognized_regions、full_frame、degradations、processing_time 的字典
+        """
+        start_time = time.time()
+
+        # 负载过高时的降级措施
+        active = self.load_controller.active_degradations()
+        degradations = []
+        if self._degrade_fast(active, recognition_level):
+            degradations.append(DEGRADE_FAST)
+
+        # 使用默认值
+        recognition_level = "fast" if degradations else (recognition_level or settings.recognition_level)
+        confidence_threshold = confidence_threshold or settings.confidence_threshold
+        framework = framework or settings.framework
+        language_preference = language_preference or settings.get_language_preference_list()
+
+        image = await self._run_in_executor(self._open_frame, data)
+
+        async with self.pixel_budget.reserve(estimate_pixel_bytes(image.size, image.mode)):
+            image = await self._run_in_executor(self._decode_image, image)
+            rects, changed_tiles, total_tiles, tile_hashes = await self._run_in_executor(session.diff, image)
+            if session.degraded and not degradations:
+                rects = None
+
+            try:
+                if rects is None:
+                    scale = self._degrade_scale(active, image.size)
+                    if scale < 1.0:
+                        degradations.append(DEGRADE_DOWNSCALE)
+                    results, _ = await self._run_ocr_task(
+                        self._recognize_scaled,
+                        image,
+                        scale,
+                        recognition_level,
+                        language_preference,
+                        confidence_threshold,
+                        framework
+                    )
+                    parts = [results]
+                else:
+                    region_results = await asyncio.gather(*(
+                        self._run_ocr_task(
+                            self._recognize_crop,
+                            image,
+                            rect,
+                            recognition_level,
+                            language_preference,
+                            confidence_threshold,
+                            framework
+                        )
+                        for rect in rects
+                    ))
+                    parts = []
+                    for (left, top, _, _), (results, _) in zip(rects, region_results):
+                        results.boxes += (left, top, left, top)
+                        parts.append(results)
+            except BaseException:
+                # 缓存可能已与画面不一致（部分区域失败），下一帧重新识别整帧
+                session.reset()
+                raise
+
+            results = session.merge(rects, parts, tile_hashes, image.size)
+            session.degraded = bool(degradations)
+
+        self.load_controller.record_applied(degradations)
+
+        self.stats['total_frames'] += 1
+        self.stats['frame_tiles'] += total_tiles
+        self.stats['frame_tiles_changed'] += changed_tiles
+
+        return {
+            'results': results,
+            'image_size': image.size,
+            'changed_tiles': changed_tiles,
+            'total_tiles': total_tiles,
+            'recognized_regions': 1 if rects is None else len(rects),
+            'full_frame': rects is None,
+            'degradations': degradations,
+            'processing_time': time.time() - start_time
+        }
+
+    def _load_document_page(self, reader: DocumentReader, index: int) -> Image.Image:
+        """解码文档的一页并做与单张图像相同的检查（在线程池中执行）"""
+        return self._prepare_image(reader.load_page(index))
+
+    def _recognize(self,
+                   image: Image.Image,
+                   recognition_level: str,
+                   language_preference: Optional[List[str]],
+                   confidence_threshold: float,
+                   framework: str) -> Tuple[OCRResultSet, Optional[Dict[str, Any]]]:
+        """
+        识别单张图像并转换结果格式（在线程池中执行）
+
+        Returns:
+            (结果, cascade 统计)；非 cascade 模式时统计为 None
+        """
+        if recognition_level == "cascade" and framework != "livetext":
+            return self._recognize_cascade(image, language_preference, confidence_threshold, framework)
+
+        ocr_results = self._perform_ocr(
+            image, recognition_level, language_preference, confidence_threshold, framework
+        )
+        return self._convert_result_format(ocr_results, image.size), None
+
+    def _recognize_cascade(self,
+                           image: Image.Image,
+                           language_preference: Optional[List[str]],
+                           confidence_threshold: float,
+                           framework: str) -> Tuple[OCRResultSet, Dict[str, Any]]:
+        """
+        fast → accurate 级联识别（在线程池中执行）
+
+        先用 fast 识别整张图像，置信度低于 cascade_confidence_threshold 的文本框
+        外扩后裁剪出来用 accurate 重新识别，并在原位置替换。重识别结果只保留中心点
+        落在原文本框内的部分，避免把外扩进来的相邻行重复加入；accurate 没有识别出
+        任何内容时保留 fast 结果。最后再按请求的置信度阈值过滤。
+        """
+        # fast 阶段不过滤，低置信度的框正是需要重识别的部分
+        fast = self._convert_result_format(
+            self._perform_ocr(image, "fast", language_preference, 0.0, framework), image.size
+        )
+        escalate = fast.scores < settings.cascade_confidence_threshold
+        stats = {'boxes': len(fast), 'escalated': int(escalate.sum()), 'escalated_pixels': 0}
+
+        if stats['escalated']:
+            width, height = image.size
+            texts: List[str] = []
+            scores = []
+            boxes = []
+            for i, (x1, y1, x2, y2) in enumerate(fast.boxes.tolist()):
+                if not escalate[i]:
+                    texts.append(fast.texts[i])
+                    scores.append(fast.scores[i:i + 1])
+                    boxes.append(fast.boxes[i:i + 1])
+                    continue
+
+                pad = (y2 - y1) * settings.cascade_padding
+                left, top = max(0, int(x1 - pad)), max(0, int(y1 - pad))
+                right, bottom = min(width, int(x2 + pad) + 1), min(height, int(y2 + pad) + 1)
+                stats['escalated_pixels'] += (right - left) * (bottom - top)
+
+                keep = None
+                # 太小的裁剪框 Vision 无法识别，直接保留 fast 结果
+                if right - left >= 4 and bottom - top >= 4:
+                    accurate = self._convert_result_format(
+                        self._perform_ocr(
+                            image.crop((left, top, right, bottom)), "accurate", language_preference, 0.0, framework
+                        ),
+                        (right - left, bottom - top)
+                    )
+                    accurate.boxes += (left, top, left, top)
+                    center_x = (accurate.boxes[:, 0] + accurate.boxes[:, 2]) / 2
+                    center_y = (accurate.boxes[:, 1] + accurate.boxes[:, 3]) / 2
+                    keep = (center_x >= x1) & (center_x <= x2) & (center_y >= y1) & (center_y <= y2)
+
+                if keep is not None and keep.any():
+                    texts.extend(text for text, k in zip(accurate.texts, keep) if k)
+                    scores.append(accurate.scores[keep])
+                    boxes.append(accurate.boxes[keep])
+                else:
+                    texts.append(fast.texts[i])
+                    scores.append(fast.scores[i:i + 1])
+                    boxes.append(fast.boxes[i:i + 1])
+
+            fast = OCRResultSet(texts, np.concatenate(scores), np.concatenate(boxes))
+
+        if confidence_threshold > 0:
+            keep = fast.scores >= confidence_threshold
+            fast = OCRResultSet(
+                [text for text, k in zip(fast.texts, keep) if k], fast.scores[keep], fast.boxes[keep]
+            )
+        return fast, stats
+
+    async def iter_document(self,
+                            document_base64: str,
+                            recognition_level: Optional[str] = None,
+                            language_preference: Optional[List[str]] = None,
+                            confidence_threshold: Optional[float] = None,
+                            framework: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        异步处理多页文档（多页 TIFF 或 PDF），按完成顺序逐页产出结果
+
+        页面按需解码，同时驻留内存的页数不超过工作线程数；各页在线程池中并行识别。
+        单页失败不会中断整个文档，失败页的 error 字段包含错误信息。
+
+        Yields:
+            每页的结果字典，包含 page_index、results、image_size、processing_time、cascade、degradations、error
+        """
+        start_time = time.time()
+        self.stats['total_requests'] += 1
+
+        try:
+            data = self._decode_base64(document_base64, settings.max_document_size)
+            reader = DocumentReader(data, pdf_dpi=settings.pdf_render_dpi)
+            if reader.page_count > settings.max_document_pages:
+                raise ValueError(
+                    f"文档页数超过限制: {reader.page_count}，最大支持: {settings.max_document_pages}"
+                )
+        except Exception as e:
+            self.stats['failed_requests'] += 1
+            self.logger.error(f"文档处理失败: {str(e)}")
+            raise
+
+        async for page in self._iter_pages(
+            reader, start_time, recognition_level, language_preference, confidence_threshold, framework
+        ):
+            yield page
+
+    async def iter_batch(self,
+                         images_base64: List[str],
+                         recognition_level: Optional[str] = None,
+                         language_preference: Optional[List[str]] = None,
+                         confidence_threshold: Optional[float] = None,
+                         framework: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        异步处理一批图像，按完成顺序逐张产出结果
+
+        每张图像视为一页，page_index 为其在请求中的下标，其余行为与 iter_document 相同。
+        """
+        start_time = time.time()
+        self.stats['total_requests'] += 1
+
+        if not images_base64 or len(images_base64) > settings.max_batch_images:
+            self.stats['failed_requests'] += 1
+            raise ValueError(f"图像数量必须在 1 到 {settings.max_batch_images} 之间")
+
+        reader = _Base64BatchReader(self, images_base64)
+        async for page in self._iter_pages(
+            reader, start_time, recognition_level, language_preference, confidence_threshold, framework
+        ):
+            yield page
+
+    async def _iter_pages(self,
+                          reader,
+                          start_time: float,
+                          recognition_level: Optional[str],
+                          language_preference: Optional[List[str]],
+                          confidence_threshold: Optional[float],
+                          framework: Optional[str]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        逐页解码并并行识别，按完成顺序产出结果
+
+        每页开始识别时按当时的负载与单张图像相同地降级（未指定识别级别时改用 fast、缩小大图），
+        应用的措施记录在该页的 degradations 中。
+        """
+        # 未指定识别级别的页面在负载过高时可以降级为 fast
+        pinned_level = recognition_level
+
+        # 使用默认值
+        recognition_level = recognition_level or settings.recognition_level
+        confidence_threshold = confidence_threshold or settings.confidence_threshold
+        framework = framework or settings.framework
+        language_preference = language_preference or settings.get_language_preference_list()
+
+        self.logger.info("开始处理 %s，共 %d 页", reader.kind, reader.page_count)
+
+        queue: asyncio.Queue = asyncio.Queue()
+        # 限制同时处理（已解码或等待解码）的页数
+        slots = asyncio.Semaphore(self.executor_size)
+        page_tasks = set()
+
+        # 读取器不是线程安全的，各页依次解码（Lock 按先来先得的顺序唤醒）
+        decode_lock = asyncio.Lock()
+
+        async def run_page(index: int, page_start: float):
+            reserved = None
+            try:
+                # 解码前按页面头信息预留像素内存（读取器不是线程安全的，估计和解码都在锁内）
+                async with decode_lock:
+                    nbytes = await self._run_in_executor(reader.page_pixel_bytes, index)
+                    await self.pixel_budget.acquire(nbytes)
+                    reserved = nbytes
+                    image = await self._run_in_executor(self._load_document_page, reader, index)
+
+                active = self.load_controller.active_degradations()
+                degradations = []
+                page_level = recognition_level
+                if self._degrade_fast(active, pinned_level):
+                    degradations.append(DEGRADE_FAST)
+                    page_level = "fast"
+                scale = self._degrade_scale(active, image.size)
+                if scale < 1.0:
+                    degradations.append(DEGRADE_DOWNSCALE)
+
+                results, cascade = await self._run_ocr_task(
+                    self._recognize_scaled,
+                    image,
+                    scale,
+                    page_level,
+                    language_preference,
+                    confidence_threshold,
+                    framework
+                )
+                self.load_controller.record_applied(degradations)
+                await queue.put({
+                    'page_index': index,
+                    'results': results,
+                    'image_size': image.size,
+                    'processing_time': time.time() - page_start,
+                    'cascade': self._record_cascade(cascade, image.size),
+                    'degradations': degradations,
+                    'error': None
+                })
+            except Exception as e:
+                await queue.put(self._page_error(index, page_start, e))
+            finally:
+                if reserved is not None:
+                    self.pixel_budget.release(reserved)
+                slots.release()
+
+        async def produce():
+            for index in range(reader.page_count):
+                await slots.acquire()
+                task = asyncio.create_task(run_page(index, time.time()))
+                page_tasks.add(task)
+                task.add_done_callback(page_tasks.discard)
+
+        producer = asyncio.create_task(produce())
+        failed_pages = 0
+        try:
+            for _ in range(reader.page_count):
+                page = await queue.get()
+                if page['error']:
+                    failed_pages += 1
+                yield page
+
+            processing_time = time.time() - start_time
+            self.stats['successful_requests'] += 1
+            self.stats['total_pages'] += reader.page_count
+            self.stats['failed_pages'] += failed_pages
+            self.stats['total_processing_time'] += processing_time
+            self.stats['average_processing_time'] = (
+                self.stats['total_processing_time'] / self.stats['total_requests']
+            )
+            self.logger.info(
+                "%s 处理完成，耗时: %.3fs，页数: %d，失败页: %d",
+                reader.kind, processing_time, reader.page_count, failed_pages
+            )
+        finally:
+            # 调用方提前停止迭代（如客户端断开）时取消剩余页面
+            producer.cancel()
+            for task in list(page_tasks):
+                task.cancel()
+            reader.close()
+
+    def _page_error(self, index: int, page_start: float, error: Exception) -> Dict[str, Any]:
+        """构造失败页的结果"""
+        self.logger.error("第 %d 页处理失败: %s", index + 1, error)
+        return {
+            'page_index': index,
+            'results': OCRResultSet.empty(),
+            'image_size': (0, 0),
+            'processing_time': time.time() - page_start,
+            'cascade': None,
+            'degradations': [],
+            'error': str(error)
+        }
+
+    def get_supported_languages(self) -> Dict[str, List[str]]:
+        """获取 Vision 各识别级别支持的语言（结果会被缓存）"""
+        if self.supported_languages is None:
+            import Vision
+            import objc
+
+            with objc.autorelease_pool():
+                req = Vision.VNRecognizeTextRequest.alloc().init()
+
+                # 获取不同识别级别的支持语言
+                req.setRecognitionLevel_(0)  # accurate
+                accurate_languages = req.supportedRecognitionLanguagesAndReturnError_(None)[0]
+
+                req.setRecognitionLevel_(1)  # fast
+                fast_languages = req.supportedRecognitionLanguagesAndReturnError_(None)[0]
+
+                self.supported_languages = {
+                    "accurate": list(accurate_languages),
+                    "fast": list(fast_languages)
+                }
+        return self.supported_languages
+
+    def _warm_up_thread(self, barrier: threading.Barrier, frameworks: List[str], levels: List[str]) -> int:
+        """
+        在当前工作线程上用一张小图执行各框架、各识别级别的识别（在线程池中执行）
+
+        先在屏障处等待，保证每个任务占用不同的线程，线程池中的每个线程都完成一次初始化。
+        """
+        try:
+            barrier.wait()
+        except threading.BrokenBarrierError:
+            self.logger.warning("预热时未能等到所有工作线程就位")
+
+        image = _warmup_image()
+        language_preference = settings.get_language_preference_list()
+        for framework in frameworks:
+            for level in (levels if framework != "livetext" else [settings.recognition_level]):
+                with self.host_slots.slot():
+                    self._perform_ocr(image, level, language_preference, 0.0, framework)
+        return threading.get_ident()
+
+    async def warm_up(self):
+        """
+        预热识别引擎
+
+        在线程池的每个线程上执行一次小图识别（WARMUP_FRAMEWORKS × WARMUP_LEVELS），
+        并缓存支持的语言列表，消除部署或重启后首批请求的初始化延迟。完成前 /ready 返回 503。
+        """
+        if not settings.warmup_enabled:
+            self.warmup_state = {'status': 'ready', 'enabled': False}
+            return
+
+        start_time = time.time()
+        self.warmup_state = {'status': 'warming', 'enabled': True}
+        frameworks = settings.get_warmup_frameworks()
+        levels = [level for level in settings.get_warmup_levels() if level != "cascade"]
+        self.logger.info(f"开始预热: 框架 {','.join(frameworks)}，级别 {','.join(levels)}，{self.executor_size} 个线程")
+
+        loop = asyncio.get_event_loop()
+        try:
+            await loop.run_in_executor(self.executor, self.get_supported_languages)
+        except Exception as e:
+            # 语言列表只用于查询接口，失败时在首次查询时重试
+            self.logger.warning(f"预热时获取支持语言失败: {str(e)}")
+
+        try:
+            barrier = threading.Barrier(self.executor_size, timeout=WARMUP_BARRIER_TIMEOUT)
+            threads = await asyncio.gather(*(
+                loop.run_in_executor(self.executor, self._warm_up_thread, barrier, frameworks, levels)
+                for _ in range(self.executor_size)
+            ))
+        except Exception as e:
+            self.warmup_state = {
+                'status': 'failed',
+                'enabled': True,
+                'error': str(e),
+                'duration': time.time() - start_time
+            }
+            self.logger.error(f"预热失败: {str(e)}")
+            return
+
+        self.warmup_state = {
+            'status': 'ready',
+            'enabled': True,
+            'threads': len(set(threads)),
+            'frameworks': frameworks,
+            'levels': levels,
+            'duration': time.time() - start_time
+        }
+        self.logger.info(f"预热完成，耗时 {self.warmup_state['duration']:.2f}s")
+
+    def is_ready(self) -> bool:
+        """预热是否已完成"""
+        return self.warmup_state['status'] == 'ready'
+
+    def _host_process_state(self) -> Dict[str, Any]:
+        """本进程的识别队列和统计"""
+        state = self.host_slots.local_stats()
+        state['queue_depth'] = self.ocr_inflight - state['active']
+        state['stats'] = self.stats
+        return state
+
+    async def publish_host_stats(self, interval: float):
+        """定期发布本进程状态，供任一进程的 /stats 汇总整机情况"""
+        try:
+            while True:
+                try:
+                    self.host_slots.publish(self._host_process_state())
+                except OSError as e:
+                    self.logger.warning(f"发布进程状态失败: {str(e)}")
+                await asyncio.sleep(interval)
+        finally:
+            self.host_slots.unpublish()
+
+    def get_host_stats(self) -> Dict[str, Any]:
+        """
+        汇总整机所有工作进程的识别并发和统计
+
+        其他进程的数据最多滞后一个发布周期；本进程使用实时数据。
+        """
+        pid = os.getpid()
+        processes = [p for p in self.host_slots.collect() if p.get('pid') != pid]
+        processes.append({**self._host_process_state(), 'pid': pid})
+
+        totals: Dict[str, Any] = {}
+        for process in processes:
+            for key, value in process['stats'].items():
+                if key != 'average_processing_time':
+                    totals[key] = totals.get(key, 0) + value
+        totals['average_processing_time'] = (
+            totals['total_processing_time'] / totals['total_requests'] if totals.get('total_requests') else 0.0
+        )
+
+        return {
+            'max_concurrency': self.host_slots.slots,
+            'processes': len(processes),
+            'active': sum(p['active'] for p in processes),
+            'waiting': sum(p['waiting'] for p in processes),
+            'queue_depth': sum(p['queue_depth'] for p in processes),
+            'per_process': [
+                {key: p[key] for key in ('pid', 'active', 'waiting', 'queue_depth', 'acquired', 'waited')}
+                for p in processes
+            ],
+            'totals': totals
+        }
+
     def get_stats(self) -> Dict[str, Any]:
         """获取服务统计信息"""
         return self.stats.copy()
@@ -269,14 +1232,75 @@ class OCRService:
             'successful_requests': 0,
             'failed_requests': 0,
             'total_processing_time': 0.0,
-            'average_processing_time': 0.0
+            'average_processing_time': 0.0,
+            'total_pages': 0,
+            'failed_pages': 0,
+            'cascade_boxes': 0,
+            'cascade_escalated': 0,
+            'total_frames': 0,
+            'frame_tiles': 0,
+            'frame_tiles_changed': 0
         }
         self.logger.info("统计信息已重置")
     
-    def __del__(self):
-        """清理资源"""
-        if hasattr(self, 'executor'):
-            self.executor.shutdown(wait=True)
+    def shutdown(self):
+        """
+        关闭服务（在排空之后、进程退出前调用）
+
+        取消线程池中尚未开始的任务，不等待正在执行的识别（进程退出时解释器会等待其结束）；
+        删除发布的进程状态并关闭整机槽位文件。
+        """
+        if self.executor is None:
+            return
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.host_slots.close()
+        self.logger.info("OCR 服务已关闭")
+
+
+def _content_hash(data) -> str:
+    """图像数据（bytes 或 mmap）的 SHA-256"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def _warmup_image() -> Image.Image:
+    """预热用的小图（白底黑字）"""
+    image = Image.new('RGB', (160, 48), 'white')
+    ImageDraw.Draw(image).text((8, 16), "Warm up 123", fill='black')
+    return image
+
+
+class _Base64BatchReader:
+    """
+    批量图像读取器
+
+    与 DocumentReader 接口相同，每张 Base64 图像作为一页，在 load_page 时才解码。
+    """
+
+    kind = "batch"
+
+    def __init__(self, service: OCRService, images_base64: List[str]):
+        self.service = service
+        self.images_base64 = images_base64
+        self.page_count = len(images_base64)
+        self._opened: Optional[Tuple[int, Image.Image]] = None
+
+    def page_pixel_bytes(self, index: int) -> int:
+        """解码 Base64 并读取图像头估计所需内存，打开的图像留给随后的 load_page"""
+        data = self.service._decode_base64(self.images_base64[index], settings.max_image_size)
+        image = self.service._open_image(data)
+        self._opened = (index, image)
+        return estimate_pixel_bytes(image.size, image.mode)
+
+    def load_page(self, index: int) -> Image.Image:
+        if self._opened is not None and self._opened[0] == index:
+            image = self._opened[1]
+            self._opened = None
+            return self.service._finish_load(image)
+        data = self.service._decode_base64(self.images_base64[index], settings.max_image_size)
+        return self.service._load_image(data)
+
+    def close(self):
+        pass
 
 
 # 全局 OCR 服务实例
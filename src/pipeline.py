@@ -0,0 +1,193 @@
+"""
+OCR 处理流水线
+组合 OCR 识别、本地排版和 LLM 排版，供同步接口和异步任务共用
+"""
+import logging
+import time
+from typing import Dict, Any, AsyncIterator, Union, Optional
+
+from .models import (
+    OCRFormatRequest,
+    OCRFileRequest,
+    OCRFormatResponse,
+    OCRDocumentRequest,
+    OCRBatchRequest,
+    OCRDocumentResponse,
+    DocumentPageResult,
+    FormattedResult
+)
+from .ocr_service import ocr_service
+from .formatter_local import format_locally
+from .formatter_llm import format_with_llm
+from .load_control import DEGRADE_SKIP_LLM
+from .logging_pipeline import stage
+from .result_store import result_store
+
+logger = logging.getLogger(__name__)
+
+
+async def run_ocr_and_format(request: Union[OCRFormatRequest, OCRFileRequest],
+                             file_root: Optional[str] = None) -> Dict[str, Any]:
+    """
+    执行 OCR 并排版，返回未封装为响应模型的结果
+
+    Args:
+        request: 带排版功能的 OCR 请求，或本地文件 OCR 请求
+        file_root: 本地文件请求允许的根目录（默认 LOCAL_INPUT_ROOT）
+
+    Returns:
+        包含 results、local_format、llm_format、processing_time、image_size、cascade、degradations、
+        near_duplicate_distance 的字典
+    """
+    # 结果存储只保存整张图像的完整识别结果：区域识别的结果只覆盖部分内容，不保存也不计算哈希
+    store_result = result_store is not None and not request.regions
+
+    # 处理图像 OCR
+    if isinstance(request, OCRFileRequest):
+        result = await ocr_service.process_file(
+            file_path=request.file_path,
+            recognition_level=request.recognition_level,
+            language_preference=request.language_preference,
+            confidence_threshold=request.confidence_threshold,
+            framework=request.framework,
+            root=file_root,
+            regions=request.regions,
+            with_content_hash=store_result
+        )
+    else:
+        result = await ocr_service.process_image(
+            image_base64=request.image_base64,
+            recognition_level=request.recognition_level,
+            language_preference=request.language_preference,
+            confidence_threshold=request.confidence_threshold,
+            framework=request.framework,
+            regions=request.regions,
+            with_content_hash=store_result
+        )
+
+    ocr_results = result['results']
+    image_size = result['image_size']
+
+    # 本地排版（始终执行）
+    with stage('local_format'):
+        local_format = format_locally(ocr_results, image_size)
+
+    # 保存到结果存储（只入队，后台批量写入）；降级（fast 或缩小图像）的结果质量较低，
+    # 不覆盖同一图像已保存的结果
+    if store_result and not result['degradations']:
+        source = request.file_path if isinstance(request, OCRFileRequest) else None
+        result_store.record(result['image_hash'], source, ocr_results, image_size, local_format.markdown)
+
+    # LLM 排版（可选，负载过高时跳过）
+    llm_format = None
+    degradations = result['degradations']
+    if request.enable_llm_format:
+        if DEGRADE_SKIP_LLM in ocr_service.load_controller.active_degradations():
+            degradations = degradations + [DEGRADE_SKIP_LLM]
+            ocr_service.load_controller.record_applied([DEGRADE_SKIP_LLM])
+            llm_format = FormattedResult(markdown="", success=False, error="服务负载过高，已跳过 LLM 排版")
+        else:
+            with stage('llm_format'):
+                llm_format = await format_with_llm(ocr_results)
+
+    return {
+        'results': ocr_results,
+        'local_format': local_format,
+        'llm_format': llm_format,
+        'processing_time': result['processing_time'],
+        'image_size': image_size,
+        'cascade': result['cascade'],
+        'degradations': degradations,
+        'near_duplicate_distance': result['near_duplicate_distance']
+    }
+
+
+def build_format_response(result: Dict[str, Any]) -> OCRFormatResponse:
+    """将 run_ocr_and_format 的结果封装为原有的响应模型"""
+    return OCRFormatResponse(
+        results=result['results'].to_ocr_results(),
+        local_format=result['local_format'],
+        llm_format=result['llm_format'],
+        processing_time=result['processing_time'],
+        image_size=result['image_size']
+    )
+
+
+async def ocr_and_format(request: OCRFormatRequest) -> OCRFormatResponse:
+    """
+    执行 OCR 并排版
+
+    Args:
+        request: 带排版功能的 OCR 请求
+
+    Returns:
+        OCRFormatResponse 包含原始结果、本地排版和可选的 LLM 排版
+    """
+    return build_format_response(await run_ocr_and_format(request))
+
+
+def format_document_page(page: Dict[str, Any]) -> DocumentPageResult:
+    """为文档的一页结果加上本地排版"""
+    if page['error']:
+        local_format = FormattedResult(markdown="", success=False, error=page['error'])
+    else:
+        local_format = format_locally(page['results'], page['image_size'])
+
+    return DocumentPageResult(
+        page_index=page['page_index'],
+        results=page['results'].to_ocr_results(),
+        local_format=local_format,
+        image_size=page['image_size'],
+        processing_time=page['processing_time'],
+        degradations=page['degradations'] or None,
+        error=page['error']
+    )
+
+
+def iter_document_pages(request: OCRDocumentRequest) -> AsyncIterator[Dict[str, Any]]:
+    """按完成顺序逐页识别多页文档"""
+    return ocr_service.iter_document(
+        document_base64=request.document_base64,
+        recognition_level=request.recognition_level,
+        language_preference=request.language_preference,
+        confidence_threshold=request.confidence_threshold,
+        framework=request.framework
+    )
+
+
+def iter_batch_pages(request: OCRBatchRequest) -> AsyncIterator[Dict[str, Any]]:
+    """按完成顺序逐张识别批量图像"""
+    return ocr_service.iter_batch(
+        images_base64=request.images_base64,
+        recognition_level=request.recognition_level,
+        language_preference=request.language_preference,
+        confidence_threshold=request.confidence_threshold,
+        framework=request.framework
+    )
+
+
+async def stream_formatted_pages(pages: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[DocumentPageResult]:
+    """为逐页产出的结果加上本地排版，保持完成顺序"""
+    async for page in pages:
+        yield format_document_page(page)
+
+
+async def collect_formatted_pages(pages: AsyncIterator[Dict[str, Any]]) -> OCRDocumentResponse:
+    """
+    收集所有页结果并按页码排序
+
+    Args:
+        pages: iter_document_pages 或 iter_batch_pages 返回的异步迭代器
+
+    Returns:
+        OCRDocumentResponse 包含按页码排序的各页结果
+    """
+    start_time = time.time()
+    results = [page async for page in stream_formatted_pages(pages)]
+    results.sort(key=lambda p: p.page_index)
+
+    return OCRDocumentResponse(
+        pages=results,
+        page_count=len(results),
+        processing_time=time.time() - start_time
+    )
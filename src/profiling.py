@@ -0,0 +1,175 @@
+"""
+性能分析模块
+基于 sys._current_frames 的采样分析器：既可以对单个请求做端到端分析（事件循环线程 + 为该请求工作的线程池线程），
+也可以对整个进程做限时采样；输出 flamegraph.pl / speedscope 可直接读取的折叠栈（collapsed stacks）格式
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .config import settings
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _collapse(frame, root: str) -> str:
+    """把调用栈折叠为 root;外层;...;内层 形式"""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.append(root)
+    return ";".join(reversed(labels))
+
+
+class StackSampler:
+    """
+    调用栈采样器
+
+    在独立的守护线程中每隔 interval 秒读取一次各线程的当前调用栈并计数。
+    thread_root 回调决定每个线程是否参与采样（返回 None 表示跳过）以及栈根的名称。
+    """
+
+    def __init__(self, interval: float, thread_root: Callable[[int], Optional[str]]):
+        self.interval = interval
+        self.thread_root = thread_root
+        self.counts: Counter = Counter()
+        self.samples = 0
+        self.started_at = 0.0
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self.started_at = time.monotonic()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.monotonic() - self.started_at
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                root = self.thread_root(ident)
+                if root is not None:
+                    self.counts[_collapse(frame, root)] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        """折叠栈文本，每行为 “栈 次数”"""
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self.counts.items()))
+
+    def top(self, limit: int = 20) -> List[Tuple[str, int]]:
+        """按自身采样数排序的热点函数"""
+        leaf_counts: Counter = Counter()
+        for stack, count in self.counts.items():
+            leaf_counts[stack.rsplit(";", 1)[-1]] += count
+        return leaf_counts.most_common(limit)
+
+
+class RequestProfile:
+    """
+    单个请求的采样分析
+
+    事件循环线程在请求期间始终参与采样（会包含同时处理的其他请求在事件循环上的工作）；
+    线程池线程只在执行本请求提交的函数（通过 run 包装）时参与采样。
+    """
+
+    def __init__(self, interval: float):
+        self.profile_id = uuid.uuid4().hex[:12]
+        self.loop_thread = threading.get_ident()
+        self._active: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self.sampler = StackSampler(interval, self._thread_root)
+
+    def _thread_root(self, ident: int) -> Optional[str]:
+        if ident == self.loop_thread:
+            return "event-loop"
+        if ident in self._active:
+            return "worker"
+        return None
+
+    def run(self, func: Callable, *args):
+        """在线程池线程中执行 func，执行期间该线程参与采样"""
+        ident = threading.get_ident()
+        with self._lock:
+            self._active[ident] = self._active.get(ident, 0) + 1
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                self._active[ident] -= 1
+                if not self._active[ident]:
+                    del self._active[ident]
+
+
+# 当前请求的性能分析（只在带有效 X-Debug-Profile 头的请求中设置）
+current_profile: ContextVar[Optional[RequestProfile]] = ContextVar("current_profile", default=None)
+
+
+def get_profile_dir() -> str:
+    """性能分析结果目录"""
+    return settings.profile_dir or os.path.join(tempfile.gettempdir(), "ocrmac-profiles")
+
+
+def save_profile(profile_id: str, collapsed: str):
+    """保存折叠栈，只保留最近 profile_keep 份"""
+    directory = get_profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, f"{profile_id}.collapsed"), 'w', encoding='utf-8') as f:
+        f.write(collapsed)
+
+    files = sorted(
+        (os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".collapsed")),
+        key=os.path.getmtime
+    )
+    for path in files[:-settings.profile_keep]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def load_profile(profile_id: str) -> Optional[str]:
+    """读取保存的折叠栈，不存在时返回 None"""
+    if not profile_id.isalnum():
+        return None
+    try:
+        with open(os.path.join(get_profile_dir(), f"{profile_id}.collapsed"), encoding='utf-8') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def sample_process(seconds: float, interval: float) -> StackSampler:
+    """
+    对整个进程采样 seconds 秒（阻塞调用线程），栈根为线程名
+
+    由调用方在独立线程中执行，不占用事件循环。
+    """
+    names: Dict[int, str] = {}
+
+    def thread_root(ident: int) -> str:
+        if ident not in names:
+            names.update((t.ident, t.name) for t in threading.enumerate())
+        return names.get(ident, f"thread-{ident}")
+
+    sampler = StackSampler(interval, thread_root)
+    sampler.start()
+    time.sleep(seconds)
+    sampler.stop()
+    return sampler
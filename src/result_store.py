@@ -0,0 +1,305 @@
+"""
+OCR 结果存储模块
+按图像内容哈希持久化 OCR 结果和本地排版 Markdown，并建立 SQLite FTS5 全文索引，
+归档图像的文字可以直接检索，不必重新识别；写入在后台批量进行，不占用请求处理时间
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import settings
+from .results import OCRResultSet
+
+logger = logging.getLogger(__name__)
+
+# trigram 分词按三个字符切分，适合没有空格分词的中文；更短的检索词改用 LIKE 扫描
+TRIGRAM_LENGTH = 3
+
+
+def _like_pattern(term: str) -> str:
+    """转义 LIKE 通配符"""
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def parse_query(query: str) -> List[str]:
+    """把检索语句按空白拆分为检索词（所有词都需命中）"""
+    terms = [term for term in query.split() if term]
+    if not terms:
+        raise ValueError("检索词不能为空")
+    return terms
+
+
+class ResultStore:
+    """
+    SQLite 结果存储
+
+    results 表保存结果，results_fts 为 FTS5 全文索引（rowid 与 results.id 对应）。
+    所有方法都是同步的，由 ResultStoreManager 放在单线程执行器中调用，
+    因此同一时间只有一个线程访问连接。
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.conn: Optional[sqlite3.Connection] = None
+
+    def open(self):
+        """打开数据库并建表"""
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False,
+                                    isolation_level=None, timeout=30.0)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                id INTEGER PRIMARY KEY,
+                image_hash TEXT NOT NULL UNIQUE,
+                source TEXT,
+                width INTEGER NOT NULL,
+                height INTEGER NOT NULL,
+                results TEXT NOT NULL,
+                markdown TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        try:
+            self.conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS results_fts USING fts5(text, tokenize='trigram')"
+            )
+        except sqlite3.OperationalError as e:
+            self.close()
+            raise RuntimeError(f"SQLite {sqlite3.sqlite_version} 不支持 FTS5 trigram 分词（需要 3.34 以上）: {str(e)}")
+
+    def close(self):
+        """关闭数据库"""
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def write_batch(self, items: List[Tuple[str, Optional[str], OCRResultSet, Tuple[int, int], Optional[str], float]]):
+        """
+        在一个事务中写入一批结果，同一图像哈希的已有记录被覆盖
+
+        Args:
+            items: (图像哈希, 来源, 识别结果, 图像尺寸, 排版 Markdown, 识别时间) 列表
+        """
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            for image_hash, source, results, (width, height), markdown, created_at in items:
+                results_json = json.dumps(results.to_columns(), ensure_ascii=False)
+                text = "\n".join(results.texts)
+                row = self.conn.execute("SELECT id FROM results WHERE image_hash = ?", (image_hash,)).fetchone()
+                if row is None:
+                    cursor = self.conn.execute(
+                        "INSERT INTO results (image_hash, source, width, height, results, markdown, "
+                        "created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (image_hash, source, width, height, results_json, markdown, created_at, created_at)
+                    )
+                    row_id = cursor.lastrowid
+                else:
+                    row_id = row['id']
+                    self.conn.execute(
+                        "UPDATE results SET source = COALESCE(?, source), width = ?, height = ?, results = ?, "
+                        "markdown = ?, updated_at = ? WHERE id = ?",
+                        (source, width, height, results_json, markdown, created_at, row_id)
+                    )
+                    self.conn.execute("DELETE FROM results_fts WHERE rowid = ?", (row_id,))
+                self.conn.execute("INSERT INTO results_fts (rowid, text) VALUES (?, ?)", (row_id, text))
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def search(self, terms: List[str], limit: int) -> List[sqlite3.Row]:
+        """
+        检索包含所有检索词的结果
+
+        不短于三个字符的词走 FTS5 索引并按 bm25 排序；只有短词时按 LIKE 扫描，按更新时间倒序。
+        """
+        long_terms = [term for term in terms if len(term) >= TRIGRAM_LENGTH]
+        short_terms = [term for term in terms if len(term) < TRIGRAM_LENGTH]
+
+        conditions, params = [], []
+        if long_terms:
+            conditions.append("results_fts MATCH ?")
+            params.append(" ".join('"' + term.replace('"', '""') + '"' for term in long_terms))
+        for term in short_terms:
+            conditions.append("results_fts.text LIKE ? ESCAPE '\\'")
+            params.append(_like_pattern(term))
+        order = "bm25(results_fts)" if long_terms else "r.updated_at DESC"
+
+        return self.conn.execute(
+            "SELECT r.image_hash, r.source, r.width, r.height, r.results, r.markdown, r.created_at, r.updated_at "
+            "FROM results_fts JOIN results r ON r.id = results_fts.rowid "
+            f"WHERE {' AND '.join(conditions)} ORDER BY {order} LIMIT ?",
+            params + [limit]
+        ).fetchall()
+
+    def count(self) -> int:
+        """已保存的结果数"""
+        return self.conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+
+def matching_lines(results_json: str, terms: List[str]) -> List[Dict[str, Any]]:
+    """从保存的列式结果中取出包含任一检索词的文本行（OCRResult 结构，坐标为像素）"""
+    columns = json.loads(results_json)
+    lowered = [term.lower() for term in terms]
+    boxes = columns['boxes']
+    lines = []
+    for index, (text, score) in enumerate(zip(columns['texts'], columns['scores'])):
+        if any(term in text.lower() for term in lowered):
+            x1, y1, x2, y2 = boxes[index * 4:index * 4 + 4]
+            lines.append({
+                'dt_boxes': [[x1, y1], [x2, y1], [x2, y2], [x1, y2]],
+                'rec_txt': text,
+                'score': score
+            })
+    return lines
+
+
+class ResultStoreManager:
+    """
+    结果存储管理器
+
+    record 只把结果放入内存队列（已满时丢弃并计数）；后台写入协程每攒够 result_store_batch_size 条
+    或每隔 result_store_flush_interval 秒，在数据库线程中以一个事务批量写入。
+    多个 uvicorn 工作进程可以共享同一个数据库文件。
+    """
+
+    def __init__(self):
+        self.store = ResultStore(settings.result_store_path)
+        # SQLite 操作放在单独的单线程执行器中，不占用 OCR 线程池
+        self.db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="results-db")
+        self.queue: Optional[asyncio.Queue] = None
+        self.writer_task: Optional[asyncio.Task] = None
+        self.running = False
+
+        self.stats = {
+            'recorded': 0,
+            'written': 0,
+            'dropped': 0,
+            'batches': 0,
+            'write_errors': 0,
+            'searches': 0
+        }
+
+    async def _db(self, func, *args):
+        """在数据库线程中执行存储操作"""
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.db_executor, func, *args)
+
+    async def start(self):
+        """打开存储并启动后台写入协程"""
+        if self.running:
+            return
+        await self._db(self.store.open)
+        self.queue = asyncio.Queue(maxsize=settings.result_store_queue_size)
+        self.running = True
+        self.writer_task = asyncio.create_task(self._writer())
+        logger.info(f"结果存储已启动，数据库: {settings.result_store_path}")
+
+    async def stop(self):
+        """写入队列中剩余的结果后关闭存储"""
+        if not self.running:
+            return
+        self.running = False
+        await self.queue.put(None)
+        await asyncio.gather(self.writer_task, return_exceptions=True)
+        self.writer_task = None
+        await self._db(self.store.close)
+        self.db_executor.shutdown(wait=True)
+        logger.info("结果存储已停止")
+
+    def record(self, image_hash: str, source: Optional[str], results: OCRResultSet,
+               image_size: Tuple[int, int], markdown: Optional[str]):
+        """提交一条待保存的结果（不等待写入，序列化在数据库线程中进行）"""
+        if not self.running:
+            return
+        try:
+            self.queue.put_nowait((image_hash, source, results, tuple(image_size), markdown, time.time()))
+            self.stats['recorded'] += 1
+        except asyncio.QueueFull:
+            self.stats['dropped'] += 1
+
+    async def _writer(self):
+        """后台写入协程：按批量大小或刷新间隔写入"""
+        loop = asyncio.get_event_loop()
+        stopping = False
+        while not stopping:
+            item = await self.queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = loop.time() + settings.result_store_flush_interval
+            while len(batch) < settings.result_store_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            try:
+                await self._db(self.store.write_batch, batch)
+                self.stats['written'] += len(batch)
+                self.stats['batches'] += 1
+            except Exception as e:
+                self.stats['write_errors'] += 1
+                logger.error(f"写入 {len(batch)} 条 OCR 结果失败: {str(e)}")
+
+    async def search(self, query: str, limit: int, include_markdown: bool = False) -> List[Dict[str, Any]]:
+        """
+        全文检索已保存的结果
+
+        Returns:
+            命中的图像列表，每项包含图像哈希、来源、尺寸、包含检索词的文本行及其坐标
+
+        Raises:
+            ValueError: 检索词为空
+        """
+        terms = parse_query(query)
+        hits = await self._db(self._search, terms, limit, include_markdown)
+        self.stats['searches'] += 1
+        return hits
+
+    def _search(self, terms: List[str], limit: int, include_markdown: bool) -> List[Dict[str, Any]]:
+        """检索并解析命中的结果（在数据库线程中执行）"""
+        return [
+            {
+                'image_hash': row['image_hash'],
+                'source': row['source'],
+                'image_size': (row['width'], row['height']),
+                'matches': matching_lines(row['results'], terms),
+                'markdown': row['markdown'] if include_markdown else None,
+                'created_at': row['created_at'],
+                'updated_at': row['updated_at']
+            }
+            for row in self.store.search(terms, limit)
+        ]
+
+    async def get_stats(self) -> Dict[str, Any]:
+        """获取存储统计"""
+        stats = self.stats.copy()
+        if self.running:
+            stats['pending'] = self.queue.qsize()
+            stats['documents'] = await self._db(self.store.count)
+        return stats
+
+
+# 全局结果存储（未启用时为 None）
+result_store = ResultStoreManager() if settings.result_store_enabled else None
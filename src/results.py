@@ -0,0 +1,146 @@
+"""
+OCR 结果容器模块
+以 NumPy 数组保存坐标和置信度，贯穿识别、排版和响应序列化，
+只在需要原有响应格式时才构建 pydantic 对象
+"""
+from typing import List, Tuple, Sequence, Dict, Any, Optional
+
+import numpy as np
+
+from .models import OCRResult, RegionOCRResult
+
+
+class OCRResultSet:
+    """
+    一张图像的 OCR 结果
+
+    Attributes:
+        texts: 识别文本列表
+        scores: 置信度，float64 数组，形状 (N,)
+        boxes: 像素坐标 [x1, y1, x2, y2]（左上、右下），float64 数组，形状 (N, 4)
+        region_ids: 每个结果所属的感兴趣区域 ID，只识别指定区域时才有，否则为 None
+    """
+
+    __slots__ = ('texts', 'scores', 'boxes', 'region_ids')
+
+    def __init__(self, texts: List[str], scores: np.ndarray, boxes: np.ndarray,
+                 region_ids: Optional[List[str]] = None):
+        self.texts = texts
+        self.scores = scores
+        self.boxes = boxes
+        self.region_ids = region_ids
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    @classmethod
+    def empty(cls) -> "OCRResultSet":
+        """空结果"""
+        return cls([], np.zeros(0, dtype=np.float64), np.zeros((0, 4), dtype=np.float64))
+
+    @classmethod
+    def from_ocrmac(cls,
+                    ocr_results: Sequence[Tuple[str, float, Sequence[float]]],
+                    image_size: Tuple[int, int]) -> "OCRResultSet":
+        """
+        从 ocrmac 的 (text, confidence, bbox) 结果构建
+
+        bbox 为 Vision 的相对坐标 (x, y, w, h)，原点在左下角；
+        向量化地完成与 convert_coordinates_pil 相同的换算。各坐标按与其相同的表达式和运算顺序计算，
+        浮点结果逐位一致（旧格式响应的 JSON 不变）。
+        """
+        if not ocr_results:
+            return cls.empty()
+
+        texts = [r[0] for r in ocr_results]
+        scores = np.fromiter((r[1] for r in ocr_results), dtype=np.float64, count=len(ocr_results))
+        rel = np.asarray([r[2] for r in ocr_results], dtype=np.float64).reshape(-1, 4)
+
+        width, height = image_size
+        boxes = np.empty_like(rel)
+        boxes[:, 0] = rel[:, 0] * width                   # x1
+        boxes[:, 1] = (1 - rel[:, 1] - rel[:, 3]) * height  # y1
+        boxes[:, 2] = boxes[:, 0] + rel[:, 2] * width      # x2
+        boxes[:, 3] = (1 - rel[:, 1]) * height            # y2
+        return cls(texts, scores, boxes)
+
+    @classmethod
+    def from_ocr_results(cls, results: Sequence[OCRResult]) -> "OCRResultSet":
+        """从 OCRResult 列表构建（兼容旧接口）"""
+        if not results:
+            return cls.empty()
+        texts = [r.rec_txt for r in results]
+        scores = np.asarray([r.score for r in results], dtype=np.float64)
+        boxes = np.asarray(
+            [(r.dt_boxes[0][0], r.dt_boxes[0][1], r.dt_boxes[2][0], r.dt_boxes[2][1]) for r in results],
+            dtype=np.float64
+        )
+        return cls(texts, scores, boxes)
+
+    @classmethod
+    def concat_regions(cls,
+                       parts: Sequence[Tuple[str, "OCRResultSet", Tuple[float, float]]]) -> "OCRResultSet":
+        """
+        合并各区域的识别结果
+
+        Args:
+            parts: (区域 ID, 区域内的结果, 区域左上角在原图中的偏移 (x, y)) 列表
+
+        Returns:
+            坐标已映射回原图、带 region_ids 的结果
+        """
+        texts: List[str] = []
+        region_ids: List[str] = []
+        scores = []
+        boxes = []
+        for region_id, results, (offset_x, offset_y) in parts:
+            texts.extend(results.texts)
+            region_ids.extend([region_id] * len(results))
+            scores.append(results.scores)
+            boxes.append(results.boxes + (offset_x, offset_y, offset_x, offset_y))
+
+        if not texts:
+            empty = cls.empty()
+            empty.region_ids = []
+            return empty
+        return cls(texts, np.concatenate(scores), np.concatenate(boxes), region_ids)
+
+    def to_ocr_results(self) -> List[OCRResult]:
+        """转换为原有的 OCRResult 列表（仅用于 legacy 响应格式）"""
+        results = []
+        region_ids = self.region_ids or [None] * len(self.texts)
+        for text, score, (x1, y1, x2, y2), region_id in zip(
+            self.texts, self.scores.tolist(), self.boxes.tolist(), region_ids
+        ):
+            # 边界框坐标 (左上，右上，右下，左下)
+            dt_boxes = [[x1, y1], [x2, y1], [x2, y2], [x1, y2]]
+            if region_id is None:
+                results.append(OCRResult.construct(dt_boxes=dt_boxes, rec_txt=text, score=score))
+            else:
+                results.append(RegionOCRResult.construct(
+                    dt_boxes=dt_boxes, rec_txt=text, score=score, region_id=region_id
+                ))
+        return results
+
+    def to_columns(self, binary: bool = False) -> Dict[str, Any]:
+        """
+        转换为列式结构
+
+        Returns:
+            texts/scores（以及按区域识别时的 region_ids）为平行数组，boxes 为 int32 扁平数组 [x1, y1, x2, y2, ...]；
+            binary=True 时 boxes 为小端 int32 原始字节
+        """
+        boxes = np.rint(self.boxes).astype('<i4').reshape(-1)
+        columns: Dict[str, Any] = {
+            'count': len(self.texts),
+            'texts': self.texts,
+            'scores': self.scores.tolist()
+        }
+        if self.region_ids is not None:
+            columns['region_ids'] = self.region_ids
+        if binary:
+            columns['boxes'] = boxes.tobytes()
+            columns['boxes_dtype'] = '<i4'
+        else:
+            columns['boxes'] = boxes.tolist()
+        return columns
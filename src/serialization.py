@@ -0,0 +1,74 @@
+"""
+响应序列化模块
+提供紧凑的列式响应格式（JSON / MessagePack），绕过逐个框的 pydantic 模型构建和校验
+"""
+import json
+from typing import Dict, Any, Optional
+
+from fastapi.responses import Response
+
+from .results import OCRResultSet
+
+# 可选依赖：orjson 更快的 JSON 编码，msgpack 二进制格式
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# 响应格式
+FORMAT_LEGACY = "legacy"
+FORMAT_COLUMNAR = "columnar"
+FORMAT_MSGPACK = "msgpack"
+
+COLUMNAR_MEDIA_TYPE = "application/vnd.ocrmac.columnar+json"
+MSGPACK_MEDIA_TYPES = ("application/x-msgpack", "application/msgpack", "application/vnd.ocrmac.columnar+msgpack")
+
+
+def negotiate_format(query_format: Optional[str], accept: str) -> str:
+    """
+    根据查询参数 format 或 Accept 头选择响应格式
+
+    查询参数优先；都未指定时使用原有的 legacy 格式。
+    """
+    if query_format:
+        fmt = query_format.lower()
+        if fmt not in (FORMAT_LEGACY, FORMAT_COLUMNAR, FORMAT_MSGPACK):
+            raise ValueError(f"不支持的响应格式: {query_format}，可选: legacy、columnar、msgpack")
+    elif any(media_type in accept for media_type in MSGPACK_MEDIA_TYPES):
+        fmt = FORMAT_MSGPACK
+    elif COLUMNAR_MEDIA_TYPE in accept:
+        fmt = FORMAT_COLUMNAR
+    else:
+        fmt = FORMAT_LEGACY
+
+    if fmt == FORMAT_MSGPACK and msgpack is None:
+        raise ValueError("服务端未安装 msgpack，无法返回 MessagePack 格式")
+    return fmt
+
+
+def results_to_columns(results: OCRResultSet, binary: bool = False) -> Dict[str, Any]:
+    """将 OCR 结果转换为列式结构（见 OCRResultSet.to_columns）"""
+    return results.to_columns(binary=binary)
+
+
+def dumps_json(payload: Any) -> bytes:
+    """JSON 编码，优先使用 orjson"""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def render_columnar(payload: Dict[str, Any], fmt: str, headers: Optional[Dict[str, str]] = None) -> Response:
+    """将列式载荷编码为 HTTP 响应"""
+    if fmt == FORMAT_MSGPACK:
+        return Response(
+            content=msgpack.packb(payload, use_bin_type=True),
+            media_type=MSGPACK_MEDIA_TYPES[0],
+            headers=headers
+        )
+    return Response(content=dumps_json(payload), media_type=COLUMNAR_MEDIA_TYPE, headers=headers)
@@ -0,0 +1,85 @@
+"""
+启动耗时模块
+记录进程启动各步骤（导入依赖、注册路由、创建服务、启动任务队列等）的耗时，启动完成后输出一份报告，
+另外提供按模块列出导入耗时的报告（python main.py --import-report）
+"""
+import logging
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class StartupReport:
+    """启动步骤耗时记录"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._last = self.started
+        self.steps: List[Tuple[str, float]] = []
+
+    def mark(self, name: str):
+        """记录从上一步结束到现在的耗时为一个步骤"""
+        now = time.perf_counter()
+        self.steps.append((name, now - self._last))
+        self._last = now
+
+    @contextmanager
+    def step(self, name: str):
+        """记录 with 范围内的耗时为一个步骤"""
+        self._last = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.mark(name)
+
+    @property
+    def total(self) -> float:
+        return sum(seconds for _, seconds in self.steps)
+
+    def log(self):
+        """输出启动耗时报告"""
+        lines = "，".join(f"{name} {seconds:.3f}s" for name, seconds in self.steps)
+        logger.info("启动耗时 %.3fs：%s", self.total, lines)
+
+    def get_state(self) -> Dict[str, Any]:
+        """获取各步骤耗时"""
+        return {
+            'total': round(self.total, 4),
+            'steps': {name: round(seconds, 4) for name, seconds in self.steps}
+        }
+
+
+# 全局启动耗时记录（src.api 最先导入本模块，导入依赖的耗时从此刻算起）
+startup_report = StartupReport()
+
+
+def import_report(module: str, limit: int = 25) -> List[Tuple[str, float, float]]:
+    """
+    在子进程中以 python -X importtime 导入 module，返回累计耗时最长的 limit 个模块
+
+    Returns:
+        (模块名（按导入层级缩进）, 自身耗时秒数, 累计耗时秒数) 列表，按累计耗时降序
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"导入 {module} 失败: {result.stderr.strip().splitlines()[-1]}")
+
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # 表头
+        self_us, cumulative_us, name = int(fields[0]), int(fields[1]), fields[2].rstrip()
+        modules.append((name, self_us / 1e6, cumulative_us / 1e6))
+    modules.sort(key=lambda item: item[2], reverse=True)
+    return modules[:limit]
@@ -0,0 +1,227 @@
+"""
+多租户模块
+每个 API 令牌对应一个租户，按租户限流，并以加权公平排队（WFQ）调度识别任务，
+批量导入等大流量租户不会饿死交互式用户
+"""
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TENANT = "default"
+
+
+class TokenBucket:
+    """令牌桶限流器（rate 为 0 时不限制）"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def try_take(self) -> float:
+        """取一个令牌；成功返回 0，否则返回需要等待的秒数"""
+        if not self.rate:
+            return 0.0
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+
+class Tenant:
+    """租户配置、限流状态和统计"""
+
+    def __init__(self, name: str, weight: float = 1.0, rate: float = 0.0,
+                 burst: Optional[float] = None, max_concurrency: int = 0):
+        self.name = name
+        self.weight = max(weight, 0.01)
+        self.max_concurrency = max_concurrency  # 同时执行的识别任务数上限，0 表示不限制
+        self.bucket = TokenBucket(rate, burst if burst is not None else max(rate, 1.0))
+
+        # 统计
+        self.requests = 0
+        self.rate_limited = 0
+        self.ocr_tasks = 0
+        self.total_queue_wait = 0.0
+        self.total_ocr_time = 0.0
+
+    def reset_stats(self):
+        """重置统计"""
+        self.requests = 0
+        self.rate_limited = 0
+        self.ocr_tasks = 0
+        self.total_queue_wait = 0.0
+        self.total_ocr_time = 0.0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取租户统计"""
+        return {
+            'weight': self.weight,
+            'rate': self.bucket.rate,
+            'max_concurrency': self.max_concurrency,
+            'requests': self.requests,
+            'rate_limited': self.rate_limited,
+            'ocr_tasks': self.ocr_tasks,
+            'average_queue_wait': self.total_queue_wait / self.ocr_tasks if self.ocr_tasks else 0.0,
+            'total_ocr_time': self.total_ocr_time
+        }
+
+
+class TenantRegistry:
+    """
+    令牌到租户的映射
+
+    AUTH_TOKEN 始终有效，对应 default 租户；API_TOKENS 中的每个令牌对应其配置的租户，
+    多个令牌可以属于同一租户（共享权重、限流和统计）。
+    """
+
+    def __init__(self, tenants: Dict[str, Tenant], tokens: Dict[str, Tenant]):
+        self.tenants = tenants
+        self.tokens = tokens
+
+    @classmethod
+    def from_settings(cls) -> "TenantRegistry":
+        """根据配置创建租户表"""
+        tenants = {DEFAULT_TENANT: Tenant(DEFAULT_TENANT)}
+        tokens = {}
+        configured = set()
+        for cfg in settings.get_api_tokens():
+            name = cfg.get('tenant') or DEFAULT_TENANT
+            # 同一租户的多个令牌以第一个出现的配置为准
+            if name not in configured:
+                configured.add(name)
+                tenants[name] = Tenant(
+                    name=name,
+                    weight=float(cfg.get('weight', 1.0)),
+                    rate=float(cfg.get('rate', 0.0)),
+                    burst=float(cfg['burst']) if cfg.get('burst') is not None else None,
+                    max_concurrency=int(cfg.get('max_concurrency', 0))
+                )
+            tokens[cfg['token']] = tenants[name]
+        tokens.setdefault(settings.auth_token, tenants[DEFAULT_TENANT])
+        if len(tenants) > 1:
+            logger.info(f"已配置 {len(tenants)} 个租户: {', '.join(tenants)}")
+        return cls(tenants, tokens)
+
+    def authenticate(self, token: str) -> Optional[Tenant]:
+        """根据令牌查找租户，无效令牌返回 None"""
+        return self.tokens.get(token)
+
+    def reset_stats(self):
+        """重置所有租户的统计"""
+        for tenant in self.tenants.values():
+            tenant.reset_stats()
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """各租户统计"""
+        return {name: tenant.get_stats() for name, tenant in self.tenants.items()}
+
+
+class FairScheduler:
+    """
+    加权公平排队调度器（起始时间公平排队，SFQ）
+
+    每个识别任务到达时打上虚拟时间标签：start = max(V, 该租户上一个任务的 finish)，
+    finish = start + 1 / weight。有空闲容量时放行所有租户队首中 start 最小的任务，
+    并把系统虚拟时间 V 推进到该任务的 start。权重为 2 的租户在竞争时获得 2 倍的执行机会，
+    空闲过的租户从当前 V 开始排队，不能积攒额度。达到 max_concurrency 的租户暂不参与调度。
+
+    容量由 capacity 回调给出（通常是自适应并发的当前上限）。
+    所有方法都在事件循环线程中调用，不需要加锁。
+    """
+
+    def __init__(self, capacity: Callable[[], int]):
+        self.capacity = capacity
+        self.virtual_time = 0.0
+        self.in_flight = 0
+        self._queues: Dict[str, Deque[Tuple[float, asyncio.Future]]] = {}
+        self._tenants: Dict[str, Tenant] = {}
+        self._last_finish: Dict[str, float] = {}
+        self._running: Dict[str, int] = {}
+
+    def _eligible(self, tenant: Tenant) -> bool:
+        return not tenant.max_concurrency or self._running.get(tenant.name, 0) < tenant.max_concurrency
+
+    def _start(self, tenant: Tenant, start: float):
+        self.in_flight += 1
+        self._running[tenant.name] = self._running.get(tenant.name, 0) + 1
+        self.virtual_time = max(self.virtual_time, start)
+
+    async def acquire(self, tenant: Tenant):
+        """为租户的一个识别任务排队，轮到时返回"""
+        name = tenant.name
+        self._tenants[name] = tenant
+        start = max(self.virtual_time, self._last_finish.get(name, 0.0))
+        self._last_finish[name] = start + 1.0 / tenant.weight
+
+        waiting = any(self._queues.values())
+        if not waiting and self.in_flight < self.capacity() and self._eligible(tenant):
+            self._start(tenant, start)
+            return
+
+        future = asyncio.get_event_loop().create_future()
+        queue = self._queues.setdefault(name, deque())
+        queue.append((start, future))
+        # 前面的等待者可能都属于已达并发上限的租户
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # 已被放行，归还容量
+                self.release(tenant)
+            else:
+                queue.remove((start, future))
+            raise
+
+    def release(self, tenant: Tenant):
+        """任务完成，放行下一个任务"""
+        self.in_flight -= 1
+        self._running[tenant.name] -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        while self.in_flight < self.capacity():
+            best_name, best_start = None, math.inf
+            for name, queue in self._queues.items():
+                if queue and queue[0][0] < best_start and self._eligible(self._tenants[name]):
+                    best_name, best_start = name, queue[0][0]
+            if best_name is None:
+                return
+            _, future = self._queues[best_name].popleft()
+            self._start(self._tenants[best_name], best_start)
+            future.set_result(None)
+
+    def get_state(self) -> Dict[str, Dict[str, int]]:
+        """各租户的排队数和执行中任务数"""
+        return {
+            name: {
+                'queued': len(self._queues.get(name, ())),
+                'running': self._running.get(name, 0)
+            }
+            for name in self._tenants
+        }
+
+
+# 当前请求所属的租户（在认证时设置，随任务上下文传递到识别调度）
+current_tenant: ContextVar[Optional[Tenant]] = ContextVar("current_tenant", default=None)
+
+# 全局租户表
+tenant_registry = TenantRegistry.from_settings()
+
+
+def get_current_tenant() -> Tenant:
+    """当前请求的租户；目录监听等没有认证上下文的调用归入 default 租户（异步任务执行时设置为提交者的租户）"""
+    return current_tenant.get() or tenant_registry.tenants[DEFAULT_TENANT]
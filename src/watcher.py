@@ -0,0 +1,159 @@
+"""
+目录监听模块
+定期扫描配置的目录，自动识别新放入的图像，并把结果写在图像旁边
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Dict, Optional, Set, Tuple
+
+from .models import OCRFileRequest
+from .config import settings
+from .pipeline import run_ocr_and_format, build_format_response
+
+logger = logging.getLogger(__name__)
+
+# 结果文件后缀：<图像文件名>.ocr.json / .ocr.md / .ocr.error
+RESULT_SUFFIX = ".ocr.json"
+MARKDOWN_SUFFIX = ".ocr.md"
+ERROR_SUFFIX = ".ocr.error"
+
+
+class DirectoryWatcher:
+    """
+    轮询式目录监听器
+
+    不依赖文件系统事件：每次扫描记录文件大小和修改时间，两次扫描之间没有变化且
+    超过 settle_time 的文件才会处理，避免读到生产者尚未写完的文件。
+    已有结果文件（或错误文件）的图像会被跳过。
+    """
+
+    def __init__(self, directory: str):
+        self.directory = os.path.realpath(directory)
+        self.extensions = tuple(settings.get_watch_extensions())
+        self.task: Optional[asyncio.Task] = None
+        self.running = False
+        # 上次扫描时看到的 (size, mtime)
+        self._seen: Dict[str, Tuple[int, float]] = {}
+        self._in_progress: Set[str] = set()
+        # 识别失败且无法写出错误文件的图像及其 (size, mtime)，文件不变时不再重试
+        self._failed: Dict[str, Tuple[int, float]] = {}
+        self._slots = asyncio.Semaphore(settings.workers)
+
+        self.stats = {
+            'processed': 0,
+            'failed': 0,
+            'scans': 0
+        }
+
+    def start(self):
+        """启动监听任务"""
+        if self.running:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self.running = True
+        self.task = asyncio.create_task(self._loop())
+        logger.info(f"目录监听已启动: {self.directory}，间隔 {settings.watch_interval}s")
+
+    async def stop(self):
+        """停止监听任务"""
+        if not self.running:
+            return
+        self.running = False
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        logger.info("目录监听已停止")
+
+    def get_stats(self) -> Dict[str, int]:
+        """获取监听统计"""
+        stats = self.stats.copy()
+        stats['in_progress'] = len(self._in_progress)
+        return stats
+
+    async def _loop(self):
+        while self.running:
+            try:
+                await self._scan()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"扫描监听目录失败: {str(e)}", exc_info=True)
+            await asyncio.sleep(settings.watch_interval)
+
+    def _list_candidates(self) -> Dict[str, Tuple[int, float]]:
+        """列出等待处理的图像及其 (size, mtime)（在线程池中执行）"""
+        candidates = {}
+        with os.scandir(self.directory) as entries:
+            names = set()
+            files = []
+            for entry in entries:
+                if entry.is_file():
+                    names.add(entry.name)
+                    files.append(entry)
+            for entry in files:
+                if not entry.name.lower().endswith(self.extensions):
+                    continue
+                if entry.name + RESULT_SUFFIX in names or entry.name + ERROR_SUFFIX in names:
+                    continue
+                stat = entry.stat()
+                candidates[entry.path] = (stat.st_size, stat.st_mtime)
+        return candidates
+
+    async def _scan(self):
+        loop = asyncio.get_event_loop()
+        candidates = await loop.run_in_executor(None, self._list_candidates)
+        self.stats['scans'] += 1
+
+        now = time.time()
+        previous, self._seen = self._seen, candidates
+        self._failed = {path: signature for path, signature in self._failed.items() if path in candidates}
+        for path, (size, mtime) in candidates.items():
+            if path in self._in_progress or self._failed.get(path) == (size, mtime):
+                continue
+            # 大小和修改时间稳定、且已超过等待时间才处理
+            if previous.get(path) != (size, mtime) or now - mtime < settings.watch_settle_time:
+                continue
+            self._in_progress.add(path)
+            asyncio.create_task(self._process(path, (size, mtime)))
+
+    async def _process(self, path: str, signature: Tuple[int, float]):
+        """识别单个文件并写出结果"""
+        async with self._slots:
+            try:
+                request = OCRFileRequest(
+                    file_path=path,
+                    enable_llm_format=settings.watch_enable_llm_format
+                )
+                result = await run_ocr_and_format(request, file_root=self.directory)
+                response = build_format_response(result)
+                _write_atomic(path + RESULT_SUFFIX, response.json())
+                _write_atomic(path + MARKDOWN_SUFFIX, response.local_format.markdown)
+                self.stats['processed'] += 1
+                logger.info("已识别监听文件: %s，%d 个结果", os.path.basename(path), len(response.results))
+            except Exception as e:
+                self.stats['failed'] += 1
+                logger.error(f"识别监听文件失败 {os.path.basename(path)}: {str(e)}")
+                # 写出错误文件，避免每次扫描都重试；目录只读、已满或已删除时改为在内存中记录
+                try:
+                    _write_atomic(path + ERROR_SUFFIX, json.dumps({'error': str(e)}, ensure_ascii=False))
+                except OSError as write_error:
+                    self._failed[path] = signature
+                    logger.error(f"写出错误文件失败 {os.path.basename(path)}: {str(write_error)}")
+            finally:
+                self._in_progress.discard(path)
+
+
+def _write_atomic(path: str, content: str):
+    """先写临时文件再重命名，读取方不会看到写了一半的结果"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+# 全局目录监听器（仅在配置了 WATCH_DIR 时创建）
+directory_watcher = DirectoryWatcher(settings.watch_dir) if settings.watch_dir else None
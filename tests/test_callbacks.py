@@ -0,0 +1,90 @@
+"""回调地址检查测试（不访问网络，DNS 解析由替身返回）"""
+import asyncio
+import socket
+
+import pytest
+
+from src.callbacks import check_callback_url, pin_callback_url, resolve_callback_url
+from src.config import settings
+
+
+@pytest.fixture
+def resolve_to(monkeypatch):
+    """让事件循环的 getaddrinfo 返回给定地址"""
+    def set_addresses(*addresses):
+        async def getaddrinfo(self, host, port, **kwargs):
+            return [
+                (socket.AF_INET6 if ":" in address else socket.AF_INET, socket.SOCK_STREAM, 6, "", (address, 0))
+                for address in addresses
+            ]
+        monkeypatch.setattr(asyncio.BaseEventLoop, 'getaddrinfo', getaddrinfo)
+    monkeypatch.setattr(settings, 'job_callback_allowed_hosts', None)
+    return set_addresses
+
+
+
+@pytest.mark.parametrize("url", [
+    "ftp://example.com/x",
+    "https:///no-host",
+    "http://localhost:8080/done",
+    "http://api.localhost/done",
+    "http://127.0.0.1/done",
+    "http://10.1.2.3/done",
+    "http://169.254.169.254/latest/meta-data",
+    "http://[::1]/done",
+    "http://[fd00::1]/done",
+    "http://[::ffff:10.0.0.1]/done",
+    "http://224.0.0.1/done",
+])
+def test_check_rejects_internal_targets(resolve_to, url):
+    with pytest.raises(ValueError):
+        check_callback_url(url)
+
+
+def test_check_accepts_public_hosts(resolve_to):
+    assert check_callback_url("https://Hooks.Example.com./done") == "hooks.example.com"
+    assert check_callback_url("http://93.184.216.34:8080/done") == "93.184.216.34"
+
+
+def test_allowed_hosts_replace_public_check(monkeypatch):
+    monkeypatch.setattr(settings, 'job_callback_allowed_hosts', "hooks.internal, *.example.com")
+    assert check_callback_url("http://hooks.internal/done") == "hooks.internal"
+    assert check_callback_url("https://a.b.example.com/done") == "a.b.example.com"
+    for url in ("https://example.com.evil.net/done", "https://notexample.com/done", "https://93.184.216.34/done"):
+        with pytest.raises(ValueError):
+            check_callback_url(url)
+    # 允许列表中的主机不做 DNS 检查，也不固定地址
+    assert asyncio.run(resolve_callback_url("http://hooks.internal/done")) is None
+
+
+def test_resolve_failure_is_rejected(resolve_to, monkeypatch):
+    async def getaddrinfo(self, host, port, **kwargs):
+        raise socket.gaierror("Name or service not known")
+    monkeypatch.setattr(asyncio.BaseEventLoop, 'getaddrinfo', getaddrinfo)
+    with pytest.raises(ValueError):
+        asyncio.run(resolve_callback_url("https://missing.example.com/done"))
+
+def test_resolve_returns_vetted_address(resolve_to):
+    resolve_to("93.184.216.34", "2606:2800:220:1:248:1893:25c8:1946")
+    assert asyncio.run(resolve_callback_url("https://hooks.example.com/done")) == "93.184.216.34"
+
+
+@pytest.mark.parametrize("address", ["127.0.0.1", "10.0.0.5", "169.254.169.254", "::1", "::ffff:192.168.1.1"])
+def test_resolve_rejects_any_private_address(resolve_to, address):
+    resolve_to("93.184.216.34", address)
+    with pytest.raises(ValueError):
+        asyncio.run(resolve_callback_url("https://hooks.example.com/done"))
+
+
+def test_pin_connects_to_address_and_keeps_host():
+    url, headers, extensions = pin_callback_url("https://user:pw@hooks.example.com:8443/done?a=1", "93.184.216.34")
+    assert url == "https://user:pw@93.184.216.34:8443/done?a=1"
+    assert headers == {"Host": "hooks.example.com:8443"}
+    assert extensions == {"sni_hostname": "hooks.example.com"}
+
+    url, headers, extensions = pin_callback_url("http://hooks.example.com/done", "2606:2800:220:1::1")
+    assert url == "http://[2606:2800:220:1::1]/done"
+    assert headers == {"Host": "hooks.example.com"}
+    assert extensions == {}
+
+    assert pin_callback_url("http://hooks.example.com/done", None) == ("http://hooks.example.com/done", {}, {})
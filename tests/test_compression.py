@@ -0,0 +1,34 @@
+"""响应压缩协商测试"""
+import pytest
+
+from src import compression
+from src.compression import negotiate_encoding
+
+
+@pytest.fixture
+def all_encodings(monkeypatch):
+    """假定 zstd 和 brotli 都已安装"""
+    monkeypatch.setattr(compression, 'available_encodings', lambda: ["zstd", "br", "gzip"])
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip, deflate, br, zstd", "zstd"),
+    ("gzip, br", "br"),
+    ("gzip;q=1.0, br;q=0.5", "gzip"),
+    ("br;q=0.8, zstd;q=0.9", "zstd"),
+    ("ZSTD;q=0, gzip", "gzip"),
+    ("*", "zstd"),
+    ("*;q=0.5, br;q=0", "zstd"),
+    ("identity", None),
+    ("gzip;q=0", None),
+    ("gzip;q=abc", None),
+    ("", None),
+])
+def test_negotiate_encoding(all_encodings, header, expected):
+    assert negotiate_encoding(header) == expected
+
+
+def test_unavailable_encodings_are_skipped(monkeypatch):
+    monkeypatch.setattr(compression, 'available_encodings', lambda: ["gzip"])
+    assert negotiate_encoding("zstd, br") is None
+    assert negotiate_encoding("zstd, br;q=0.9, gzip;q=0.1") == "gzip"
@@ -0,0 +1,40 @@
+"""LLM 对冲请求测试（端点为替身，不访问网络）"""
+import asyncio
+
+from src import formatter_llm
+from src.llm_router import LLMEndpoint, LLMRouter
+from src.results import OCRResultSet
+
+
+def test_cancelled_caller_cancels_hedged_requests(monkeypatch):
+    endpoints = [LLMEndpoint("a", "http://a", None, "m", 1.0), LLMEndpoint("b", "http://b", None, "m", 1.0)]
+    router = LLMRouter(endpoints)
+    monkeypatch.setattr(router, 'hedge_delay', lambda: 0.01)
+    monkeypatch.setattr(formatter_llm, 'llm_router', router)
+    started, finished = [], []
+
+    async def stalled_endpoint(client, endpoint, raw_text):
+        endpoint.in_flight += 1
+        started.append(endpoint.name)
+        try:
+            await asyncio.sleep(10)
+        finally:
+            endpoint.in_flight -= 1
+            finished.append((endpoint.name, client.is_closed))
+
+    monkeypatch.setattr(formatter_llm, '_call_endpoint', stalled_endpoint)
+
+    async def run():
+        slots = formatter_llm._llm_semaphore._value
+        caller = asyncio.ensure_future(formatter_llm._call_llm(OCRResultSet.empty()))
+        while len(started) < 2:
+            await asyncio.sleep(0.01)
+        caller.cancel()
+        await asyncio.gather(caller, return_exceptions=True)
+        assert formatter_llm._llm_semaphore._value == slots
+
+    asyncio.run(run())
+    assert sorted(started) == ["a", "b"]
+    # 两个请求都在客户端关闭前结束，端点的在途计数归零
+    assert sorted(finished) == [("a", False), ("b", False)]
+    assert all(endpoint.in_flight == 0 for endpoint in endpoints)
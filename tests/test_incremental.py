@@ -0,0 +1,106 @@
+"""增量 OCR 帧会话测试"""
+import asyncio
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from src.incremental import FrameSession
+from src.ocr_service import OCRService
+from src.results import OCRResultSet
+
+
+def _frame_bytes(width: int = 256, height: int = 128) -> bytes:
+    """生成一帧带噪声的 PNG（避免数据太小被拒绝）"""
+    pixels = np.random.default_rng(0).integers(0, 255, (height, width, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _line(text: str) -> OCRResultSet:
+    return OCRResultSet([text], np.array([0.9]), np.array([[10.0, 10.0, 100.0, 30.0]]))
+
+
+@pytest.fixture
+def service():
+    service = OCRService()
+    service.executor = ThreadPoolExecutor(max_workers=2)
+    yield service
+    service.executor.shutdown(wait=True)
+
+
+def test_diff_does_not_advance_state_before_merge():
+    image = Image.frombytes("RGB", (128, 64), bytes(128 * 64 * 3))
+    session = FrameSession(tile_size=32, full_refresh_ratio=0.5)
+
+    rects, changed, total, _ = session.diff(image)
+    assert rects is None and changed == total
+
+    # 没有 merge（识别失败）时，同一帧仍需识别整帧
+    rects, _, _, _ = session.diff(image)
+    assert rects is None
+
+
+def test_failed_frame_forces_full_refresh(service):
+    session = FrameSession(tile_size=32, full_refresh_ratio=0.5)
+    frame = _frame_bytes()
+    calls = []
+
+    async def failing_task(func, *args):
+        calls.append(func.__name__)
+        raise RuntimeError("识别失败")
+
+    async def succeeding_task(func, *args):
+        calls.append(func.__name__)
+        return _line("hello"), None
+
+    async def run():
+        service._run_ocr_task = failing_task
+        with pytest.raises(RuntimeError):
+            await service.process_frame(session, frame)
+
+        service._run_ocr_task = succeeding_task
+        return await service.process_frame(session, frame)
+
+    result = asyncio.run(run())
+
+    assert calls == ["_recognize_scaled", "_recognize_scaled"]
+    assert result['full_frame'] is True
+    assert result['changed_tiles'] == result['total_tiles']
+    assert result['results'].texts == ["hello"]
+    assert session.frames == 1
+
+
+def test_failed_partial_frame_resets_cache(service):
+    session = FrameSession(tile_size=32, full_refresh_ratio=0.5)
+    frame = _frame_bytes()
+
+    async def succeeding_task(func, *args):
+        return _line("hello"), None
+
+    async def failing_task(func, *args):
+        raise RuntimeError("识别失败")
+
+    async def run():
+        service._run_ocr_task = succeeding_task
+        await service.process_frame(session, frame)
+
+        # 修改一小块像素，使下一帧只识别变化区域
+        image = Image.open(io.BytesIO(frame)).convert("RGB")
+        image.paste((255, 0, 0), (200, 100, 210, 110))
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG")
+
+        service._run_ocr_task = failing_task
+        with pytest.raises(RuntimeError):
+            await service.process_frame(session, buffer.getvalue())
+        assert session.results is None
+
+        service._run_ocr_task = succeeding_task
+        return await service.process_frame(session, buffer.getvalue())
+
+    result = asyncio.run(run())
+    assert result['full_frame'] is True
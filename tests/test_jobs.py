@@ -0,0 +1,109 @@
+"""异步任务存储和租户隔离测试"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.config import settings
+from src.jobs import JOB_FAILED, JOB_QUEUED, JOB_RUNNING, JOB_SUCCEEDED, JobManager, JobStore
+from src.tenants import Tenant, current_tenant
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    store.open()
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def manager(store):
+    manager = JobManager()
+    manager.store = store
+    manager.db_executor = ThreadPoolExecutor(max_workers=1)
+    yield manager
+    manager.db_executor.shutdown(wait=True)
+
+
+
+def test_claim_takes_oldest_job_once(store, tmp_path):
+    store.create("job-1", "{}", None, "default")
+    store.create("job-2", "{}", None, "default")
+    # 另一个工作进程打开同一个数据库
+    other = JobStore(str(tmp_path / "jobs.db"))
+    other.open()
+    try:
+        first = store.claim_next()
+        second = other.claim_next()
+        assert (first['id'], second['id']) == ("job-1", "job-2")
+        assert first['status'] == JOB_RUNNING and first['attempts'] == 1
+        assert first['owner_pid'] == os.getpid()
+        assert store.claim_next() is None and other.claim_next() is None
+    finally:
+        other.close()
+
+
+def test_recover_requeues_jobs_of_dead_processes(store, monkeypatch):
+    monkeypatch.setattr(settings, 'job_max_attempts', 2)
+    for job_id in ("orphan", "exhausted", "alive"):
+        store.create(job_id, "{}", None, "default")
+        store.claim_next()
+    # 本进程的记录视为之前同号进程留下的；父进程仍然存活
+    store.conn.execute("UPDATE jobs SET attempts = 2 WHERE id = 'exhausted'")
+    store.conn.execute("UPDATE jobs SET owner_pid = ? WHERE id = 'alive'", (os.getppid(),))
+
+    assert store.recover() == 1
+    statuses = {job_id: store.get(job_id, "default")['status'] for job_id in ("orphan", "exhausted", "alive")}
+    assert statuses == {"orphan": JOB_QUEUED, "exhausted": JOB_FAILED, "alive": JOB_RUNNING}
+    assert store.get_result("exhausted", "default")['error'] == "任务多次中断，已放弃"
+
+    # 重新排队的任务可以再次领取，尝试次数累加
+    claimed = store.claim_next()
+    assert claimed['id'] == "orphan" and claimed['attempts'] == 2
+
+def test_jobs_are_visible_only_to_their_tenant(store, manager):
+    store.create("job-a", "{}", None, "alpha")
+    store.finish("job-a", JOB_SUCCEEDED, '{"results": []}', None)
+
+    async def lookup(tenant_name: str):
+        token = current_tenant.set(Tenant(tenant_name))
+        try:
+            return await manager.get_job("job-a"), await manager.get_result("job-a")
+        finally:
+            current_tenant.reset(token)
+
+    job, result = asyncio.run(lookup("alpha"))
+    assert job['status'] == JOB_SUCCEEDED
+    assert result['result'] == '{"results": []}'
+
+    assert asyncio.run(lookup("beta")) == (None, None)
+
+
+def test_jobs_without_tenant_belong_to_default(store):
+    store.create("job-old", "{}", None, None)
+    assert store.get("job-old", "default") is not None
+    assert store.get("job-old", "alpha") is None
+
+
+def test_stop_waits_for_callbacks_and_cancels_stragglers(manager, monkeypatch):
+    monkeypatch.setattr(settings, 'job_callback_timeout', 0.1)
+    sent = []
+
+    async def send_callback(url, job_id, status, result_json, error):
+        await asyncio.sleep(0.01 if job_id == "fast" else 10)
+        sent.append(job_id)
+
+    monkeypatch.setattr(manager, '_send_callback', send_callback)
+
+    async def run():
+        manager.running = True
+        manager._schedule_callback("https://example.com/hook", "fast", JOB_SUCCEEDED, None, None)
+        manager._schedule_callback("https://example.com/hook", "slow", JOB_SUCCEEDED, None, None)
+        assert len(manager.callback_tasks) == 2
+        await manager.stop()
+
+    asyncio.run(run())
+    assert sent == ["fast"]
+    assert not manager.callback_tasks
@@ -0,0 +1,31 @@
+"""负载自适应降级测试"""
+from src import load_control
+from src.load_control import DegradationController
+
+
+def _controller(monkeypatch, inflight):
+    clock = {'now': 100.0}
+    monkeypatch.setattr(load_control.time, 'monotonic', lambda: clock['now'])
+    controller = DegradationController(
+        enabled=True, latency_target=10.0, step_interval=1.0, inflight=lambda: inflight['n']
+    )
+    # 长文档：排队和执行都很慢，升到第 1 级
+    controller.observe(queue_wait=5.0, latency=6.0)
+    assert controller.level == 1
+    return controller, clock
+
+
+def test_saturated_service_is_not_idle(monkeypatch):
+    inflight = {'n': 4}
+    controller, clock = _controller(monkeypatch, inflight)
+    # 很久没有任务完成，但仍有任务在执行，不能当作空闲而恢复
+    clock['now'] += 30
+    assert controller.active_degradations() == load_control.LEVELS[2]
+
+
+def test_idle_service_recovers(monkeypatch):
+    inflight = {'n': 0}
+    controller, clock = _controller(monkeypatch, inflight)
+    clock['now'] += 30
+    assert controller.active_degradations() == []
+    assert controller.recoveries == 1
@@ -0,0 +1,67 @@
+"""像素内存预算测试"""
+import asyncio
+
+import pytest
+
+from src.memory_budget import OverloadedError, PixelBudget, estimate_pixel_bytes
+
+
+def test_estimate_includes_rgb_conversion():
+    assert estimate_pixel_bytes((10, 10), 'RGB') == 300
+    # 灰度图：1 字节原图 + 3 字节 RGB 副本
+    assert estimate_pixel_bytes((10, 10), 'L') == 400
+    assert estimate_pixel_bytes((10, 10), 'I;16') == 500
+
+
+def test_waiters_are_admitted_in_order():
+    budget = PixelBudget(budget_bytes=100, max_wait=1.0)
+    order = []
+
+    async def request(name, nbytes, hold):
+        async with budget.reserve(nbytes):
+            order.append(name)
+            await asyncio.sleep(hold)
+
+    async def run():
+        first = asyncio.ensure_future(request("big", 80, 0.05))
+        await asyncio.sleep(0)
+        # 中等请求先排队；后到的小请求即使放得下也不能插队
+        medium = asyncio.ensure_future(request("medium", 60, 0))
+        await asyncio.sleep(0)
+        small = asyncio.ensure_future(request("small", 10, 0))
+        await asyncio.sleep(0.01)
+        assert budget.get_stats()['waiting'] == 2
+        await asyncio.gather(first, medium, small)
+
+    asyncio.run(run())
+    assert order == ["big", "medium", "small"]
+    assert budget.reserved == 0 and budget.active == 0
+    assert budget.peak_reserved == 80
+
+
+def test_oversized_image_runs_alone():
+    budget = PixelBudget(budget_bytes=100, max_wait=1.0)
+
+    async def run():
+        await budget.acquire(500)
+        assert budget.reserved == 500
+        budget.release(500)
+
+    asyncio.run(run())
+
+
+def test_wait_times_out_with_overloaded_error():
+    budget = PixelBudget(budget_bytes=100, max_wait=0.05)
+
+    async def run():
+        await budget.acquire(90)
+        with pytest.raises(OverloadedError):
+            await budget.acquire(50)
+        # 超时的等待者不再占用队列，归还后后续请求可以立即获得预算
+        budget.release(90)
+        await budget.acquire(50)
+
+    asyncio.run(run())
+    assert budget.rejected == 1
+    assert budget.get_stats()['waiting'] == 0
+    assert budget.reserved == 50
@@ -0,0 +1,175 @@
+"""多节点路由测试（后端为进程内的替身，不需要 Vision 框架）"""
+import asyncio
+import json
+import time
+from typing import Callable, Dict
+
+import httpx
+import pytest
+
+from src import node_router as router_module
+from src.config import settings
+from src.node_router import BackendUnavailable, NodeRouter, OCRBackend
+
+AUTH = {"Authorization": f"Bearer {settings.auth_token}"}
+
+
+def _client(handlers: Dict[str, Callable]) -> httpx.AsyncClient:
+    """按主机名把请求交给对应替身后端处理的客户端"""
+    async def dispatch(request: httpx.Request) -> httpx.Response:
+        return await handlers[request.url.host](request)
+    return httpx.AsyncClient(transport=httpx.MockTransport(dispatch))
+
+
+def _ok(name: str):
+    async def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={'backend': name, 'path': str(request.url.path)})
+    return handler
+
+
+def _batch_backend(name: str, delay: float):
+    """替身 /predict-batch：按 NDJSON 逐页返回，文本为后端名和收到的图像"""
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(delay)
+        images = json.loads(request.content)['images_base64']
+        lines = [
+            json.dumps({
+                'page_index': index,
+                'results': [{'dt_boxes': [[0, 0], [1, 0], [1, 1], [0, 1]], 'rec_txt': image, 'score': 1.0}],
+                'local_format': {'markdown': image, 'success': True, 'error': None},
+                'image_size': [1, 1],
+                'processing_time': delay,
+                'error': None,
+                'backend': name,
+                'query': request.url.query.decode()
+            })
+            for index, image in enumerate(images)
+        ]
+        return httpx.Response(200, content="\n".join(lines).encode(), headers={'content-type': 'application/x-ndjson'})
+    return handler
+
+
+def test_pick_prefers_least_outstanding():
+    a, b, c = OCRBackend("http://a"), OCRBackend("http://b"), OCRBackend("http://c")
+    router = NodeRouter([a, b, c])
+    a.in_flight, b.in_flight, c.in_flight = 3, 1, 2
+    assert router.pick() is b
+
+    # 后端上报的队列深度也计入评分
+    b.queue_depth = 5
+    assert router.pick() is c
+    assert router.pick(exclude=[c]) is a
+
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_overloaded_backend_is_ejected_and_request_retried(status):
+    a, b = OCRBackend("http://a"), OCRBackend("http://b")
+    router = NodeRouter([a, b])
+    b.in_flight = 1  # 先选 a
+
+    async def overloaded(request):
+        return httpx.Response(status, headers={'retry-after': '30'})
+
+    async def run():
+        router.client = _client({'a': overloaded, 'b': _ok('b')})
+        try:
+            return await router.send("/predict", b"{}", {})
+        finally:
+            await router.client.aclose()
+
+    backend, response = asyncio.run(run())
+    assert backend is b
+    assert response.json()['backend'] == 'b'
+    assert a.ejections == 1 and not a.is_available()
+    # Retry-After 比 ROUTER_EJECT_TIME 长时按 Retry-After 摘除
+    assert a.ejected_until - time.monotonic() > 25
+    # 返回时 b 的在途计数仍包含本请求（调用方完成后调用 done）
+    assert a.in_flight == 0 and b.in_flight == 2
+
+
+def test_all_backends_unavailable():
+    a = OCRBackend("http://a")
+    router = NodeRouter([a])
+
+    async def overloaded(request):
+        return httpx.Response(503)
+
+    async def run():
+        router.client = _client({'a': overloaded})
+        try:
+            await router.send("/predict", b"{}", {})
+        finally:
+            await router.client.aclose()
+
+    with pytest.raises(BackendUnavailable):
+        asyncio.run(run())
+    assert a.in_flight == 0
+
+
+def test_ejected_backend_is_readmitted():
+    a = OCRBackend("http://a")
+    router = NodeRouter([a])
+    a.eject(0.05, "HTTP 503")
+    assert router.pick() is None
+    time.sleep(0.06)
+    assert router.pick() is a
+
+
+def test_health_check_removes_and_readmits_backend():
+    a = OCRBackend("http://a")
+    router = NodeRouter([a])
+    ready = {'status': 503}
+
+    async def readiness(request):
+        return httpx.Response(ready['status'], json={'ready': ready['status'] == 200, 'queue_depth': 4})
+
+    async def run():
+        router.client = _client({'a': readiness})
+        try:
+            await router._check(a)
+            assert not a.is_available()
+            ready['status'] = 200
+            await router._check(a)
+        finally:
+            await router.client.aclose()
+
+    asyncio.run(run())
+    assert a.is_available()
+    assert a.queue_depth == 4
+
+
+def test_batch_fans_out_and_reassembles_in_order(monkeypatch):
+    backends = [OCRBackend("http://slow"), OCRBackend("http://fast")]
+    monkeypatch.setattr(router_module.node_router, 'backends', backends)
+    monkeypatch.setattr(settings, 'router_batch_min_chunk', 2)
+    images = [f"image-{i}" for i in range(6)]
+
+    async def run():
+        # 直接通过 ASGI 调用路由应用，不触发启动事件（不会创建真正的客户端和健康检查）
+        router_module.node_router.client = _client({
+            'slow': _batch_backend('slow', 0.2),
+            'fast': _batch_backend('fast', 0.0)
+        })
+        try:
+            async with httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=router_module.app), base_url="http://router"
+            ) as client:
+                return await client.post(
+                    "/predict-batch?format=columnar", json={'images_base64': images}, headers=AUTH
+                )
+        finally:
+            await router_module.node_router.client.aclose()
+
+    monkeypatch.setattr(router_module.node_router, 'client', None)
+    response = asyncio.run(run())
+    assert response.status_code == 200
+    pages = response.json()['pages']
+
+    assert [page['page_index'] for page in pages] == list(range(6))
+    assert [page['results'][0]['rec_txt'] for page in pages] == images
+    # 每个后端处理一个连续的块，并收到客户端的查询参数
+    assert len({page['backend'] for page in pages[:3]}) == 1
+    assert len({page['backend'] for page in pages[3:]}) == 1
+    assert {page['backend'] for page in pages} == {'slow', 'fast'}
+    assert all(page['query'] == 'format=columnar&stream=true' for page in pages)
+    assert all(backend.in_flight == 0 for backend in backends)
@@ -0,0 +1,99 @@
+"""多租户调度和限流测试"""
+import asyncio
+
+from src import tenants
+from src.tenants import FairScheduler, Tenant, TokenBucket
+
+
+def _admission_order(scheduler, blocker, arrivals):
+    """blocker 先占住容量，arrivals 中的任务依次排队，返回放行顺序"""
+    order = []
+
+    async def task(tenant):
+        await scheduler.acquire(tenant)
+        order.append(tenant.name)
+        await asyncio.sleep(0)
+        scheduler.release(tenant)
+
+    async def run():
+        await scheduler.acquire(blocker)
+        tasks = [asyncio.ensure_future(task(tenant)) for tenant in arrivals]
+        await asyncio.sleep(0)
+        scheduler.release(blocker)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    return order
+
+
+def test_weighted_tenant_gets_proportional_share():
+    heavy, light = Tenant("heavy", weight=2.0), Tenant("light", weight=1.0)
+    scheduler = FairScheduler(lambda: 1)
+    order = _admission_order(scheduler, Tenant("blocker"), [heavy] * 6 + [light] * 6)
+
+    # 后提交的 light 不会被先提交的 heavy 饿死，竞争期间按 2:1 放行
+    assert order[:6].count("heavy") == 4
+    assert order[:6].count("light") == 2
+    assert sorted(order) == ["heavy"] * 6 + ["light"] * 6
+    assert scheduler.in_flight == 0
+
+
+def test_idle_tenant_cannot_bank_credit():
+    scheduler = FairScheduler(lambda: 1)
+    busy, idle = Tenant("busy"), Tenant("idle")
+    _admission_order(scheduler, Tenant("blocker"), [busy] * 5)
+
+    # idle 从当前虚拟时间开始排队，不会因为之前没有请求而连续抢占
+    order = _admission_order(scheduler, Tenant("blocker"), [idle] * 3 + [busy] * 3)
+    assert order[:4] in (["idle", "busy", "idle", "busy"], ["busy", "idle", "busy", "idle"])
+
+
+def test_tenant_max_concurrency_lets_others_run():
+    limited, other = Tenant("limited", max_concurrency=1), Tenant("other")
+    scheduler = FairScheduler(lambda: 3)
+
+    async def run():
+        await scheduler.acquire(limited)
+        second = asyncio.ensure_future(scheduler.acquire(limited))
+        await asyncio.sleep(0)
+        assert not second.done()
+        # 容量仍有空闲，其他租户不受 limited 排队任务的影响
+        await asyncio.wait_for(scheduler.acquire(other), 0.1)
+        assert scheduler.get_state()["limited"] == {'queued': 1, 'running': 1}
+
+        scheduler.release(limited)
+        await asyncio.wait_for(second, 0.1)
+        assert scheduler.get_state()["limited"] == {'queued': 0, 'running': 1}
+
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_leaves_queue():
+    tenant = Tenant("alpha")
+    scheduler = FairScheduler(lambda: 1)
+
+    async def run():
+        await scheduler.acquire(tenant)
+        waiter = asyncio.ensure_future(scheduler.acquire(tenant))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        scheduler.release(tenant)
+        assert scheduler.in_flight == 0
+        assert scheduler.get_state()["alpha"] == {'queued': 0, 'running': 0}
+
+    asyncio.run(run())
+
+
+def test_token_bucket(monkeypatch):
+    clock = {'now': 0.0}
+    monkeypatch.setattr(tenants.time, 'monotonic', lambda: clock['now'])
+    bucket = TokenBucket(rate=2.0, burst=2.0)
+
+    assert bucket.try_take() == 0.0
+    assert bucket.try_take() == 0.0
+    assert bucket.try_take() == 0.5
+    clock['now'] += 0.5
+    assert bucket.try_take() == 0.0
+
+    assert TokenBucket(rate=0.0, burst=1.0).try_take() == 0.0